@@ -0,0 +1,280 @@
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import platform
+import random
+import struct
+from time import perf_counter_ns
+from typing import Callable
+
+import numpy as np
+
+from common.robot_hull import RobotHullType
+from common.udp_message import (GameStateMessage, PlayerState, PlayerStaticInfo, PlayerStaticInfoMessage, ProjectileState,
+                                RobotStateMessage, UDPMessage, WeaponStaticInfo)
+from common.weapon import WeaponType
+
+
+ENTITY_COUNTS = [0, 1, 8, 64, 256, 1024]
+MIN_MEASURE_NS = 200_000_000
+
+
+@dataclass
+class Codec:
+    """A wire format under test, wire_compatible codecs must produce the same bytes as the current codec"""
+    name: str
+    encode: Callable[[UDPMessage], bytes]
+    decode: Callable[[type, bytes], UDPMessage]
+    wire_compatible: bool = True
+
+
+def _encode_pack_into(message: UDPMessage) -> bytes:
+    # Messages without a fixed layout cache their encoding, which would hide the encode cost after the first call
+    message._encoded = None
+    buf = _pack_buffer(message.byte_size())
+    end = message.pack_into(buf, 0)
+    return memoryview(buf)[:end]
+
+_pack_buffers: list[bytearray] = [bytearray(1 << 16)]
+
+def _pack_buffer(size: int) -> bytearray:
+    if len(_pack_buffers[0]) < size:
+        _pack_buffers[0] = bytearray(size)
+    return _pack_buffers[0]
+
+
+def _encode_reference(message: UDPMessage) -> bytes:
+    """The original per entity struct codec, kept as the baseline"""
+    if isinstance(message, GameStateMessage):
+        buf = bytearray()
+        buf += struct.pack(GameStateMessage.header_format, message.tick, len(message.players), len(message.projectiles), len(message.explosions))
+        for p in message.players:
+            buf += struct.pack("<HfffHH", p.idx, p.x, p.y, p.angle, p.hp, p.energy)
+        for p in message.projectiles:
+            buf += struct.pack("<HffHH", p.id, p.x, p.y, p.size, p.modifiers)
+        for e in message.explosions:
+            buf += struct.pack("<HHH", *e)
+        return bytes(buf)
+
+    if isinstance(message, PlayerStaticInfoMessage):
+        buf = bytearray()
+        buf += struct.pack("<H", len(message.player_info))
+        for p in message.player_info:
+            buf += struct.pack("<HHHHHHHH", p.idx, p.color[0], p.color[1], p.color[2], p.hull, p.size, p.max_hp, p.max_energy)
+            buf += struct.pack("<H", len(p.weapons))
+            for w in p.weapons:
+                buf += struct.pack("<fffH", w.x_offset, w.y_offset, w.angle, w.type)
+        return bytes(buf)
+
+    return message.to_bytes()
+
+
+def _decode_reference(message_type: type, data: bytes) -> UDPMessage:
+    if message_type is not GameStateMessage:
+        return message_type.from_bytes(data)
+
+    tick, num_players, num_projectiles, num_explosions = struct.unpack_from(GameStateMessage.header_format, data, 0)
+    offset = struct.calcsize(GameStateMessage.header_format)
+
+    state = GameStateMessage()
+    state.tick = tick
+    state.players = []
+    for _ in range(num_players):
+        state.players.append(PlayerState(*struct.unpack_from("<HfffHH", data, offset)))
+        offset += struct.calcsize("<HfffHH")
+    state.projectiles = []
+    for _ in range(num_projectiles):
+        state.projectiles.append(ProjectileState(*struct.unpack_from("<HffHH", data, offset)))
+        offset += struct.calcsize("<HffHH")
+    state.explosions = []
+    for _ in range(num_explosions):
+        state.explosions.append(struct.unpack_from("<HHH", data, offset))
+        offset += 6
+    return state
+
+
+CODECS: list[Codec] = [
+    Codec("reference", _encode_reference, _decode_reference),
+    Codec("to_bytes", lambda message: message.to_bytes(), lambda message_type, data: message_type.from_bytes(data)),
+    Codec("pack_into", _encode_pack_into, lambda message_type, data: message_type.from_bytes(data)),
+]
+
+
+def _f32(value: float) -> float:
+    # Values are generated at float32 precision, so a lossless codec round-trips them exactly
+    return float(np.float32(value))
+
+
+def create_game_state(rng: random.Random, count: int) -> GameStateMessage:
+    message = GameStateMessage()
+    message.tick = rng.randrange(2 ** 32)
+    message.players = [
+        PlayerState(i, _f32(rng.uniform(0, 1200)), _f32(rng.uniform(0, 900)), _f32(rng.uniform(-10, 10)), rng.randrange(300), rng.randrange(300))
+        for i in range(min(count, 64))
+    ]
+    message.projectiles = [
+        ProjectileState(rng.randrange(65000), _f32(rng.uniform(0, 1200)), _f32(rng.uniform(0, 900)), rng.randrange(3, 11), rng.randrange(16))
+        for _ in range(count)
+    ]
+    message.explosions = [(rng.randrange(1200), rng.randrange(900), rng.randrange(100)) for _ in range(count // 8)]
+    return message
+
+
+def create_static_info(rng: random.Random, count: int) -> PlayerStaticInfoMessage:
+    message = PlayerStaticInfoMessage()
+    message.player_info = [
+        PlayerStaticInfo(
+            i,
+            (rng.randrange(256), rng.randrange(256), rng.randrange(256)),
+            rng.choice(list(RobotHullType)),
+            rng.randrange(10, 40),
+            [WeaponStaticInfo(_f32(rng.uniform(-20, 20)), _f32(rng.uniform(-20, 20)), _f32(rng.uniform(-3, 3)), rng.choice(list(WeaponType))) for _ in range(4)],
+            rng.randrange(50, 300),
+            rng.randrange(50, 300)
+        )
+        for i in range(count)
+    ]
+    return message
+
+
+def create_robot_state(rng: random.Random, count: int) -> RobotStateMessage:
+    message = RobotStateMessage()
+    message.state = {
+        f"key{i}": rng.choice([rng.random(), rng.randrange(1000), f"text{i}", [rng.random(), rng.random()], None, True])
+        for i in range(count)
+    }
+    return message
+
+
+MESSAGE_FACTORIES: dict[type, Callable[[random.Random, int], UDPMessage]] = {
+    GameStateMessage: create_game_state,
+    PlayerStaticInfoMessage: create_static_info,
+    RobotStateMessage: create_robot_state,
+}
+
+
+def normalize(message: UDPMessage):
+    """Turns a message into plain values, so messages decoded by different codecs can be compared"""
+    if isinstance(message, GameStateMessage):
+        return (
+            message.tick,
+            [(p.idx, p.x, p.y, p.angle, p.hp, p.energy) for p in message.players],
+            [(p.id, p.x, p.y, p.size, p.modifiers) for p in message.projectiles],
+            [tuple(e) for e in message.explosions],
+        )
+    if isinstance(message, PlayerStaticInfoMessage):
+        return [
+            (p.idx, tuple(p.color), p.hull, p.size, p.max_hp, p.max_energy, [(w.x_offset, w.y_offset, w.angle, w.type) for w in p.weapons])
+            for p in message.player_info
+        ]
+    if isinstance(message, RobotStateMessage):
+        return message.state
+    raise TypeError(f"Unknown message type {type(message).__name__}")
+
+
+def check_round_trips(seed: int) -> list[str]:
+    """Returns a description of every failed round trip"""
+    failures: list[str] = []
+    for message_type, factory in MESSAGE_FACTORIES.items():
+        for count in ENTITY_COUNTS:
+            message = factory(random.Random(seed + count), count)
+            expected = normalize(message)
+            current_bytes = bytes(message.to_bytes())
+
+            for codec in CODECS:
+                data = bytes(codec.encode(message))
+                if normalize(codec.decode(message_type, data)) != expected:
+                    failures.append(f"{codec.name}: {message_type.__name__} with {count} entities does not round-trip")
+                if codec.wire_compatible and data != current_bytes:
+                    failures.append(f"{codec.name}: {message_type.__name__} with {count} entities differs from the current wire format")
+
+    return failures
+
+
+def measure(func: Callable[[], object]) -> float:
+    """Returns calls per second, timed for at least MIN_MEASURE_NS"""
+    calls = 0
+    batch = 1
+    start = perf_counter_ns()
+    while True:
+        for _ in range(batch):
+            func()
+        calls += batch
+        elapsed = perf_counter_ns() - start
+        if elapsed >= MIN_MEASURE_NS:
+            return calls / (elapsed / 1e9)
+        batch *= 2
+
+
+def benchmark(codecs: list[Codec], seed: int) -> dict:
+    results: dict[str, dict] = {}
+    for message_type, factory in MESSAGE_FACTORIES.items():
+        type_results: dict[str, list[dict]] = {}
+        for codec in codecs:
+            rows: list[dict] = []
+            for count in ENTITY_COUNTS:
+                message = factory(random.Random(seed + count), count)
+                data = bytes(codec.encode(message))
+
+                def decode_objects():
+                    # Decoding may be lazy, so this also reads every entity as an object
+                    normalize(codec.decode(message_type, data))
+
+                rows.append({
+                    "entities": count,
+                    "bytes": len(data),
+                    "bytes_per_entity": len(data) / count if count > 0 else None,
+                    "encode_per_s": measure(lambda: codec.encode(message)),
+                    "decode_per_s": measure(lambda: codec.decode(message_type, data)),
+                    "decode_objects_per_s": measure(decode_objects),
+                })
+            type_results[codec.name] = rows
+        results[message_type.__name__] = type_results
+
+    return results
+
+
+def print_results(results: dict):
+    for message_type, type_results in results.items():
+        print(f"\n{message_type}")
+        print(f"  {'codec':<12}{'entities':>9}{'bytes':>9}{'B/entity':>10}{'encode/s':>13}{'decode/s':>13}{'objects/s':>13}")
+        for codec, rows in type_results.items():
+            for row in rows:
+                per_entity = f"{row['bytes_per_entity']:.2f}" if row["bytes_per_entity"] is not None else "-"
+                print(f"  {codec:<12}{row['entities']:>9}{row['bytes']:>9}{per_entity:>10}"
+                      f"{row['encode_per_s']:>13,.0f}{row['decode_per_s']:>13,.0f}{row['decode_objects_per_s']:>13,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that every UDP message codec round-trips and measures its speed and size")
+    parser.add_argument("--codec", action="append", help="Only benchmarks these codecs, can be repeated")
+    parser.add_argument("--check-only", action="store_true", help="Only runs the round-trip checks")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Writes the results to this JSON file")
+    args = parser.parse_args()
+
+    failures = check_round_trips(args.seed)
+    for failure in failures:
+        print(f"FAIL {failure}", flush=True)
+    print(f"Round trips: {'ok' if len(failures) == 0 else f'{len(failures)} failed'}", flush=True)
+    if args.check_only:
+        exit(1 if len(failures) > 0 else 0)
+
+    codecs = [codec for codec in CODECS if args.codec is None or codec.name in args.codec]
+    results = benchmark(codecs, args.seed)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {"time": datetime.now().isoformat(), "python": platform.python_version(), "platform": platform.platform()},
+                "round_trip_failures": failures,
+                "results": results,
+            }, f, indent=2)
+
+    if len(failures) > 0:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime
+import fnmatch
+from itertools import combinations
+import json
+import math
+import platform
+import statistics
+import sys
+import tracemalloc
+
+from common.arena import Arena
+from common.keys import Key, KeyState
+from common.player import Player
+from common.projectile import ProjectileModifier
+from common.robot import RobotBuilder, RobotInfo, RobotInterface
+from common.robot_hull import RobotHullType
+from common.robot_stats import RobotStats
+from common.weapon import WeaponConfig, WeaponType
+from common.weapon_command import WeaponCommand
+from server.game import Game
+from server.headless import NullUDPSocket
+from server.metrics import QUANTILES, TICK_PHASES, TickProfiler
+
+
+class BenchmarkRobot(RobotInterface):
+    """Robot with four weapons of one type that fires all of them with the same modifiers"""
+
+    def __init__(self, weapon_type: WeaponType, modifiers: list[ProjectileModifier]):
+        self.weapon_type = weapon_type
+        self.modifiers = modifiers
+
+    def build_robot(self, builder: RobotBuilder) -> None:
+        builder.hull = RobotHullType.STANDARD
+        for i, angle in enumerate([0, 90, 180, 270]):
+            builder.weapons.append(WeaponConfig(
+                f"w{i}",
+                math.cos(math.radians(angle)) * 0.5,
+                math.sin(math.radians(angle)) * 0.5,
+                angle,
+                self.weapon_type
+            ))
+
+    def apply_stats(self, stats: RobotStats) -> None:
+        pass
+
+    def do_ability(self, index: int, command_list: list[WeaponCommand], info: RobotInfo) -> None:
+        for i in range(4):
+            command_list.append(WeaponCommand(f"w{i}", modifiers=list(self.modifiers)))
+
+    def get_state(self, info: RobotInfo) -> dict:
+        return {"hp": info.hp, "energy": info.energy, "enemies": len(info.enemies)}
+
+
+@dataclass
+class Scenario:
+    name: str
+    robots: int
+    weapon_type: WeaponType = field(default=WeaponType.STANDARD)
+    modifiers: list[ProjectileModifier] = field(default_factory=list)
+    fire_every: int = field(default=2) # ticks between ability presses
+    min_ticks: int = field(default=0)
+
+
+def create_scenarios() -> list[Scenario]:
+    scenarios = [Scenario(f"robots-{n}", n, fire_every=15) for n in [2, 4, 8, 16, 32, 64]]
+
+    scenarios += [
+        Scenario(f"weapon-{weapon_type.name.lower()}", 8, weapon_type)
+        for weapon_type in WeaponType
+        if weapon_type != WeaponType.MINE_DEPLOYER
+    ]
+
+    # Mines live for 15 seconds, so the field only reaches its full size after that many ticks
+    scenarios.append(Scenario("mine-field", 8, WeaponType.MINE_DEPLOYER, min_ticks=15 * 30 + 60))
+
+    for count in range(1, len(ProjectileModifier) + 1):
+        for modifiers in combinations(list(ProjectileModifier), count):
+            name = "+".join(m.name.lower() for m in modifiers)
+            scenarios.append(Scenario(f"modifiers-{name}", 8, modifiers=list(modifiers), fire_every=4))
+
+    return scenarios
+
+
+def create_game(scenario: Scenario, profiler: TickProfiler) -> Game:
+    players = [
+        Player(f"bench{i}", 0, None, BenchmarkRobot(scenario.weapon_type, scenario.modifiers))
+        for i in range(scenario.robots)
+    ]
+
+    return Game(
+        players,
+        Arena.create(scenario.robots),
+        NullUDPSocket(),
+        lambda winner: None,
+        datetime.now(),
+        is_test=True,
+        deterministic=True,
+        seed=0,
+        profiler=profiler)
+
+
+def run_ticks(game: Game, scenario: Scenario, ticks: int, max_entities: dict[str, int]):
+    for _ in range(ticks):
+        # Robots are kept alive, fueled and off cooldown, so the load is sustained for the whole run
+        for instance in game.players.values():
+            instance.robot.hp = instance.robot.max_hp
+            instance.robot.energy = instance.robot.max_energy
+            for weapon in instance.robot.weapons.values():
+                weapon.cooldown_time_left = 0
+
+            game.update_key(instance.player.id, Key.UP, KeyState.DOWN)
+            game.update_key(instance.player.id, Key.LEFT, KeyState.DOWN)
+            game.update_key(instance.player.id, Key.Q, KeyState.DOWN if game.sim_tick % scenario.fire_every == 0 else KeyState.UP)
+
+        game.profiler.begin_tick()
+        game.step()
+        game.publish_state()
+        game.profiler.end_tick({
+            "players": len(game.players),
+            "projectiles": len(game.projectiles),
+            "explosions": len(game.explosions),
+        })
+
+        for kind, count in game.profiler.entity_counts.items():
+            max_entities[kind] = max(max_entities.get(kind, 0), count)
+
+
+def summarize(samples: list[int]) -> dict[str, float]:
+    samples = sorted(samples)
+    summary = {
+        f"p{round(q * 100)}": samples[min(int(q * len(samples)), len(samples) - 1)] / 1e6
+        for q in QUANTILES
+    }
+    summary["mean"] = statistics.fmean(samples) / 1e6
+    summary["max"] = samples[-1] / 1e6
+    return summary
+
+
+def run_scenario(scenario: Scenario, ticks: int, warmup: int, alloc_ticks: int) -> dict:
+    ticks = max(ticks, scenario.min_ticks)
+
+    game = create_game(scenario, TickProfiler(log_interval_ns=None))
+    max_entities: dict[str, int] = {}
+    run_ticks(game, scenario, warmup, max_entities)
+
+    # The warmup is left out of the measured window
+    profiler = TickProfiler(window=ticks, log_interval_ns=None)
+    profiler.start_match(game.position_history.metrics)
+    game.profiler = profiler
+    run_ticks(game, scenario, ticks, max_entities)
+
+    result = {
+        "robots": scenario.robots,
+        "ticks": ticks,
+        "tick_ms": summarize(list(profiler.ticks.samples)),
+        "phases_ms": {phase: summarize(list(profiler.phases[phase].samples)) for phase in TICK_PHASES},
+        "overruns": profiler.overruns,
+        "max_entities": max_entities,
+    }
+
+    # Allocations are traced in a separate run, since tracing slows down every allocation
+    if alloc_ticks > 0:
+        tracemalloc.start()
+        run_ticks(game, scenario, alloc_ticks, {})
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["alloc"] = {
+            "ticks": alloc_ticks,
+            "retained_kib": current / 1024,
+            "peak_kib": peak / 1024,
+        }
+
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Prints the change of each scenario against the baseline, returns True if any got slower than the threshold"""
+    regressed = False
+    print(f"{'scenario':<46}{'p50 base':>10}{'p50 now':>10}{'change':>9}{'p95 base':>10}{'p95 now':>10}{'change':>9}")
+    for name, result in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            print(f"{name:<46}{'(new)':>10}")
+            continue
+
+        row = f"{name:<46}"
+        for stat in ["p50", "p95"]:
+            before, now = base["tick_ms"][stat], result["tick_ms"][stat]
+            change = (now - before) / before if before > 0 else 0
+            flag = " !" if change > threshold else "  "
+            regressed |= change > threshold
+            row += f"{before:>10.3f}{now:>10.3f}{change * 100:>+7.1f}%{flag}"
+        print(row)
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs headless games with generated load and records tick times per phase")
+    parser.add_argument("--scenario", action="append", help="Only runs scenarios matching this pattern, can be repeated")
+    parser.add_argument("--ticks", type=int, default=300, help="Measured ticks per scenario")
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--alloc-ticks", type=int, default=30, help="Ticks traced with tracemalloc after the timed run, 0 disables it")
+    parser.add_argument("--output", help="Writes the results to this JSON file")
+    parser.add_argument("--compare", help="Compares the results to an earlier JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    parser.add_argument("--list", action="store_true", help="Lists the scenarios")
+    args = parser.parse_args()
+
+    scenarios = create_scenarios()
+    if args.scenario:
+        scenarios = [s for s in scenarios if any(fnmatch.fnmatch(s.name, pattern) for pattern in args.scenario)]
+
+    if args.list:
+        for scenario in scenarios:
+            print(scenario.name)
+        return
+
+    results = {
+        "meta": {
+            "time": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ticks": args.ticks,
+            "warmup": args.warmup,
+        },
+        "scenarios": {},
+    }
+
+    for scenario in scenarios:
+        result = run_scenario(scenario, args.ticks, args.warmup, args.alloc_ticks)
+        results["scenarios"][scenario.name] = result
+
+        tick = result["tick_ms"]
+        alloc = result.get("alloc")
+        print(f"{scenario.name:<46} p50 {tick['p50']:7.3f} ms  p95 {tick['p95']:7.3f} ms  p99 {tick['p99']:7.3f} ms  "
+              f"projectiles {result['max_entities'].get('projectiles', 0):5}"
+              + (f"  peak {alloc['peak_kib']:8.1f} KiB" if alloc else ""), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+from time import perf_counter_ns
+
+
+READY_LINE = "Server listening"
+HEAVY_MODULES = ["pygame"]
+
+
+def get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(module: str) -> dict:
+    """Imports the module in a new interpreter with -X importtime, returns the import time and the slowest top level imports"""
+    code = f"import sys; import {module}; print('heavy:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    start = perf_counter_ns()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    wall_ns = perf_counter_ns() - start
+
+    # Lines look like "import time:       self [us] |  cumulative | imported package", nested imports are indented two spaces per level
+    top_level: list[tuple[str, int]] = []
+    direct: list[tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            top_level.append((name.strip(), int(cumulative)))
+        elif depth == 1:
+            direct.append((name.strip(), int(cumulative)))
+
+    # Importing pygame prints a banner, so the list is found by its prefix
+    heavy = next(line for line in result.stdout.splitlines() if line.startswith("heavy:"))[len("heavy:"):]
+
+    return {
+        "wall_ms": wall_ns / 1e6,
+        "import_ms": sum(us for _, us in top_level) / 1e3,
+        "slowest": {name: us / 1e3 for name, us in sorted(direct, key=lambda m: m[1], reverse=True)[:5]},
+        "heavy_modules": [m for m in heavy.split(",") if m],
+    }
+
+
+def measure_startup(timeout: float) -> float:
+    """Starts the server and returns the milliseconds until it accepts connections"""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = perf_counter_ns()
+    process = subprocess.Popen([sys.executable, "-m", "server.main", "--port", str(get_free_port())],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    try:
+        for line in process.stdout:
+            if READY_LINE in line:
+                return (perf_counter_ns() - start) / 1e6
+            if (perf_counter_ns() - start) / 1e9 > timeout:
+                break
+        raise RuntimeError("The server did not start")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures how long the server takes from launch until it accepts connections")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--max-ms", type=float, help="Fails if the median startup is slower than this")
+    parser.add_argument("--output", help="Writes the results to this JSON file")
+    args = parser.parse_args()
+
+    interpreter_ms = statistics.median(measure_import("sys")["wall_ms"] for _ in range(args.runs))
+    imports = [measure_import("server.game_server") for _ in range(args.runs)]
+    startups = [measure_startup(args.timeout) for _ in range(args.runs)]
+
+    fastest_import = min(imports, key=lambda i: i["import_ms"])
+    startup_ms = statistics.median(startups)
+    print(f"Interpreter start: {interpreter_ms:.1f} ms (median)", flush=True)
+    print(f"Import server.game_server: {statistics.median(i['import_ms'] for i in imports):.1f} ms (median), slowest imports: "
+          + ", ".join(f"{name} {ms:.1f} ms" for name, ms in fastest_import["slowest"].items()), flush=True)
+    print(f"Server ready: {startup_ms:.1f} ms (median), {min(startups):.1f} ms (min)", flush=True)
+
+    heavy = sorted({m for i in imports for m in i["heavy_modules"]})
+    if len(heavy) > 0:
+        print(f"The server imports {', '.join(heavy)} on startup", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {"time": datetime.now().isoformat(), "python": platform.python_version(), "platform": platform.platform(), "runs": args.runs},
+                "interpreter_ms": interpreter_ms,
+                "imports": imports,
+                "startup_ms": startups,
+            }, f, indent=2)
+
+    if len(heavy) > 0 or (args.max_ms is not None and startup_ms > args.max_ms):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
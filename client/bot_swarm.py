@@ -0,0 +1,369 @@
+import argparse
+from datetime import datetime
+import json
+import platform
+import random
+import statistics
+import threading
+from time import monotonic, perf_counter_ns, sleep
+from typing import Callable
+
+from client.core.datagram_ring import DatagramRing
+from client.core.tcp_client import TCPClient
+from client.core.udp_client import UDPClient
+from common.keys import Key, KeyState
+from common.tcp_messages import (ExitTestMessage, InputMessage, LobbyInfoMessage, LobbyJoinedMessage, Message, PingMessage, PlayerInfoMessage,
+                                 PongMessage, RoundEndedMessage, RoundStartedMessage, StartRoundMessage)
+from common.udp_message import GAME_STATE_TYPE, GameStateMessage
+
+
+KEYS: dict[str, Key] = {key.name.lower(): key for key in Key}
+
+POLL_INTERVAL = 1 / 60
+QUANTILES = [0.5, 0.95, 0.99]
+
+# A script returns the key changes a bot sends at the given number of seconds into the round
+InputScript = Callable[[random.Random, float, float], list[tuple[int, int]]]
+
+
+class BotUDPClient(UDPClient):
+    """UDP client that stamps each datagram when it is received, so snapshot arrival can be measured
+
+    Stamps are taken on the receiver thread, so with hundreds of bots in one process they include some GIL wait."""
+
+    def __init__(self):
+        self.arrivals: dict[int, int] = {} # tick -> arrival in ns
+        self.duplicates: int = 0
+        self.out_of_order: int = 0
+        self.newest_tick: int = -1
+
+        super().__init__(0)
+        self.port: int = self.udp_socket.getsockname()[1]
+
+    def _receive(self, data: bytes):
+        self.ring.push((perf_counter_ns(), data))
+
+    def _receive_group(self, data: bytes):
+        self.group_ring.push((perf_counter_ns(), data))
+
+    def poll(self):
+        for arrival_ns, data in sorted(self.ring.drain() + self.group_ring.drain(), key=lambda datagram: datagram[0]):
+            for msg_type, payload in self._assemble([data]):
+                if msg_type == GAME_STATE_TYPE:
+                    self._record(GameStateMessage.peek_tick(payload), arrival_ns)
+
+    def _record(self, tick: int, arrival_ns: int):
+        if tick in self.arrivals:
+            self.duplicates += 1
+            return
+
+        if tick < self.newest_tick:
+            self.out_of_order += 1
+        self.newest_tick = max(self.newest_tick, tick)
+        self.arrivals[tick] = arrival_ns
+
+    def reset(self):
+        self.ring = DatagramRing(self.ring.capacity)
+        self.group_ring = DatagramRing(self.group_ring.capacity)
+        self.buffers.clear()
+        self.arrivals = {}
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.newest_tick = -1
+
+
+class Bot:
+    """Headless player that joins the lobby with a robot file and sends inputs from a script"""
+
+    def __init__(self, id: str, robot_code: str, host: str, port: int, script: InputScript, seed: int):
+        self.id = id
+        self.robot_code = robot_code
+        self.script = script
+        self.rng = random.Random(seed)
+
+        self.tcp = TCPClient(self._on_tcp_message, self._on_tcp_disconnect, host, port)
+        self.udp: BotUDPClient = None
+
+        self.joined = threading.Event()
+        self.round_started = threading.Event()
+        self.round_ended = threading.Event()
+        self.disconnected: bool = False
+        self.lobby_size: int = 0
+        self.inputs_sent: int = 0
+
+    def connect(self):
+        self.udp = BotUDPClient()
+        self.tcp.connect()
+        self.tcp.send(PlayerInfoMessage(self.id, self.udp.port, self.robot_code))
+
+    def _on_tcp_message(self, message: Message):
+        if isinstance(message, PingMessage):
+            self.tcp.send(PongMessage(message.sent_time))
+        elif isinstance(message, LobbyJoinedMessage):
+            self.joined.set()
+        elif isinstance(message, LobbyInfoMessage):
+            self.lobby_size = len(message.players)
+        elif isinstance(message, RoundStartedMessage):
+            if message.multicast_group:
+                self.udp.join_group(message.multicast_group, message.multicast_port)
+            self.round_started.set()
+        elif isinstance(message, RoundEndedMessage):
+            self.round_ended.set()
+
+    def _on_tcp_disconnect(self):
+        self.disconnected = True
+        self.round_ended.set()
+
+    def start_round(self):
+        self.round_started.clear()
+        self.round_ended.clear()
+        self.udp.reset()
+
+    def send_inputs(self, elapsed: float, interval: float):
+        if self.disconnected:
+            return
+
+        for key, state in self.script(self.rng, elapsed, interval):
+            self.tcp.send(InputMessage(self.id, key, state))
+            self.inputs_sent += 1
+
+    def close(self):
+        if self.tcp.connected:
+            self.tcp.close()
+        if self.udp is not None:
+            self.udp.close()
+
+
+def idle_script(rng: random.Random, elapsed: float, interval: float) -> list[tuple[int, int]]:
+    return []
+
+
+def random_script(rng: random.Random, elapsed: float, interval: float) -> list[tuple[int, int]]:
+    # About two key changes per second, like a player steering and firing now and then
+    if rng.random() > 2 * interval:
+        return []
+    return [(KEYS[rng.choice(list(KEYS))], rng.choice(list(KeyState)))]
+
+
+def load_script(path: str) -> InputScript:
+    """Loads a looping script from a JSON list of [seconds, key name, "down" or "up"]"""
+    with open(path) as f:
+        entries = sorted((float(seconds), KEYS[key], KeyState.DOWN if state == "down" else KeyState.UP) for seconds, key, state in json.load(f))
+
+    length = max(entries[-1][0], 1e-3) if len(entries) > 0 else 1
+
+    def script(rng: random.Random, elapsed: float, interval: float) -> list[tuple[int, int]]:
+        start = (elapsed - interval) % length
+        end = elapsed % length
+        if start <= end:
+            return [(key, state) for seconds, key, state in entries if start < seconds <= end]
+        # The interval wrapped around the end of the script
+        return [(key, state) for seconds, key, state in entries if seconds > start or seconds <= end]
+
+    return script
+
+
+SCRIPTS: dict[str, InputScript] = {
+    "idle": idle_script,
+    "random": random_script,
+}
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    if len(samples) == 0:
+        return {}
+
+    samples = sorted(samples)
+    summary = {f"p{round(q * 100)}": samples[min(int(q * len(samples)), len(samples) - 1)] for q in QUANTILES}
+    summary["mean"] = statistics.fmean(samples)
+    summary["max"] = samples[-1]
+    return summary
+
+
+def measure_round(bots: list[Bot]) -> dict:
+    """Snapshot loss, arrival delay and jitter of a round over all bots
+
+    The server does not stamp snapshots, so delay is measured against the first bot that received the same tick.
+    That is the fan-out delay of sending each snapshot to every player plus receive delays in the swarm."""
+    first_arrival: dict[int, int] = {}
+    for bot in bots:
+        for tick, arrival_ns in bot.udp.arrivals.items():
+            first_arrival[tick] = min(first_arrival.get(tick, arrival_ns), arrival_ns)
+
+    if len(first_arrival) == 0:
+        return {"bots": len(bots), "snapshots_sent": 0}
+
+    # Ticks are counted from the first and last tick any bot received, so loss at the very ends is not seen
+    first_tick, last_tick = min(first_arrival), max(first_arrival)
+    expected = last_tick - first_tick + 1
+
+    received = 0
+    delays_ms: list[float] = []
+    gaps_ms: list[float] = []
+    jitters_ms: list[float] = []
+    for bot in bots:
+        arrivals = sorted(bot.udp.arrivals.items())
+        received += len(arrivals)
+        delays_ms += [(arrival_ns - first_arrival[tick]) / 1e6 for tick, arrival_ns in arrivals]
+
+        bot_gaps = [
+            (arrival_ns - previous_ns) / (tick - previous_tick) / 1e6
+            for (previous_tick, previous_ns), (tick, arrival_ns) in zip(arrivals, arrivals[1:])
+        ]
+        gaps_ms += bot_gaps
+        if len(bot_gaps) > 0:
+            # Jitter is the mean deviation of the per tick arrival gap from the bot's typical gap
+            typical = statistics.median(bot_gaps)
+            jitters_ms.append(statistics.fmean(abs(gap - typical) for gap in bot_gaps))
+
+    return {
+        "bots": len(bots),
+        "snapshots_sent": expected,
+        "received": received,
+        "loss": 1 - received / (expected * len(bots)),
+        "duplicates": sum(bot.udp.duplicates for bot in bots),
+        "out_of_order": sum(bot.udp.out_of_order for bot in bots),
+        "ring_dropped": sum(bot.udp.ring.dropped + bot.udp.group_ring.dropped for bot in bots),
+        "delay_ms": summarize(delays_ms),
+        "gap_ms": summarize(gaps_ms),
+        "jitter_ms": summarize(jitters_ms),
+        "inputs_sent": sum(bot.inputs_sent for bot in bots),
+        "disconnected": sum(1 for bot in bots if bot.disconnected),
+    }
+
+
+def wait_all(events: list[threading.Event], timeout: float) -> bool:
+    deadline = monotonic() + timeout
+    for event in events:
+        if not event.wait(max(deadline - monotonic(), 0)):
+            return False
+    return True
+
+
+class Swarm:
+    """Runs many bots in one process, the first bot starts and ends the rounds"""
+
+    def __init__(self, bots: list[Bot], input_rate: float):
+        self.bots = bots
+        self.input_interval = 1 / input_rate
+
+    def connect(self, connect_interval: float, timeout: float):
+        for bot in self.bots:
+            bot.connect()
+            sleep(connect_interval)
+
+        if not wait_all([bot.joined for bot in self.bots], timeout):
+            raise TimeoutError(f"Only {sum(1 for bot in self.bots if bot.joined.is_set())}/{len(self.bots)} bots joined the lobby")
+
+        # The lobby info reaches the first bot last, since it is sent again for every player that joins
+        deadline = monotonic() + timeout
+        while self.bots[0].lobby_size < len(self.bots) and monotonic() < deadline:
+            sleep(0.05)
+        print(f"{len(self.bots)} bots joined the lobby", flush=True)
+
+    def run_round(self, duration: float, is_test: bool, timeout: float) -> dict:
+        leader = self.bots[0]
+        for bot in self.bots:
+            bot.start_round()
+            bot.inputs_sent = 0
+
+        leader.tcp.send(StartRoundMessage(is_test))
+        if not wait_all([bot.round_started for bot in self.bots], timeout):
+            raise TimeoutError("The round did not start")
+
+        start = monotonic()
+        next_input = start
+        while monotonic() - start < duration and not leader.round_ended.is_set():
+            for bot in self.bots:
+                bot.udp.poll()
+
+            now = monotonic()
+            if now >= next_input:
+                for bot in self.bots:
+                    bot.send_inputs(now - start, self.input_interval)
+                next_input += self.input_interval
+
+            sleep(POLL_INTERVAL)
+
+        if not leader.round_ended.is_set():
+            leader.tcp.send(ExitTestMessage())
+        wait_all([bot.round_ended for bot in self.bots], timeout)
+
+        for bot in self.bots:
+            bot.udp.poll()
+
+        result = measure_round(self.bots)
+        result["seconds"] = monotonic() - start
+        return result
+
+    def close(self):
+        for bot in self.bots:
+            bot.close()
+
+
+def print_round(index: int, result: dict):
+    if result["snapshots_sent"] == 0:
+        print(f"Round {index}: no snapshots received", flush=True)
+        return
+
+    delay, gap, jitter = result["delay_ms"], result["gap_ms"], result["jitter_ms"]
+    print(f"Round {index}: {result['bots']} bots, {result['seconds']:.1f} s, {result['snapshots_sent']} snapshots, "
+          f"loss {result['loss'] * 100:.2f}% ({result['ring_dropped']} dropped locally), {result['out_of_order']} out of order, "
+          f"{result['duplicates']} duplicates | delay p50 {delay['p50']:.2f} p99 {delay['p99']:.2f} max {delay['max']:.2f} ms"
+          f" | gap p50 {gap.get('p50', 0):.2f} p99 {gap.get('p99', 0):.2f} ms | jitter mean {jitter.get('mean', 0):.2f} ms"
+          f" | {result['inputs_sent']} inputs, {result['disconnected']} disconnected", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connects many headless bots to a server and measures how snapshots arrive")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--robot", default="client\\robots\\my_robot.py", help="Robot file every bot plays with")
+    parser.add_argument("--script", default="random", help=f"Input script: {', '.join(SCRIPTS)} or a JSON file of [seconds, key, \"down\"/\"up\"]")
+    parser.add_argument("--input-rate", type=float, default=10, help="Times per second the script is run for each bot")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds before a round is ended, if it has not ended by itself")
+    parser.add_argument("--test", action="store_true", help="Starts test rounds, which have no countdown")
+    parser.add_argument("--connect-interval", type=float, default=0.01, help="Seconds between connecting bots")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Writes the results to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.robot, encoding="utf-8") as f:
+        robot_code = f.read()
+
+    script = SCRIPTS[args.script] if args.script in SCRIPTS else load_script(args.script)
+    bots = [
+        Bot(f"swarm-bot-{i:04}", robot_code, args.host, args.port, script, args.seed + i)
+        for i in range(args.bots)
+    ]
+
+    swarm = Swarm(bots, args.input_rate)
+    results = []
+    try:
+        swarm.connect(args.connect_interval, args.timeout)
+        for i in range(args.rounds):
+            result = swarm.run_round(args.duration, args.test, args.timeout)
+            results.append(result)
+            print_round(i + 1, result)
+    finally:
+        swarm.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "time": datetime.now().isoformat(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "bots": args.bots,
+                    "script": args.script,
+                    "input_rate": args.input_rate,
+                },
+                "rounds": results,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
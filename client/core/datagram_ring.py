@@ -0,0 +1,32 @@
+class DatagramRing:
+    """Bounded single-producer/single-consumer ring buffer.
+    
+    Only the producer moves head and only the consumer moves tail, so no lock is needed.
+    When the ring is full new datagrams are dropped."""
+    
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.slots: list[bytes] = [None] * capacity
+        
+        self.head: int = 0
+        self.tail: int = 0
+        self.dropped: int = 0
+        
+    def push(self, datagram: bytes) -> bool:
+        if self.head - self.tail >= self.capacity:
+            self.dropped += 1
+            return False
+        
+        self.slots[self.head % self.capacity] = datagram
+        self.head += 1 # published only after the slot is written
+        return True
+    
+    def drain(self) -> list[bytes]:
+        head = self.head
+        datagrams = []
+        for i in range(self.tail, head):
+            datagrams.append(self.slots[i % self.capacity])
+            self.slots[i % self.capacity] = None
+            
+        self.tail = head
+        return datagrams
@@ -4,17 +4,16 @@ import queue
 import sys
 import threading
 import pygame
+from client.core.render_pipeline import RenderPipeline
 from client.core.renderers.connect_menu_renderer import ConnectMenuStateRenderer
 from client.core.renderers.game_renderer import GameStateRenderer
 from client.core.renderers.lobby_menu_renderer import LobbyMenuStateRenderer
 from client.core.state_renderer import ClientState, SharedState
 from client.core.tcp_client import TCPClient
 from client.core.udp_client import UDPClient
+from common.hook_timings import describe_hook_summary
 from common.udp_message import GameStateMessage, PlayerStaticInfoMessage, RobotStateMessage, UDPMessage
-from common.tcp_messages import LobbyInfoMessage, LobbyJoinedMessage, Message, RoundEndedMessage, RoundStartedMessage
-
-ALLOWED_KEYS = [pygame.K_q, pygame.K_w, pygame.K_e, pygame.K_a, pygame.K_s, pygame.K_d,
-                pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
+from common.tcp_messages import LobbyInfoMessage, LobbyJoinedMessage, Message, PingMessage, PongMessage, RoundEndedMessage, RoundStartedMessage
 
 
 class GameClient:
@@ -69,7 +68,7 @@ class GameClient:
         self.game_renderer = GameStateRenderer(self.shared_state)
             
         # Setup udp socket
-        self.udp_client = UDPClient(self.shared_state.udp_port, self._on_udp_message)
+        self.udp_client = UDPClient(self.shared_state.udp_port)
         
         # Init controller if connected
         if pygame.joystick.get_count() > 0:
@@ -79,28 +78,52 @@ class GameClient:
         self.screen = pygame.display.set_mode(self.shared_state.menu_size)
         pygame.display.set_caption(f"Robot Battle ({self.shared_state.player_id})")
         self.clock = pygame.time.Clock()
+        self.render_pipeline = RenderPipeline((30, 30, 30))
             
         self._run()
         
     def _on_tcp_message(self, message: Message):
-        if isinstance(message, LobbyInfoMessage):
+        if isinstance(message, PingMessage):
+            self.tcp_client.send(PongMessage(message.sent_time))
+        elif isinstance(message, LobbyInfoMessage):
             self.lobby_menu_renderer.latest_lobby_info = message
         if isinstance(message, LobbyJoinedMessage):
             self.shared_state.client_state = ClientState.IN_LOBBY
         elif isinstance(message, RoundStartedMessage):
-            self.game_renderer.start_round(message)
-            self.main_thread_tasks.put(("resize", (message.arena_width, message.arena_height)))
+            # The renderers and the UDP client belong to the render thread, so rounds are started and ended there
+            self.main_thread_tasks.put(("round_started", message))
         elif isinstance(message, RoundEndedMessage):
-            if len(message.winner_id) > 0:
-                self.game_renderer.set_winner(message.winner_id)
-                threading.Timer(3.0, self._go_to_lobby).start()
-            else:
-                self._go_to_lobby()
+            self.main_thread_tasks.put(("round_ended", message))
+            
+    def _start_round(self, message: RoundStartedMessage):
+        self.udp_client.start_round()
+        if message.multicast_group:
+            self.udp_client.join_group(message.multicast_group, message.multicast_port)
+        self.game_renderer.start_round(message)
+        self._resize((message.arena_width, message.arena_height))
+        
+    def _end_round(self, message: RoundEndedMessage):
+        self._print_cpu_summary(message)
+        if len(message.winner_id) > 0:
+            self.game_renderer.set_winner(message.winner_id)
+            threading.Timer(3.0, self.main_thread_tasks.put, args=(("go_to_lobby", None),)).start()
+        else:
+            self._go_to_lobby()
+          
+    def _print_cpu_summary(self, message: RoundEndedMessage):
+        print("Robot script time this round:", flush=True)
+        for player_id, hooks in message.cpu_summary.items():
+            print(f"  {player_id}{' (you)' if player_id == self.shared_state.player_id else ''}: {describe_hook_summary(hooks)}", flush=True)
+        print(f"  draw_gui (this client): {self.game_renderer.draw_gui_timings.describe()}", flush=True)
           
     def _go_to_lobby(self):
         self.shared_state.client_state = ClientState.IN_LOBBY
         self.game_renderer.set_winner(None)
-        self.main_thread_tasks.put(("resize", self.shared_state.menu_size))
+        self._resize(self.shared_state.menu_size)
+        
+    def _resize(self, size: tuple[int, int]):
+        self.screen = pygame.display.set_mode(size)
+        self.render_pipeline.invalidate()
             
     def _on_tcp_disconnect(self):
         self.shared_state.client_state = ClientState.NOT_CONNECTED
@@ -112,19 +135,26 @@ class GameClient:
         elif isinstance(message, PlayerStaticInfoMessage):
             if self.shared_state.client_state == ClientState.IN_LOBBY:
                 self.shared_state.client_state = ClientState.IN_GAME
-            self.game_renderer.static_player_info = {p.idx: p for p in message.player_info}
+            self.game_renderer.set_static_player_info(message)
         elif isinstance(message, RobotStateMessage):
             self.game_renderer.robot_state = message.state
     
     def _run(self):       
         self.running = True
         last_update: datetime = datetime.now()
+        last_client_state: ClientState = None
         while self.running:
             while not self.main_thread_tasks.empty():
                 task, data = self.main_thread_tasks.get()
-                if task == "resize":
-                    width, height = data
-                    self.screen = pygame.display.set_mode((width, height))
+                if task == "round_started":
+                    self._start_round(data)
+                elif task == "round_ended":
+                    self._end_round(data)
+                elif task == "go_to_lobby":
+                    self._go_to_lobby()
+                    
+            for message in self.udp_client.poll():
+                self._on_udp_message(message)
             
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -145,18 +175,23 @@ class GameClient:
                 elif self.shared_state.client_state == ClientState.IN_GAME or self.shared_state.client_state == ClientState.IN_TEST:
                     self.game_renderer.on_event(event)
                     
-            self.screen.fill((30, 30, 30))
+            if self.shared_state.client_state != last_client_state:
+                self.render_pipeline.invalidate()
+                last_client_state = self.shared_state.client_state
+                
+            self.render_pipeline.begin_frame(self.screen)
             
             delta = datetime.now() - last_update
+            drawn_rects = None
             if self.shared_state.client_state == ClientState.NOT_CONNECTED:
-                self.connect_menu_renderer.render(self.screen, delta)
+                drawn_rects = self.connect_menu_renderer.render(self.screen, delta)
             elif self.shared_state.client_state == ClientState.IN_LOBBY:
-                self.lobby_menu_renderer.render(self.screen, delta)
+                drawn_rects = self.lobby_menu_renderer.render(self.screen, delta)
             elif self.shared_state.client_state == ClientState.IN_GAME or self.shared_state.client_state == ClientState.IN_TEST:
-                self.game_renderer.render(self.screen, delta)
+                drawn_rects = self.game_renderer.render(self.screen, delta)
                 
             last_update = datetime.now()
-            pygame.display.flip()
+            self.render_pipeline.end_frame(drawn_rects)
             self.clock.tick(60)
             
         pygame.quit()
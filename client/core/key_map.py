@@ -0,0 +1,18 @@
+import pygame
+
+from common.keys import Key
+
+
+PYGAME_KEY_MAP: dict[int, Key] = {
+    pygame.K_UP: Key.UP,
+    pygame.K_DOWN: Key.DOWN,
+    pygame.K_LEFT: Key.LEFT,
+    pygame.K_RIGHT: Key.RIGHT,
+    
+    pygame.K_q: Key.Q,
+    pygame.K_w: Key.W,
+    pygame.K_e: Key.E,
+    pygame.K_a: Key.A,
+    pygame.K_s: Key.S,
+    pygame.K_d: Key.D,
+}
@@ -0,0 +1,44 @@
+import pygame
+
+
+class RenderPipeline:
+    """Composes the static background layer with the entity and HUD layers, pushing only dirty regions to the display"""
+    
+    def __init__(self, background_color: tuple[int, int, int]):
+        self.background_color = background_color
+        self.background: pygame.Surface = None
+        
+        self.previous_rects: list[pygame.Rect] = []
+        self.full_redraw: bool = True
+        
+    def invalidate(self):
+        self.full_redraw = True
+        
+    def begin_frame(self, screen: pygame.Surface):
+        if self.background is None or self.background.get_size() != screen.get_size():
+            self.background = pygame.Surface(screen.get_size())
+            self.background.fill(self.background_color)
+            self.full_redraw = True
+            
+        if self.full_redraw:
+            screen.blit(self.background, (0, 0))
+        else:
+            # Erase what was drawn last frame by restoring the background below it
+            for rect in self.previous_rects:
+                screen.blit(self.background, rect, rect)
+                
+    def end_frame(self, drawn_rects: list[pygame.Rect] | None):
+        """drawn_rects being None means the whole screen was redrawn"""
+        if drawn_rects is None:
+            pygame.display.flip()
+            self.previous_rects = []
+            self.full_redraw = True
+            return
+        
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.previous_rects + drawn_rects)
+            
+        self.previous_rects = drawn_rects
+        self.full_redraw = False
@@ -1,8 +1,16 @@
 import pygame
 
+from client.core.surface_cache import SurfaceCache
+
+
+text_cache = SurfaceCache(512)
+
+def render_text(text: str, font: pygame.font.Font, color: tuple[int, int, int] = (255, 255, 255), antialias: bool = True) -> pygame.Surface:
+    color = tuple(color)
+    return text_cache.get((font, text, color, antialias), lambda: font.render(text, antialias, color))
 
 def render_text_center_at(screen: pygame.Surface, text: str, x: float, y: float, font: pygame.font.Font, color: tuple[int, int, int] = (255, 255, 255)) -> tuple[int, int]:
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(text, font, color)
     screen.blit(text_surface, (
         x - text_surface.get_width() / 2, 
         y - text_surface.get_height() / 2
@@ -10,12 +18,12 @@ def render_text_center_at(screen: pygame.Surface, text: str, x: float, y: float,
     return (text_surface.get_width(), text_surface.get_height())
         
 def render_text_top_left_at(screen: pygame.Surface, text: str, x: float, y: float, font: pygame.font.Font, color: tuple[int, int, int] = (255, 255, 255)) -> tuple[int, int]:
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(text, font, color)
     screen.blit(text_surface, (x, y))
     return (text_surface.get_width(), text_surface.get_height())
     
 def render_text_bottom_left_at(screen: pygame.Surface, text: str, x: float, y: float, font: pygame.font.Font, color: tuple[int, int, int] = (255, 255, 255)) -> tuple[int, int]:
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(text, font, color)
     screen.blit(text_surface, (
         x, 
         y - text_surface.get_height()
@@ -23,7 +31,7 @@ def render_text_bottom_left_at(screen: pygame.Surface, text: str, x: float, y: f
     return (text_surface.get_width(), text_surface.get_height())
 
 def render_text_top_right_at(screen: pygame.Surface, text: str, x: float, y: float, font: pygame.font.Font, color: tuple[int, int, int] = (255, 255, 255)) -> tuple[int, int]:
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(text, font, color)
     screen.blit(text_surface, (
         x - text_surface.get_width(), 
         y 
@@ -31,9 +39,9 @@ def render_text_top_right_at(screen: pygame.Surface, text: str, x: float, y: flo
     return (text_surface.get_width(), text_surface.get_height())
     
 def render_text_bottom_right_at(screen: pygame.Surface, text: str, x: float, y: float, font: pygame.font.Font, color: tuple[int, int, int] = (255, 255, 255)) -> tuple[int, int]:
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(text, font, color)
     screen.blit(text_surface, (
         x - text_surface.get_width(), 
         y - text_surface.get_height() 
     ))
-    return (text_surface.get_width(), text_surface.get_height())
\ No newline at end of file
+    return (text_surface.get_width(), text_surface.get_height())
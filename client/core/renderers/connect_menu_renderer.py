@@ -1,21 +1,23 @@
 from datetime import timedelta
-import glob
 import pygame
 
+from client.core.robot_catalog import RobotCatalog
 from client.core.render_utils import render_text_bottom_left_at, render_text_bottom_right_at, render_text_top_left_at, render_text_top_right_at
 from client.core.state_renderer import SharedState, StateRenderer
 from common.calculations import calculate_ability_cooldown, calculate_ability_energy_cost
 from common.constants import MIN_AXIS_VALUE
-from common.robot import Robot, RobotInfo, parse_robot_config_from_string
+from common.robot import Robot, RobotInfo, parse_robot_config_from_code
 from common.tcp_messages import PlayerInfoMessage
 
+ROBOT_FILE_CHECK_INTERVAL = timedelta(seconds=1)
+
 
 class ConnectMenuStateRenderer(StateRenderer):
     
     def __init__(self, state: SharedState):
         super().__init__(state)
         
-        self.all_robots = glob.glob(self.state.path + "\\robots\\*.py")
+        self.robot_catalog = RobotCatalog(self.state.path + "\\robots\\*.py")
         self.current_selected_robot: int = 0
         
         self.controller_up_prev_active: bool = False
@@ -25,19 +27,55 @@ class ConnectMenuStateRenderer(StateRenderer):
         
         self.failed_to_connect: bool = False
         
-        if len(self.all_robots) == 0:
+        self.time_since_file_check: timedelta = timedelta()
+        self.robot_stats_panel: pygame.Surface = None
+        self.robot_stats_panel_pos: tuple[int, int] = (0, 0)
+        self.robot_error: str = None
+        
+        if len(self.robot_catalog.entries) == 0:
             print("No robots to use. Add a robot configuration to 'client/robots'!")
             exit()
             
         self._create_robot()
     
     def _create_robot(self):
-        with open(self.all_robots[self.current_selected_robot]) as f:
-            config = parse_robot_config_from_string(f.read())
-        
-        self.state.robot = Robot.create(
-            config, 0, 0, 0
-        )
+        previous_robot = self.state.robot
+        try:
+            entry = self.robot_catalog.get(self.current_selected_robot)
+            config = parse_robot_config_from_code(entry.code)
+            
+            self.state.robot = Robot.create(
+                config, 0, 0, 0
+            )
+            self.robot_error = None
+            self._build_robot_stats_panel()
+        except Exception as e:
+            # Robot files are often saved half written, so the last robot that loaded stays in the preview
+            self.state.robot = previous_robot
+            self.robot_error = f"{type(e).__name__}: {e}"
+            self._build_robot_stats_panel()
+        
+    def _build_robot_stats_panel(self):
+        # Running the ability functions is expensive, so the stats are only rendered when the robot changes
+        panel = pygame.Surface(self.state.menu_size, pygame.SRCALPHA)
+        error_pos = (self.state.menu_size[0] - 550, 118)
+        if self.state.robot is not None:
+            error_pos = self._render_robot_stats(panel)
+        if self.robot_error is not None:
+            render_text_top_left_at(panel, self.robot_error, error_pos[0], error_pos[1] + 10, self.state.font_text, (255, 155, 155))
+        
+        bounds = panel.get_bounding_rect()
+        self.robot_stats_panel = panel.subsurface(bounds).copy()
+        self.robot_stats_panel_pos = bounds.topleft
+        
+    def _check_robot_file_changed(self, delta: timedelta):
+        self.time_since_file_check += delta
+        if self.time_since_file_check < ROBOT_FILE_CHECK_INTERVAL:
+            return
+        
+        self.time_since_file_check = timedelta()
+        if self.robot_catalog.has_changed(self.current_selected_robot):
+            self._create_robot()
     
     def on_event(self, event: pygame.event.Event):
         
@@ -48,15 +86,15 @@ class ConnectMenuStateRenderer(StateRenderer):
         if (event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN) or (event.type == pygame.JOYBUTTONDOWN and event.button == 0):
             try:
                 self.state.tcp.connect()
-                with open(self.all_robots[self.current_selected_robot]) as f:
-                    self.state.tcp.send(PlayerInfoMessage(self.state.player_id, int(self.state.udp_port), f.read()))
+                entry = self.robot_catalog.get(self.current_selected_robot)
+                self.state.tcp.send(PlayerInfoMessage(self.state.player_id, int(self.state.udp_port), entry.source))
             except:
                 self.failed_to_connect = True
         elif (event.type == pygame.KEYDOWN and event.key == pygame.K_UP) or (self.controller_up_active and not self.controller_up_prev_active):
             self.current_selected_robot = max(0, self.current_selected_robot - 1)
             self._create_robot()
         elif (event.type == pygame.KEYDOWN and event.key == pygame.K_DOWN) or (self.controller_down_active and not self.controller_down_prev_active):
-            self.current_selected_robot = min(len(self.all_robots)-1, self.current_selected_robot + 1)
+            self.current_selected_robot = min(len(self.robot_catalog.entries)-1, self.current_selected_robot + 1)
             self._create_robot()
             
         if event.type == pygame.JOYAXISMOTION and event.axis == 1:
@@ -66,8 +104,10 @@ class ConnectMenuStateRenderer(StateRenderer):
     
     
     def render(self, screen: pygame.Surface, delta: timedelta):
+        self._check_robot_file_changed(delta)
+        
         self._render_robot_selector(screen)
-        self._render_robot_stats(screen)
+        screen.blit(self.robot_stats_panel, self.robot_stats_panel_pos)
         
         render_text_bottom_right_at(screen, f"Press 'Enter'{' / A' if self.state.controller_connected else ''} to connect...", self.state.menu_size[0] - 50, self.state.menu_size[1] - 50, self.state.font_text)
         
@@ -81,9 +121,8 @@ class ConnectMenuStateRenderer(StateRenderer):
         text_left_margin = 75
         selector_spacing = 10
         selected_color = (255, 193, 7)
-        for i, file_path in enumerate(self.all_robots):
-            file_name = file_path.split("\\")[-1]
-            text = f"{file_name[:-3]}"
+        for i, entry in enumerate(self.robot_catalog.entries):
+            text = entry.name
             text_y = 75 + i * robot_spacing
             color = selected_color if i == self.current_selected_robot else (255, 255, 255)
             name_w, _ = render_text_top_left_at(screen, text, text_left_margin, text_y, self.state.font_text, color)
@@ -93,7 +132,7 @@ class ConnectMenuStateRenderer(StateRenderer):
                 render_text_top_left_at(screen, ">", text_left_margin - selector_spacing - w, text_y, self.state.font_text, color)
                 render_text_top_left_at(screen, "<", text_left_margin + name_w + selector_spacing, text_y, self.state.font_text, color)
                 
-    def _render_robot_stats(self, screen: pygame.Surface):
+    def _render_robot_stats(self, screen: pygame.Surface) -> tuple[int, int]:
         min_x = self.state.menu_size[0]
         max_x = 0
         max_y = 0
@@ -161,4 +200,6 @@ class ConnectMenuStateRenderer(StateRenderer):
         render_text_top_right_at(screen, "E", right_ability_margin + 50, top_margin - self.state.font_text.get_height() - 5, self.state.font_text)
         render_text_top_right_at(screen, "C", right_ability_margin + 125, top_margin - self.state.font_text.get_height() - 5, self.state.font_text)
         
-        render_text_top_left_at(screen, "Stats", min_x - padding, top_margin - padding - 20 - self.state.font_header.get_height() - 10, self.state.font_header)
\ No newline at end of file
+        render_text_top_left_at(screen, "Stats", min_x - padding, top_margin - padding - 20 - self.state.font_header.get_height() - 10, self.state.font_header)
+        
+        return (min_x - padding, max_y + padding)
\ No newline at end of file
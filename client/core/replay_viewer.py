@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta
+import pygame
+
+from client.core.render_pipeline import RenderPipeline
+from client.core.render_utils import render_text_bottom_left_at, render_text_bottom_right_at
+from client.core.renderers.game_renderer import GameStateRenderer
+from client.core.snapshot_store import SnapshotStore
+from client.core.state_renderer import ClientState, SharedState
+from common.constants import SERVER_TICK_RATE
+from common.replay import ReplayReader
+from common.udp_message import GameStateMessage
+
+
+MIN_SPEED = 0.25
+MAX_SPEED = 16
+
+TIMELINE_HEIGHT = 6
+TIMELINE_MARGIN = 10
+
+TICK_INTERVAL = timedelta(seconds=1 / SERVER_TICK_RATE)
+
+
+class ReplayViewer:
+    """Plays a replay file through the game renderer, states are decoded from the mapped file only when shown
+
+    Space pauses, up/down changes the speed, left/right steps one tick, page up/down jumps between keyframes
+    and clicking or dragging on the timeline seeks."""
+
+    def __init__(self, path: str):
+        self.reader = ReplayReader(path)
+
+        self.position: float = self.reader.first_tick # in ticks
+        self.speed: float = 1
+        self.paused: bool = False
+        self.scrubbing: bool = False
+
+        self.snapshots: SnapshotStore = SnapshotStore()
+        self.loaded_tick: int = None
+
+    def start(self):
+        pygame.init()
+        arena_size = (self.reader.arena_width, self.reader.arena_height)
+        self.shared_state = SharedState(
+            "",
+            player_id="replay",
+            menu_size=arena_size,
+            client_state=ClientState.REPLAY,
+            tcp=None,
+            udp_port=0,
+            controller_connected=False,
+            controller=None,
+            font_header=pygame.font.SysFont("Arial", 20),
+            font_text=pygame.font.SysFont("Arial", 16),
+        )
+
+        self.game_renderer = GameStateRenderer(self.shared_state)
+        self.game_renderer.arena_size = arena_size
+        self.game_renderer.set_static_player_info(self.reader.static_info)
+
+        self.screen = pygame.display.set_mode(arena_size)
+        pygame.display.set_caption("Robot Battle (Replay)")
+        self.clock = pygame.time.Clock()
+        self.render_pipeline = RenderPipeline((30, 30, 30))
+
+        self._run()
+
+    def _run(self):
+        self.running = True
+        last_update: datetime = datetime.now()
+        while self.running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                else:
+                    self.on_event(event)
+
+            delta = datetime.now() - last_update
+            last_update = datetime.now()
+
+            game_delta = timedelta() if self.paused or self.scrubbing else delta * self.speed
+            self._advance(game_delta / TICK_INTERVAL)
+
+            self.render_pipeline.begin_frame(self.screen)
+            drawn_rects = self.render(self.screen, game_delta)
+            self.render_pipeline.end_frame(drawn_rects)
+            self.clock.tick(60)
+
+        pygame.quit()
+        self.reader.close()
+
+    def on_event(self, event: pygame.event.Event):
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pygame.K_UP:
+                self.speed = min(self.speed * 2, MAX_SPEED)
+            elif event.key == pygame.K_DOWN:
+                self.speed = max(self.speed / 2, MIN_SPEED)
+            elif event.key == pygame.K_RIGHT:
+                self.paused = True
+                self._seek(int(self.position) + 1)
+            elif event.key == pygame.K_LEFT:
+                self.paused = True
+                self._seek(int(self.position) - 1)
+            elif event.key == pygame.K_PAGEUP:
+                self._seek(self.reader.get_keyframe(int(self.position) - 1))
+            elif event.key == pygame.K_PAGEDOWN:
+                self._seek(self.reader.get_keyframe(int(self.position) + self.reader.keyframe_interval))
+            elif event.key == pygame.K_HOME:
+                self._seek(self.reader.first_tick)
+            elif event.key == pygame.K_END:
+                self._seek(self.reader.last_tick)
+
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self._timeline_rect().inflate(0, 2 * TIMELINE_MARGIN).collidepoint(event.pos):
+            self.scrubbing = True
+            self._seek_to_x(event.pos[0])
+        elif event.type == pygame.MOUSEMOTION and self.scrubbing:
+            self._seek_to_x(event.pos[0])
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.scrubbing = False
+
+    def _advance(self, ticks: float):
+        if ticks <= 0:
+            return
+
+        previous_tick = int(self.position)
+        self.position = min(self.position + ticks, self.reader.last_tick)
+
+        # Explosions only exist in the tick they happened, so every tick passed is checked, not only the shown ones
+        for tick in range(previous_tick + 1, int(self.position) + 1):
+            self.game_renderer.add_explosions(GameStateMessage.peek_explosions(self.reader.get_payload(tick)))
+
+        if self.position >= self.reader.last_tick:
+            self.paused = True
+
+    def _seek(self, tick: int):
+        self.position = min(max(tick, self.reader.first_tick), self.reader.last_tick)
+        self.game_renderer.active_explosions.clear()
+
+    def _seek_to_x(self, x: int):
+        timeline = self._timeline_rect()
+        progress = min(max((x - timeline.left) / timeline.width, 0), 1)
+        self._seek(round(self.reader.first_tick + progress * (self.reader.tick_count - 1)))
+
+    def _load(self, tick: int):
+        if tick == self.loaded_tick:
+            return
+
+        next_tick = min(tick + 1, self.reader.last_tick)
+        if self.loaded_tick is None or tick != self.loaded_tick + 1:
+            self.snapshots.clear()
+            self.snapshots.add(self.reader.get_state(tick), self._tick_time(tick))
+
+        # Stepping forward reuses the newest state, so playback decodes one state per tick
+        self.snapshots.add(self.reader.get_state(next_tick), self._tick_time(tick + 1))
+        self.loaded_tick = tick
+
+    def _tick_time(self, tick: int) -> datetime:
+        return datetime.min + tick * TICK_INTERVAL
+
+    def render(self, screen: pygame.Surface, delta: timedelta) -> list[pygame.Rect] | None:
+        tick = int(self.position)
+        self._load(tick)
+
+        drawn_rects = self.game_renderer.render_frame(screen, self.snapshots.frame, self.position - tick, delta)
+        if drawn_rects is None:
+            return None
+
+        return drawn_rects + self._draw_timeline(screen, tick)
+
+    def _timeline_rect(self) -> pygame.Rect:
+        width, height = self.screen.get_size()
+        return pygame.Rect(TIMELINE_MARGIN, height - TIMELINE_MARGIN - TIMELINE_HEIGHT, width - 2 * TIMELINE_MARGIN, TIMELINE_HEIGHT)
+
+    def _draw_timeline(self, screen: pygame.Surface, tick: int) -> list[pygame.Rect]:
+        timeline = self._timeline_rect()
+        progress = (tick - self.reader.first_tick) / max(self.reader.tick_count - 1, 1)
+
+        drawn_rects = [
+            pygame.draw.rect(screen, (80, 80, 80), timeline),
+            pygame.draw.rect(screen, (200, 200, 200), (timeline.left, timeline.top, timeline.width * progress, timeline.height)),
+        ]
+
+        font = self.shared_state.font_text
+        seconds = (tick - self.reader.first_tick) / SERVER_TICK_RATE
+        total_seconds = (self.reader.tick_count - 1) / SERVER_TICK_RATE
+        text = f"{int(seconds // 60)}:{seconds % 60:04.1f} / {int(total_seconds // 60)}:{total_seconds % 60:04.1f}  (tick {tick})"
+        w, h = render_text_bottom_left_at(screen, text, timeline.left, timeline.top - 4, font)
+        drawn_rects.append(pygame.Rect(timeline.left, timeline.top - 4 - h, w, h))
+
+        status = "Paused" if self.paused else f"{self.speed:g}x"
+        w, h = render_text_bottom_right_at(screen, status, timeline.right, timeline.top - 4, font)
+        drawn_rects.append(pygame.Rect(timeline.right - w, timeline.top - 4 - h, w, h))
+
+        return drawn_rects
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import glob
+import os
+import threading
+from types import CodeType
+
+from common.robot import compile_robot_code, get_robot_code_hash
+
+
+@dataclass
+class RobotEntry:
+    path: str
+    name: str
+
+    mtime: float = field(default=None, init=False)
+    source: str = field(default=None, init=False)
+    code_hash: str = field(default=None, init=False)
+    code: CodeType = field(default=None, init=False)
+    error: Exception = field(default=None, init=False) # why the file at mtime could not be loaded
+
+
+class RobotCatalog:
+    """Index of the robot files, compiled on a background thread and cached by content hash"""
+
+    def __init__(self, pattern: str, max_compiled: int = 64):
+        self.entries: list[RobotEntry] = [
+            RobotEntry(path, path.split("\\")[-1][:-3])
+            for path in glob.glob(pattern)
+        ]
+
+        self.max_compiled = max_compiled
+        self.compiled: OrderedDict[str, CodeType] = OrderedDict()
+        self.lock = threading.Lock()
+
+        threading.Thread(target=self._load_all, daemon=True).start()
+
+    def _load_all(self):
+        for entry in self.entries:
+            try:
+                self._load(entry)
+            except Exception:
+                # Broken robots are reported when they are selected
+                pass
+
+    def get(self, index: int) -> RobotEntry:
+        return self._load(self.entries[index])
+
+    def has_changed(self, index: int) -> bool:
+        """A robot file that was removed or renamed counts as changed until it has been reported unavailable"""
+        entry = self.entries[index]
+        return self._get_mtime(entry.path) != entry.mtime
+
+    def _get_mtime(self, path: str) -> float | None:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _load(self, entry: RobotEntry) -> RobotEntry:
+        mtime = self._get_mtime(entry.path)
+        with self.lock:
+            if mtime is None:
+                entry.mtime = None
+                entry.code = None
+                raise FileNotFoundError(f"The robot file {entry.path} was removed or renamed")
+            if entry.mtime == mtime and entry.error is not None:
+                # A broken file is only read again once it has changed
+                raise entry.error
+            if entry.code is not None and entry.mtime == mtime:
+                return entry
+
+        try:
+            with open(entry.path) as f:
+                source = f.read()
+
+            code_hash = get_robot_code_hash(source)
+            with self.lock:
+                code = self.compiled.get(code_hash)
+                if code is not None:
+                    self.compiled.move_to_end(code_hash)
+            if code is None:
+                code = compile_robot_code(source, entry.path)
+        except Exception as e:
+            with self.lock:
+                entry.mtime = mtime
+                entry.code = None
+                entry.error = e
+            raise
+
+        with self.lock:
+            self.compiled[code_hash] = code
+            if len(self.compiled) > self.max_compiled:
+                self.compiled.popitem(last=False)
+            entry.mtime = mtime
+            entry.source = source
+            entry.code_hash = code_hash
+            entry.code = code
+            entry.error = None
+
+        return entry
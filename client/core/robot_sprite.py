@@ -0,0 +1,58 @@
+import math
+
+import pygame
+
+from common.calculations import calculate_weapon_point_offset
+from common.udp_message import PlayerStaticInfo
+
+WEAPON_SHAPE_POINTS = [(-2.5, -2.5), (7.55, -2.5), (7.5, 2.5), (-2.5, 2.5)]
+ROTATION_STEPS = 120 # 3 degrees per step
+
+
+class RobotSprite:
+    """Robot body, hull symbol and weapons pre-rendered once, with rotations cached per quantized angle"""
+    
+    def __init__(self, info: PlayerStaticInfo, rotation_steps: int = ROTATION_STEPS):
+        self.info = info
+        self.rotation_steps = rotation_steps
+        self.base = self._render_base()
+        self.rotations: dict[int, pygame.Surface] = {}
+        
+    def get(self, angle: float) -> pygame.Surface:
+        step = round(angle / (2 * math.pi) * self.rotation_steps) % self.rotation_steps
+        rotated = self.rotations.get(step)
+        if rotated is None:
+            # Screen y points down, so a positive game angle is a clockwise rotation
+            rotated = pygame.transform.rotozoom(self.base, -step * 360 / self.rotation_steps, 1)
+            self.rotations[step] = rotated
+            
+        return rotated
+        
+    def _render_base(self) -> pygame.Surface:
+        size = self.info.size
+        weapon_reach = max([math.hypot(w.x_offset, w.y_offset) + 8 for w in self.info.weapons], default=0)
+        center = math.ceil(max(size + 2, weapon_reach)) + 2
+        surface = pygame.Surface((center * 2, center * 2), pygame.SRCALPHA)
+        
+        # DRAW PLAYER AND DIRECTION MARKER
+        pygame.draw.circle(surface, self.info.color, (center, center), size, 2)
+        pygame.draw.aaline(surface, self.info.color, (center + size * 0.5, center), (center + size, center))
+        
+        # DRAW HULL TYPE SYMBOL
+        num_points = self.info.hull + 2
+        angle_step = math.pi * 2 / num_points
+        points = [(
+            center + size * 0.5 * math.cos(angle_step * i),
+            center + size * 0.5 * math.sin(angle_step * i)
+            ) for i in range(num_points)]
+        pygame.draw.aalines(surface, (100, 100, 100), True, points)
+        
+        # DRAW WEAPONS
+        for weapon in self.info.weapons:
+            transformed_points = [
+                calculate_weapon_point_offset((center, center), 0, (weapon.x_offset, weapon.y_offset), weapon.angle, point)
+                for point in WEAPON_SHAPE_POINTS
+            ]
+            pygame.draw.polygon(surface, (150, 150, 150), transformed_points)
+            
+        return surface
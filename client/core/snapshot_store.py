@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common.calculations import unwrap_sequence
+from common.constants import PROJECTILE_ID_WRAP, SERVER_TICK_RATE
+from common.udp_message import PROJECTILE_STATE_DTYPE, GameStateMessage, PlayerState
+
+
+@dataclass
+class Snapshot:
+    time: datetime
+    state: GameStateMessage
+    players: dict[int, PlayerState]
+    projectiles: np.ndarray
+    projectile_ids: np.ndarray # unwrapped projectile ids, aligned with projectiles
+
+
+@dataclass
+class InterpolationFrame:
+    previous: Snapshot
+    latest: Snapshot
+    interval: timedelta
+    player_pairs: list[tuple[PlayerState, PlayerState]] = field(default_factory=list)
+    projectiles_from: np.ndarray = field(default_factory=lambda: np.empty(0, PROJECTILE_STATE_DTYPE))
+    projectiles_to: np.ndarray = field(default_factory=lambda: np.empty(0, PROJECTILE_STATE_DTYPE))
+
+
+class SnapshotStore:
+    """Keeps the two newest game states and the entity pairs to interpolate between them"""
+
+    def __init__(self):
+        self.latest: Snapshot = None
+        self.frame: InterpolationFrame = None
+
+        self._projectile_id_reference: int = None
+
+    def add(self, state: GameStateMessage, time: datetime) -> InterpolationFrame:
+        projectiles = state.projectile_array
+        snapshot = Snapshot(
+            time,
+            state,
+            {p.idx: p for p in state.players},
+            projectiles,
+            self._unwrap_projectile_ids(projectiles)
+        )
+
+        previous = self.latest
+        self.latest = snapshot
+        if previous is None:
+            return None
+
+        # Projectile ids are unique within a snapshot, so the pairs are the intersection of the sorted ids
+        _, previous_idx, latest_idx = np.intersect1d(previous.projectile_ids, snapshot.projectile_ids, assume_unique=True, return_indices=True)
+
+        # States decoded in the same poll arrive microseconds apart, so the interval comes from their ticks
+        ticks = snapshot.state.tick - previous.state.tick
+        interval = timedelta(seconds=ticks / SERVER_TICK_RATE) if ticks > 0 else snapshot.time - previous.time
+
+        # The frame is swapped in as one object, so the render thread never sees half an update
+        self.frame = InterpolationFrame(
+            previous,
+            snapshot,
+            interval,
+            [
+                (previous.players[idx], player)
+                for idx, player in snapshot.players.items()
+                if idx in previous.players
+            ],
+            previous.projectiles[previous_idx],
+            projectiles[latest_idx]
+        )
+        return self.frame
+
+    def _unwrap_projectile_ids(self, projectiles: np.ndarray) -> np.ndarray:
+        ids = projectiles["id"].astype(np.int64)
+        if len(ids) == 0:
+            return ids
+
+        if self._projectile_id_reference is not None:
+            ids = unwrap_sequence(ids, self._projectile_id_reference, PROJECTILE_ID_WRAP)
+
+        self._projectile_id_reference = int(ids.max())
+        return ids
+
+    def clear(self):
+        self.latest = None
+        self.frame = None
+        self._projectile_id_reference = None
@@ -0,0 +1,101 @@
+from datetime import datetime
+from time import monotonic
+import pygame
+
+from client.core.render_pipeline import RenderPipeline
+from client.core.render_utils import render_text_center_at
+from client.core.renderers.game_renderer import GameStateRenderer
+from client.core.state_renderer import ClientState, SharedState
+from client.core.udp_client import UDPClient
+from common.spectate import NEWEST_MATCH, SPECTATE_JOIN, SPECTATE_KEEPALIVE, SPECTATE_LEAVE, SPECTATE_MAGIC, SPECTATE_REQUEST
+from common.tcp_messages import RoundStartedMessage
+from common.udp_message import GameStateMessage, MatchInfoMessage, PlayerStaticInfoMessage
+
+
+WAITING_SIZE = (800, 600)
+
+
+class SpectatorViewer:
+    """Watches matches through a spectator relay, without a robot or a connection to the game server
+
+    By default it follows each new match as it starts, a match id from the relay log watches that match only."""
+
+    def __init__(self, relay_address: tuple[str, int], match_id: int = NEWEST_MATCH):
+        self.relay_address = relay_address
+        self.match_id = match_id
+        self.match_info: MatchInfoMessage = None
+
+    def start(self):
+        pygame.init()
+        self.shared_state = SharedState(
+            "",
+            player_id="spectator",
+            menu_size=WAITING_SIZE,
+            client_state=ClientState.SPECTATE,
+            tcp=None,
+            udp_port=0,
+            controller_connected=False,
+            controller=None,
+            font_header=pygame.font.SysFont("Arial", 20),
+            font_text=pygame.font.SysFont("Arial", 16),
+        )
+
+        self.game_renderer = GameStateRenderer(self.shared_state)
+        self.udp_client = UDPClient(0)
+
+        self.screen = pygame.display.set_mode(WAITING_SIZE)
+        pygame.display.set_caption("Robot Battle (Spectating)")
+        self.clock = pygame.time.Clock()
+        self.render_pipeline = RenderPipeline((30, 30, 30))
+
+        self._run()
+
+    def _send_request(self, kind: int):
+        self.udp_client.send_to(SPECTATE_REQUEST.pack(SPECTATE_MAGIC, kind, self.match_id), self.relay_address)
+
+    def _on_udp_message(self, message):
+        if isinstance(message, MatchInfoMessage):
+            self.match_info = message
+            self.game_renderer.start_round(RoundStartedMessage(message.begin_time, message.arena_width, message.arena_height))
+            self.game_renderer.active_explosions.clear()
+            self.screen = pygame.display.set_mode((message.arena_width, message.arena_height))
+            pygame.display.set_caption(f"Robot Battle (Spectating {' vs '.join(message.player_ids)})")
+            self.render_pipeline.invalidate()
+        elif isinstance(message, PlayerStaticInfoMessage):
+            self.game_renderer.set_static_player_info(message)
+        elif isinstance(message, GameStateMessage):
+            self.game_renderer.add_new_state(message)
+
+    def _run(self):
+        self.running = True
+        last_update: datetime = datetime.now()
+        last_request = 0
+        while self.running:
+            # The relay forgets spectators it does not hear from
+            if monotonic() - last_request > SPECTATE_KEEPALIVE:
+                last_request = monotonic()
+                self._send_request(SPECTATE_JOIN)
+
+            for message in self.udp_client.poll():
+                self._on_udp_message(message)
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+
+            delta = datetime.now() - last_update
+            last_update = datetime.now()
+
+            self.render_pipeline.begin_frame(self.screen)
+            if self.match_info is None or self.game_renderer.static_player_info is None:
+                width, height = self.screen.get_size()
+                render_text_center_at(self.screen, "Waiting for a match...", width / 2, height / 2, self.shared_state.font_header)
+                drawn_rects = None
+            else:
+                drawn_rects = self.game_renderer.render(self.screen, delta)
+            self.render_pipeline.end_frame(drawn_rects)
+            self.clock.tick(60)
+
+        self._send_request(SPECTATE_LEAVE)
+        pygame.quit()
+        self.udp_client.close()
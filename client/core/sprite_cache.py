@@ -0,0 +1,72 @@
+from enum import IntEnum
+import math
+
+import pygame
+
+from client.core.surface_cache import SurfaceCache
+from common.projectile import ProjectileModifier
+
+
+class SpriteKind(IntEnum):
+    PROJECTILE = 1
+    EXPLOSION = 2
+    
+EXPLOSION_RADIUS_STEP = 2
+PROJECTILE_DIRECTION_STEPS = 32
+NO_DIRECTION = -1
+
+
+class SpriteCache:
+    """Pre-rendered projectile and explosion sprites keyed by (kind, size, modifier flags)"""
+    
+    def __init__(self, max_size: int = 1024):
+        self.cache = SurfaceCache(max_size)
+        
+    def get_projectile(self, size: int, modifiers: int, direction: tuple[float, float]) -> pygame.Surface:
+        # Only the trail of homing and piercing projectiles depends on the direction
+        direction_step = NO_DIRECTION
+        if modifiers & (ProjectileModifier.HOMING | ProjectileModifier.PIERCING) and direction != (0, 0):
+            angle = math.atan2(direction[1], direction[0])
+            direction_step = round(angle / (2 * math.pi) * PROJECTILE_DIRECTION_STEPS) % PROJECTILE_DIRECTION_STEPS
+            
+        return self.cache.get(
+            (SpriteKind.PROJECTILE, size, modifiers, direction_step),
+            lambda: self._render_projectile(size, modifiers, direction_step)
+        )
+        
+    def get_explosion(self, radius: float) -> pygame.Surface:
+        radius = max(1, round(radius / EXPLOSION_RADIUS_STEP) * EXPLOSION_RADIUS_STEP)
+        return self.cache.get(
+            (SpriteKind.EXPLOSION, radius, 0),
+            lambda: self._render_explosion(radius)
+        )
+        
+    def _render_projectile(self, size: int, modifiers: int, direction_step: int) -> pygame.Surface:
+        dx_n, dy_n = 0, 0
+        if direction_step != NO_DIRECTION:
+            angle = direction_step * 2 * math.pi / PROJECTILE_DIRECTION_STEPS
+            dx_n, dy_n = math.cos(angle), math.sin(angle)
+            
+        center = math.ceil(max(size + 2, size * 1.2 + 30, size * 4.8)) + 1
+        surface = pygame.Surface((center * 2, center * 2), pygame.SRCALPHA)
+        
+        if modifiers & ProjectileModifier.BOUNCING > 0:
+            pygame.draw.circle(surface, (124, 179, 66), (center, center), size + 2, 2)
+            
+        if modifiers & ProjectileModifier.HOMING > 0:
+            pygame.draw.circle(surface, (171, 71, 188, 205), (center - (size + 10) * dx_n, center - (size + 10) * dy_n), size * 0.8)
+            pygame.draw.circle(surface, (171, 71, 188, 135), (center - (size + 20) * dx_n, center - (size + 20) * dy_n), size * 0.5)
+            pygame.draw.circle(surface, (171, 71, 188, 25), (center - (size + 30) * dx_n, center - (size + 30) * dy_n), size * 0.2)
+                
+        if modifiers & ProjectileModifier.PIERCING > 0:
+            pygame.draw.circle(surface, (84, 110, 122, 205), (center + (size * 4) * dx_n, center + (size * 4) * dy_n), size * 0.8)
+        
+        color = (211, 47, 47) if modifiers & ProjectileModifier.EXPLOSIVE > 0 else (253, 216, 53)
+        pygame.draw.circle(surface, color, (center, center), size)
+        
+        return surface
+    
+    def _render_explosion(self, radius: int) -> pygame.Surface:
+        surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surface, (211, 47, 47, 55), (radius, radius), radius)
+        return surface
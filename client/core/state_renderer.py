@@ -13,6 +13,8 @@ class ClientState(Enum):
     IN_LOBBY = 2
     IN_GAME = 3
     IN_TEST = 4
+    REPLAY = 5
+    SPECTATE = 6
 
 @dataclass
 class SharedState:
@@ -35,7 +37,8 @@ class StateRenderer:
     def __init__(self, shared_state: SharedState):
         self.state = shared_state
     
-    def render(self, screen: pygame.Surface, delta: timedelta):
+    def render(self, screen: pygame.Surface, delta: timedelta) -> list[pygame.Rect] | None:
+        """Returns the regions drawn this frame, or None if the whole screen should be updated"""
         pass
     
     def on_event(self, event: pygame.event.Event):
@@ -0,0 +1,37 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import pygame
+
+
+class SurfaceCache:
+    """Size bounded cache of pre-rendered surfaces, evicting the least recently used entry"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.surfaces: OrderedDict[Hashable, pygame.Surface] = OrderedDict()
+        
+        self.hits: int = 0
+        self.misses: int = 0
+        
+    def get(self, key: Hashable, create: Callable[[], pygame.Surface]) -> pygame.Surface:
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = create()
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+            
+        return surface
+    
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0
+    
+    def clear(self):
+        self.surfaces.clear()
@@ -6,7 +6,8 @@ import socket
 import threading
 from typing import Callable
 
-from common.tcp_messages import LobbyInfoMessage, LobbyJoinedMessage, Message, RoundEndedMessage, RoundStartedMessage
+from common.net_impairment import NetImpairment
+from common.tcp_messages import LobbyInfoMessage, LobbyJoinedMessage, Message, PingMessage, RoundEndedMessage, RoundStartedMessage
 
 class TCPClient:
     def __init__(self, message_callback: Callable[[Message], None], disconnect_callback: Callable[[], None], host="127.0.0.1", port=5000):
@@ -16,6 +17,7 @@ class TCPClient:
         self.disconnect_callback = disconnect_callback
         
         self.connected = False
+        self.impairment = NetImpairment.load("client", self._send_bytes, "client-tcp", ordered=True)
 
     def connect(self):
         self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -75,12 +77,20 @@ class TCPClient:
             return RoundEndedMessage(**message)
         elif message_type == 8:
             return LobbyJoinedMessage(**message)
+        elif message_type == 9:
+            return PingMessage(**message)
 
     def send(self, message: object):
         message_bytes = bytearray(json.dumps(dataclasses.asdict(message)).encode())
         message_bytes.insert(0, 2)
         message_bytes.insert(len(message_bytes), 3)
-        self.client_socket.sendall(message_bytes)
+        if self.impairment is None:
+            self._send_bytes(message_bytes)
+        else:
+            self.impairment.submit(message_bytes)
+            
+    def _send_bytes(self, data: bytes):
+        self.client_socket.sendall(data)
 
     def close(self):
         self.connected = False
@@ -1,51 +1,155 @@
-from collections import defaultdict
 import socket
 import struct
 import threading
 from typing import Callable
 
 from common.constants import MAX_UDP_PACKET_SIZE
-from common.udp_message import GameStateMessage, PlayerStaticInfoMessage, RobotStateMessage, UDPMessage
+from common.net_impairment import NetImpairment
+from common.udp_message import GAME_STATE_TYPE, MATCH_INFO_TYPE, PLAYER_STATIC_INFO_TYPE, ROBOT_STATE_TYPE, GameStateMessage, MatchInfoMessage, PlayerStaticInfoMessage, RobotStateMessage, UDPMessage
+from client.core.datagram_ring import DatagramRing
+
+MAX_PENDING_MESSAGES = 64
+PACKET_HEADER_SIZE = 10 # "<HHHH" followed by b"||"
+GAME_STATES_PER_POLL = 2 # the renderer only interpolates between the two newest states
 
 
 class UDPClient:
     
-    def __init__(self, port: int, on_message_callback: Callable[[UDPMessage], None]):
-        self.on_message_callback = on_message_callback
-        
-        self.buffers = defaultdict(lambda: {"parts": {}, "count": None})
+    def __init__(self, port: int):
+        self.ring = DatagramRing()
+        self.buffers: dict[int, dict] = {}
+        self.last_tick: int = -1
         
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_socket.bind(("0.0.0.0", int(port)))
-        threading.Thread(target=self._udp_listener, daemon=True).start()
+        # Like every channel, UDP is impaired where it is sent, so what the server sends is impaired by the server only
+        self.impairment = NetImpairment.load("client", self.udp_socket.sendto, "client-udp")
+        threading.Thread(target=self._udp_listener, args=(self.udp_socket, self._receive), daemon=True).start()
         
-    def _udp_listener(self):
-        while True:
-            data, _ = self.udp_socket.recvfrom(MAX_UDP_PACKET_SIZE * 2)
-            
+        # Game states sent to a multicast group arrive on a socket of their own, each socket has its own ring
+        # as a ring takes a single producer
+        self.group_ring = DatagramRing()
+        self.group_socket: socket.socket = None
+        self.group_address: tuple[str, int] = None
+        
+    def _udp_listener(self, udp_socket: socket.socket, receive: Callable[[bytes], None]):
+        # The receiver thread only hands raw datagrams over, all decoding happens in poll
+        try:
+            while True:
+                data, _ = udp_socket.recvfrom(MAX_UDP_PACKET_SIZE * 2)
+                receive(data)
+        except OSError:
+            pass
+        
+    def _receive(self, data: bytes):
+        self.ring.push(data)
+        
+    def _receive_group(self, data: bytes):
+        self.group_ring.push(data)
+        
+    def join_group(self, group: str, port: int):
+        """Receives what the server sends to the multicast group, until another group is joined"""
+        if self.group_address == (group, port):
+            return
+        self.leave_group()
+        
+        group_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Every client on the machine binds the same port, each joined socket gets its own copy of a packet
+        group_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            group_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        group_socket.bind(("", port))
+        group_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(group) + socket.inet_aton("0.0.0.0"))
+        
+        self.group_socket = group_socket
+        self.group_address = (group, port)
+        threading.Thread(target=self._udp_listener, args=(group_socket, self._receive_group), daemon=True).start()
+        
+    def leave_group(self):
+        if self.group_socket is not None:
+            self.group_socket.close()
+            self.group_socket = None
+            self.group_address = None
+        
+    def start_round(self):
+        """Ticks start over each round, this resets them when the static info of the round is lost"""
+        # The rings are not cleared, they may already hold the static info of the new round
+        self.last_tick = -1
+        
+    def poll(self) -> list[UDPMessage]:
+        """Drains received datagrams and decodes the newest messages, should be called once per frame"""
+        return self._decode_newest(self._assemble(self.ring.drain() + self.group_ring.drain()))
+    
+    def _assemble(self, datagrams: list[bytes]) -> list[tuple[int, bytes]]:
+        """Collects the fragments of each message, returns the type and payload of every completed message"""
+        completed: list[tuple[int, bytes]] = []
+        for data in datagrams:
             if len(data) < 8:
                 continue
             
-            header_raw, chunk = data.split(b"||", 1)
-            msg_id, msg_type, part_idx, part_count =  struct.unpack_from("<HHHH", header_raw, 0)
+            msg_id, msg_type, part_idx, part_count = struct.unpack_from("<HHHH", data, 0)
+            chunk = data[PACKET_HEADER_SIZE:]
             
-            buf = self.buffers[msg_id]
+            buf = self.buffers.get(msg_id)
+            if buf is None:
+                buf = {"parts": {}, "count": part_count}
+                self.buffers[msg_id] = buf
             buf["parts"][part_idx] = chunk
-            buf["count"] = part_count
             
             if len(buf["parts"]) == part_count:
-                full = b"".join(buf["parts"][i] for i in range(part_count))
+                completed.append((msg_type, b"".join(buf["parts"][i] for i in range(part_count))))
                 del self.buffers[msg_id]
                 
-                message: UDPMessage = None
-                if msg_type == 1:
-                    message = PlayerStaticInfoMessage.from_bytes(full)
-                elif msg_type == 2:
-                    message = GameStateMessage.from_bytes(full)
-                elif msg_type == 3:
-                    message = RobotStateMessage.from_bytes(full)
-            
-                self.on_message_callback(message)
+        # Fragments of lost messages are never completed, so only the newest are kept
+        while len(self.buffers) > MAX_PENDING_MESSAGES:
+            del self.buffers[next(iter(self.buffers))]
+            
+        return completed
+    
+    def _decode_newest(self, completed: list[tuple[int, bytes]]) -> list[UDPMessage]:
+        game_states: list[tuple[int, bytes]] = []
+        newest_robot_state: bytes = None
+        messages: list[UDPMessage] = []
+        
+        for msg_type, data in completed:
+            if msg_type == PLAYER_STATIC_INFO_TYPE:
+                # Static info starts a new round, where ticks start over
+                messages.append(PlayerStaticInfoMessage.from_bytes(data))
+                self.last_tick = -1
+                game_states.clear()
+            elif msg_type == GAME_STATE_TYPE:
+                game_states.append((GameStateMessage.peek_tick(data), data))
+            elif msg_type == ROBOT_STATE_TYPE:
+                newest_robot_state = data
+            elif msg_type == MATCH_INFO_TYPE:
+                messages.append(MatchInfoMessage.from_bytes(data))
+                
+        game_states = sorted(filter(lambda s: s[0] > self.last_tick, game_states), key=lambda s: s[0])
+        
+        # Skipped states are never decoded, but their explosions are still shown
+        skipped_explosions: list[tuple[int, int, int]] = []
+        for _, data in game_states[:-GAME_STATES_PER_POLL]:
+            skipped_explosions += GameStateMessage.peek_explosions(data)
+            
+        for tick, data in game_states[-GAME_STATES_PER_POLL:]:
+            state: GameStateMessage = GameStateMessage.from_bytes(data)
+            state.explosions = skipped_explosions + state.explosions
+            skipped_explosions = []
+            
+            messages.append(state)
+            self.last_tick = tick
+            
+        if newest_robot_state is not None:
+            messages.append(RobotStateMessage.from_bytes(newest_robot_state))
+            
+        return messages
+                
+    def send_to(self, data: bytes, address: tuple[str, int]):
+        if self.impairment is None:
+            self.udp_socket.sendto(data, address)
+        else:
+            self.impairment.submit(data, address)
                 
     def close(self):
-        self.udp_socket.close()
\ No newline at end of file
+        self.udp_socket.close()
+        self.leave_group()
@@ -1,8 +1,26 @@
+import sys
 from time import sleep
 from client.core.game_client import GameClient
+from client.core.replay_viewer import ReplayViewer
+from client.core.spectator_viewer import SpectatorViewer
+from common.spectate import NEWEST_MATCH, parse_address
 
 
 def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "-replay":
+        try:
+            viewer = ReplayViewer(sys.argv[2])
+        except ValueError as e:
+            print(e, flush=True)
+            return
+        viewer.start()
+        return
+    
+    if len(sys.argv) > 2 and sys.argv[1] == "-spectate":
+        viewer = SpectatorViewer(parse_address(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else NEWEST_MATCH)
+        viewer.start()
+        return
+    
     client = GameClient()
     client.start()
 
@@ -11,6 +11,12 @@ def rot(vx, vy, a):
     sn = math.sin(a)
     return vx * cs - vy * sn, vx * sn + vy * cs
 
+def unwrap_sequence(value: int, reference: int, wrap: int) -> int:
+    """Maps a wrapping counter value to the unwrapped value closest to the reference, also works element wise on NumPy arrays"""
+    diff = (value - reference) % wrap
+    diff = diff - wrap * (diff >= wrap // 2)
+    return reference + diff
+
 def calculate_weapon_point_offset(
     player_pos: tuple[float, float], 
     player_angle: float, 
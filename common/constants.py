@@ -2,4 +2,8 @@ TOTAL_STAT_POINTS = 10
 
 MAX_UDP_PACKET_SIZE = 1024
 
-MIN_AXIS_VALUE = 0.1
\ No newline at end of file
+SERVER_TICK_RATE = 30
+
+MIN_AXIS_VALUE = 0.1
+
+PROJECTILE_ID_WRAP = 65000
\ No newline at end of file
@@ -0,0 +1,37 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class HookTimings:
+    """Cumulative timing of the calls into one robot script hook"""
+    calls: int = field(default=0, init=False)
+    total_ns: int = field(default=0, init=False)
+    max_ns: int = field(default=0, init=False)
+    last_ns: int = field(default=0, init=False)
+    
+    def record(self, ns: int):
+        self.calls += 1
+        self.total_ns += ns
+        self.max_ns = max(self.max_ns, ns)
+        self.last_ns = ns
+        
+    def average_ns(self) -> float:
+        return self.total_ns / self.calls if self.calls > 0 else 0
+    
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": self.total_ns / 1e6,
+            "avg_ms": self.average_ns() / 1e6,
+            "max_ms": self.max_ns / 1e6,
+        }
+    
+    def describe(self) -> str:
+        return f"avg {self.average_ns() / 1e6:.3f} ms, max {self.max_ns / 1e6:.3f} ms, {self.calls} calls"
+
+
+def describe_hook_summary(hooks: dict[str, dict]) -> str:
+    return ", ".join(
+        f"{hook} avg {timing['avg_ms']:.3f} ms (max {timing['max_ms']:.3f} ms, {timing['calls']} calls)"
+        for hook, timing in hooks.items()
+    )
@@ -0,0 +1,21 @@
+from enum import IntEnum
+
+
+class Key(IntEnum):
+    """Keys sent in input messages, clients map their own key codes to these"""
+    UP = 1
+    DOWN = 2
+    LEFT = 3
+    RIGHT = 4
+    
+    Q = 5
+    W = 6
+    E = 7
+    A = 8
+    S = 9
+    D = 10
+
+
+class KeyState(IntEnum):
+    DOWN = 1
+    UP = 2
@@ -0,0 +1,199 @@
+from dataclasses import dataclass, fields
+import functools
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+from time import monotonic_ns
+from typing import Callable
+
+
+# Each side impairs the packets it sends and never the ones it receives, so every direction is impaired once.
+# The config file is JSON with any of the ImpairmentConfig fields, and optionally "server" and "client" objects
+# with fields that only apply to that side, e.g. {"latency_ms": 40, "jitter_ms": 10, "server": {"loss": 0.02}}.
+# Environment variables override the file: ROBOT_BATTLE_NET_LATENCY_MS applies to both sides and
+# ROBOT_BATTLE_NET_SERVER_LATENCY_MS only to the server.
+CONFIG_FILE_VARIABLE = "ROBOT_BATTLE_NET_IMPAIRMENT"
+VARIABLE_PREFIX = "ROBOT_BATTLE_NET_"
+
+
+@dataclass
+class ImpairmentConfig:
+    latency_ms: float = 0
+    jitter_ms: float = 0 # each packet is delayed up to this much more or less than the latency
+    loss: float = 0 # probability a packet is dropped
+    duplicate: float = 0 # probability a packet is sent twice
+    reorder: float = 0 # probability a packet is held back, so the packets after it overtake it
+    reorder_ms: float = 50 # how long a reordered packet is held back
+    tcp_retransmit_ms: float = 200 # TCP does not lose data, a lost segment delays the stream this much instead
+    seed: int = 0
+
+    def is_enabled(self) -> bool:
+        return self.latency_ms > 0 or self.jitter_ms > 0 or self.loss > 0 or self.duplicate > 0 or self.reorder > 0
+
+    def describe(self) -> str:
+        return (f"latency {self.latency_ms:g} ms ± {self.jitter_ms:g} ms, loss {self.loss * 100:g}%, duplicate {self.duplicate * 100:g}%, "
+                f"reorder {self.reorder * 100:g}% by {self.reorder_ms:g} ms, seed {self.seed}")
+
+
+@functools.cache
+def load_impairment_config(side: str) -> ImpairmentConfig | None:
+    """Reads the impairment of one side ("server" or "client"), returns None when the network is not impaired"""
+    values: dict = {}
+
+    path = os.environ.get(CONFIG_FILE_VARIABLE)
+    if path:
+        with open(path) as f:
+            file_config: dict = json.load(f)
+        values.update({k: v for k, v in file_config.items() if not isinstance(v, dict)})
+        values.update(file_config.get(side, {}))
+
+    for prefix in [VARIABLE_PREFIX, f"{VARIABLE_PREFIX}{side.upper()}_"]:
+        for config_field in fields(ImpairmentConfig):
+            value = os.environ.get(prefix + config_field.name.upper())
+            if value is not None:
+                values[config_field.name] = value
+
+    config = ImpairmentConfig(**{
+        config_field.name: int(values[config_field.name]) if config_field.type is int else float(values[config_field.name])
+        for config_field in fields(ImpairmentConfig)
+        if config_field.name in values
+    })
+    if not config.is_enabled():
+        return None
+
+    print(f"Network impairment ({side}): {config.describe()}", flush=True)
+    return config
+
+
+# A delivery thread without packets exits after this many seconds, the next packet starts it again
+IDLE_THREAD_TIMEOUT = 5
+# Sends that fail after the caller moved on are printed on the first failure and then once per this many
+FAILED_SEND_REPORT_INTERVAL = 100
+
+
+class ImpairmentScheduler:
+    """A thread that delivers held back packets when they are due
+
+    The unordered channels of a process share one scheduler and every ordered channel has its own,
+    so a blocking send to one slow peer only holds back the rest of its own stream."""
+
+    def __init__(self):
+        self.queue: list[tuple[int, int, Callable[..., None], tuple]] = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+
+    def schedule(self, due_ns: int, deliver: Callable[..., None], args: tuple):
+        with self.condition:
+            # The sequence keeps packets due at the same time in the order they were scheduled
+            heapq.heappush(self.queue, (due_ns, next(self.sequence), deliver, args))
+            if not self.running:
+                self.running = True
+                threading.Thread(target=self._run, daemon=True).start()
+            elif self.queue[0][0] == due_ns:
+                self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while len(self.queue) == 0 or self.queue[0][0] > monotonic_ns():
+                    if len(self.queue) == 0:
+                        self.condition.wait(IDLE_THREAD_TIMEOUT)
+                        if len(self.queue) == 0:
+                            self.running = False
+                            return
+                        continue
+                    self.condition.wait((self.queue[0][0] - monotonic_ns()) / 1e9)
+                _, _, deliver, args = heapq.heappop(self.queue)
+
+            deliver(*args)
+
+
+_scheduler: ImpairmentScheduler = None
+_scheduler_lock = threading.Lock()
+
+def _get_scheduler() -> ImpairmentScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ImpairmentScheduler()
+        return _scheduler
+
+
+class NetImpairment:
+    """Adds latency, jitter, loss, duplication and reordering to one channel, packets are passed on through deliver
+
+    Ordered channels (TCP) keep the order of the data and turn loss into a retransmission delay.
+    When any delay is configured every packet is delivered from a scheduler thread, never from the caller."""
+
+    def __init__(self, config: ImpairmentConfig, deliver: Callable[..., None], name: str, ordered: bool = False):
+        self.config = config
+        self.deliver = deliver
+        self.ordered = ordered
+        self.name = name
+        self.rng = random.Random(f"{config.seed}:{name}")
+        self.lock = threading.Lock()
+
+        # Without any delay packets are passed on right away, by the caller
+        self.scheduled = config.latency_ms > 0 or config.jitter_ms > 0 or config.reorder > 0 or (ordered and config.loss > 0)
+        self.scheduler: ImpairmentScheduler = ImpairmentScheduler() if ordered else _get_scheduler()
+
+        self.last_due_ns: int = 0
+        self.dropped: int = 0
+        self.duplicated: int = 0
+        self.reordered: int = 0
+        self.failed: int = 0
+
+    @staticmethod
+    def load(side: str, deliver: Callable[..., None], name: str, ordered: bool = False) -> "NetImpairment | None":
+        config = load_impairment_config(side)
+        if config is None:
+            return None
+        return NetImpairment(config, deliver, name, ordered)
+
+    def submit(self, *args):
+        """Passes the packet on with the configured impairment, arguments must not be reused by the caller"""
+        with self.lock:
+            self._submit(args)
+
+    def _submit(self, args: tuple):
+        config = self.config
+        extra_ms = 0
+        if self.rng.random() < config.loss:
+            if not self.ordered:
+                self.dropped += 1
+                return
+            extra_ms = config.tcp_retransmit_ms
+
+        copies = 1
+        if not self.ordered and self.rng.random() < config.duplicate:
+            self.duplicated += 1
+            copies = 2
+
+        for _ in range(copies):
+            delay_ms = extra_ms + max(config.latency_ms + self.rng.uniform(-config.jitter_ms, config.jitter_ms), 0)
+            if not self.ordered and self.rng.random() < config.reorder:
+                self.reordered += 1
+                delay_ms += config.reorder_ms
+
+            if not self.scheduled:
+                self.deliver(*args)
+                continue
+
+            due_ns = monotonic_ns() + int(delay_ms * 1e6)
+            if self.ordered:
+                due_ns = max(due_ns, self.last_due_ns)
+                self.last_due_ns = due_ns
+            self.scheduler.schedule(due_ns, self._deliver_due, (args,))
+
+    def _deliver_due(self, args: tuple):
+        try:
+            self.deliver(*args)
+        except OSError as e:
+            # Usually the socket was closed while the packet was held back
+            self.failed += 1
+            if self.failed == 1 or self.failed % FAILED_SEND_REPORT_INTERVAL == 0:
+                print(f"Network impairment ({self.name}): {self.failed} sends of held back packets failed, the last with: {e}", flush=True)
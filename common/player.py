@@ -2,6 +2,7 @@ import colorsys
 import random
 import socket
 from dataclasses import dataclass, field
+from datetime import timedelta
 from common.robot import RobotInterface
 from server.tcp_sender import TcpSender
 
@@ -16,6 +17,10 @@ class Player:
     udp_port: int
     sender: TcpSender
     robot_configuration: RobotInterface
+    robot_code_hash: str = field(default="")
+    robot_code: str = field(default="")
     
     color: tuple[int, int, int] = field(default_factory=get_random_color, init=False)
+    latency: timedelta = field(default_factory=timedelta, init=False)
+    udp_address: tuple[str, int] = field(default=None, init=False)
     
@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 
+from common.keys import Key
 from common.player import Player
 from common.robot import Robot
 
@@ -35,6 +36,9 @@ class PlayerKeyState:
         
         return state
 
+# The key state field each key sets
+KEY_FIELDS: dict[int, str] = {key: key.name.lower() for key in Key}
+
 @dataclass
 class PlayerInstance:
     idx: int
@@ -0,0 +1,127 @@
+import bisect
+import mmap
+import struct
+
+import numpy as np
+
+from common.udp_message import GameStateMessage, PlayerStaticInfoMessage
+
+
+# Replay file layout, all little endian:
+#   header    magic, version, keyframe interval, arena size, static info length, static info message bytes
+#   records   one per tick: tick, flags, payload length, encoded GameStateMessage
+#   index     record offset per tick from the first tick, then the keyframe ticks
+#   trailer   index offset, first tick, tick count, keyframe count, end magic
+REPLAY_MAGIC = b"RBRP"
+REPLAY_END_MAGIC = b"RBIX"
+REPLAY_VERSION = 1
+
+REPLAY_HEADER = struct.Struct("<4sHHHHI")
+RECORD_HEADER = struct.Struct("<IBI")
+REPLAY_TRAILER = struct.Struct("<QIII4s")
+
+RECORD_KEYFRAME = 1
+
+KEYFRAME_INTERVAL = 30 # one keyframe per second of play
+
+OFFSET_DTYPE = np.dtype("<u8")
+TICK_DTYPE = np.dtype("<u4")
+
+
+class ReplayReader:
+    """Memory maps a replay file, any tick can be looked up through the index without reading the records before it"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.keyframe_interval, self.arena_width, self.arena_height, static_info_length \
+            = REPLAY_HEADER.unpack_from(self.data, 0)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"'{path}' is not a supported replay file")
+
+        self.static_info: PlayerStaticInfoMessage = PlayerStaticInfoMessage.from_bytes(
+            self.data[REPLAY_HEADER.size:REPLAY_HEADER.size + static_info_length])
+        self.records_offset = REPLAY_HEADER.size + static_info_length
+
+        if not self._read_index():
+            # The recording was not closed properly, so the index is rebuilt from the records
+            self._scan_index()
+
+        if self.tick_count == 0:
+            # The match ended before its first state was recorded
+            self.close()
+            raise ValueError(f"'{path}' is an empty replay, it has no recorded ticks")
+
+    def _read_index(self) -> bool:
+        if len(self.data) < self.records_offset + REPLAY_TRAILER.size:
+            return False
+
+        index_offset, self.first_tick, tick_count, keyframe_count, magic \
+            = REPLAY_TRAILER.unpack_from(self.data, len(self.data) - REPLAY_TRAILER.size)
+        if magic != REPLAY_END_MAGIC:
+            return False
+
+        self.offsets: np.ndarray = np.frombuffer(self.data, OFFSET_DTYPE, tick_count, index_offset)
+        self.keyframes: list[int] = np.frombuffer(self.data, TICK_DTYPE, keyframe_count, index_offset + self.offsets.nbytes).tolist()
+        return True
+
+    def _scan_index(self):
+        offsets: list[int] = []
+        keyframes: list[int] = []
+        self.first_tick = 0
+
+        offset = self.records_offset
+        while offset + RECORD_HEADER.size <= len(self.data):
+            tick, flags, length = RECORD_HEADER.unpack_from(self.data, offset)
+            if offset + RECORD_HEADER.size + length > len(self.data):
+                break
+
+            if len(offsets) == 0:
+                self.first_tick = tick
+            while len(offsets) < tick - self.first_tick:
+                offsets.append(offsets[-1])
+            if len(offsets) == tick - self.first_tick:
+                offsets.append(offset)
+                if flags & RECORD_KEYFRAME:
+                    keyframes.append(tick)
+
+            offset += RECORD_HEADER.size + length
+
+        self.offsets = np.array(offsets, dtype=OFFSET_DTYPE)
+        self.keyframes = keyframes
+
+    @property
+    def tick_count(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def last_tick(self) -> int:
+        return self.first_tick + self.tick_count - 1
+
+    def get_payload(self, tick: int) -> memoryview:
+        """Returns the encoded game state of a tick as a view into the mapped file"""
+        if not self.first_tick <= tick <= self.last_tick:
+            raise IndexError(f"Tick {tick} is not in the replay ({self.first_tick}-{self.last_tick})")
+
+        offset = int(self.offsets[tick - self.first_tick])
+        _, _, length = RECORD_HEADER.unpack_from(self.data, offset)
+        start = offset + RECORD_HEADER.size
+        return memoryview(self.data)[start:start + length]
+
+    def get_state(self, tick: int) -> GameStateMessage:
+        return GameStateMessage.from_bytes(self.get_payload(tick))
+
+    def get_keyframe(self, tick: int) -> int:
+        """Returns the last keyframe at or before the tick"""
+        i = bisect.bisect_right(self.keyframes, tick) - 1
+        return self.keyframes[i] if i >= 0 else self.first_tick
+
+    def close(self):
+        self.offsets = None
+        try:
+            self.data.close()
+        except BufferError:
+            # Decoded states still reference the mapping, it is closed when they are released
+            pass
+        self.file.close()
@@ -1,14 +1,22 @@
+import builtins
+import contextlib
 from dataclasses import dataclass, field
+import hashlib
 import math
-from typing import Callable
-
-import pygame
+import random
+import threading
+from types import CodeType, ModuleType
+from typing import TYPE_CHECKING, Callable
 
 from common.robot_hull import RobotHullType, get_hull_instance
 from common.robot_stats import RobotStats
 from common.weapon import Weapon, WeaponConfig, get_weapon_stats
 from common.weapon_command import WeaponCommand
 
+if TYPE_CHECKING:
+    # Only the client draws, so the server never has to load pygame for this
+    import pygame
+
 @dataclass
 class RobotBuilder:
     hull: RobotHullType = field(default=RobotHullType.STANDARD)
@@ -47,11 +55,63 @@ class RobotInterface:
     def get_state(self, info: RobotInfo) -> dict:
         pass
     
-    def draw_gui(self, screen: pygame.Surface, arena_size: tuple[int, int], state: dict) -> None:
+    def draw_gui(self, screen: "pygame.Surface", arena_size: tuple[int, int], state: dict) -> None:
         pass
     
+def get_robot_code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+def compile_robot_code(code: str, file_name: str = "<robot>") -> CodeType:
+    return compile(code, file_name, "exec")
+
 def parse_robot_config_from_string(code: str) -> RobotInterface:
-    namespace = {}
+    return parse_robot_config_from_code(compile_robot_code(code))
+
+class RobotRandomModule(ModuleType):
+    """The random module robot code imports, its functions use the generator of the match running on the calling thread
+
+    Several matches can run in one process, each on its own thread, so a deterministic match gives its robots
+    a seeded generator of their own instead of seeding the random module they all share."""
+
+    def __init__(self):
+        super().__init__("random")
+
+    def __getattr__(self, name: str):
+        value = getattr(random, name)
+        if not callable(value) or isinstance(value, type):
+            return value
+
+        # Looked up on each call, so functions imported with "from random import ..." follow the match too
+        def call(*args, **kwargs):
+            generator = getattr(_robot_random, "generator", None)
+            if generator is None or not hasattr(generator, name):
+                generator = random
+            return getattr(generator, name)(*args, **kwargs)
+        return call
+
+
+_robot_random = threading.local()
+ROBOT_RANDOM_MODULE = RobotRandomModule()
+
+@contextlib.contextmanager
+def robot_random(generator: random.Random | None):
+    """Robot code called in this block draws from the generator, or from the random module when it is None"""
+    previous = getattr(_robot_random, "generator", None)
+    _robot_random.generator = generator
+    try:
+        yield
+    finally:
+        _robot_random.generator = previous
+
+def _robot_import(name: str, globals=None, locals=None, fromlist=(), level: int = 0):
+    if name == "random" and level == 0:
+        return ROBOT_RANDOM_MODULE
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+ROBOT_BUILTINS = {**vars(builtins), "__import__": _robot_import}
+
+def parse_robot_config_from_code(code: CodeType) -> RobotInterface:
+    namespace = {"__builtins__": ROBOT_BUILTINS}
     exec(code, namespace)
 
     # Get the class reference from the namespace
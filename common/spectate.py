@@ -0,0 +1,26 @@
+import struct
+
+
+# Spectators send these datagrams to the relay, on the port the game server sends its snapshots to.
+# A join is repeated every SPECTATE_KEEPALIVE seconds, the relay forgets a spectator it has not heard from in SPECTATE_TIMEOUT.
+SPECTATE_REQUEST = struct.Struct("<4sBI") # magic, kind, match id
+SPECTATE_MAGIC = b"RBSP"
+SPECTATE_JOIN = 1
+SPECTATE_LEAVE = 2
+NEWEST_MATCH = 0 # follows each new match as it starts
+
+SPECTATE_KEEPALIVE = 2
+SPECTATE_TIMEOUT = 10
+DEFAULT_RELAY_PORT = 5001
+
+
+def is_spectate_request(data: bytes) -> bool:
+    return len(data) == SPECTATE_REQUEST.size and data[:len(SPECTATE_MAGIC)] == SPECTATE_MAGIC
+
+
+def parse_address(address: str, default_port: int = DEFAULT_RELAY_PORT) -> tuple[str, int]:
+    """Parses "host:port" or "host" into an address"""
+    host, _, port = address.rpartition(":")
+    if len(host) == 0:
+        return (address, default_port)
+    return (host, int(port))
@@ -35,17 +35,30 @@ class RoundStartedMessage(Message):
     begin_time: str
     arena_width: int
     arena_height: int
+    multicast_group: str = "" # game states are sent to this group instead of to each player, when set
+    multicast_port: int = 0
     
 
 @dataclass
 class RoundEndedMessage(Message):
     message_type: int = field(default=7, init=False)
     winner_id: str
+    cpu_summary: dict[str, dict[str, dict]] = field(default_factory=dict) # player id -> hook -> calls, total_ms, avg_ms, max_ms
     
 @dataclass
 class LobbyJoinedMessage(Message):
     message_type: int = field(default=8, init=False)
     
+@dataclass
+class PingMessage(Message):
+    message_type: int = field(default=9, init=False)
+    sent_time: float
+    
+@dataclass
+class PongMessage(Message):
+    message_type: int = field(default=10, init=False)
+    sent_time: float
+    
     
 # Server -> Client
 @dataclass
@@ -4,20 +4,50 @@ import colorsys
 import struct
 
 import msgpack
+import numpy as np
 
 from common.robot_hull import RobotHullType
 from common.weapon import WeaponType
 
 
+# Structured dtypes matching the packed little endian wire formats of the game state sections
+PLAYER_STATE_DTYPE = np.dtype([("idx", "<u2"), ("x", "<f4"), ("y", "<f4"), ("angle", "<f4"), ("hp", "<u2"), ("energy", "<u2")])
+PROJECTILE_STATE_DTYPE = np.dtype([("id", "<u2"), ("x", "<f4"), ("y", "<f4"), ("size", "<u2"), ("modifiers", "<u2")])
+EXPLOSION_DTYPE = np.dtype([("x", "<u2"), ("y", "<u2"), ("radius", "<u2")])
+
+# Message types, sent in the packet header
+PLAYER_STATIC_INFO_TYPE = 1
+GAME_STATE_TYPE = 2
+ROBOT_STATE_TYPE = 3
+MATCH_INFO_TYPE = 4
+
 
 class UDPMessage:
     
     def __init__(self, message_type: int):
         self.message_type = message_type
         
+        self._encoded: bytes = None
+        
     def to_bytes(self) -> bytes:
         pass
     
+    def byte_size(self) -> int:
+        return len(self._get_encoded())
+    
+    def pack_into(self, buf: bytearray, offset: int) -> int:
+        """Writes the message into buf at offset and returns the offset after it"""
+        data = self._get_encoded()
+        end = offset + len(data)
+        buf[offset:end] = data
+        return end
+    
+    def _get_encoded(self) -> bytes:
+        # Messages without a fixed layout are encoded once and copied into the buffer
+        if self._encoded is None:
+            self._encoded = self.to_bytes()
+        return self._encoded
+    
     @staticmethod
     def from_bytes(data: bytes) -> "UDPMessage":
         pass
@@ -26,20 +56,34 @@ class PlayerStaticInfoMessage(UDPMessage):
     player_info: list["PlayerStaticInfo"]
     
     def __init__(self):
-        super().__init__(1)
+        super().__init__(PLAYER_STATIC_INFO_TYPE)
             
     def to_bytes(self) -> bytes:
-        buf = bytearray()
-        buf += struct.pack("<H", len(self.player_info))
+        buf = bytearray(self.byte_size())
+        self.pack_into(buf, 0)
+        return bytes(buf)
+    
+    def byte_size(self) -> int:
+        return COUNT_STRUCT.size + sum(
+            PLAYER_STATIC_INFO_STRUCT.size + COUNT_STRUCT.size + len(p.weapons) * WEAPON_STATIC_INFO_STRUCT.size
+            for p in self.player_info
+        )
+    
+    def pack_into(self, buf: bytearray, offset: int) -> int:
+        COUNT_STRUCT.pack_into(buf, offset, len(self.player_info))
+        offset += COUNT_STRUCT.size
         
         for p in self.player_info:
-            buf += struct.pack(PlayerStaticInfo.struct_format, p.idx, p.color[0], p.color[1], p.color[2], p.hull, p.size, p.max_hp, p.max_energy)
+            PLAYER_STATIC_INFO_STRUCT.pack_into(buf, offset, p.idx, p.color[0], p.color[1], p.color[2], p.hull, p.size, p.max_hp, p.max_energy)
+            offset += PLAYER_STATIC_INFO_STRUCT.size
             
-            buf += struct.pack("<H", len(p.weapons))
+            COUNT_STRUCT.pack_into(buf, offset, len(p.weapons))
+            offset += COUNT_STRUCT.size
             for w in p.weapons:
-                buf += struct.pack(WeaponStaticInfo.struct_format, w.x_offset, w.y_offset, w.angle, w.type)
+                WEAPON_STATIC_INFO_STRUCT.pack_into(buf, offset, w.x_offset, w.y_offset, w.angle, w.type)
+                offset += WEAPON_STATIC_INFO_STRUCT.size
             
-        return bytes(buf)
+        return offset
     
     @staticmethod
     def from_bytes(data: bytes) -> UDPMessage:
@@ -92,53 +136,171 @@ class WeaponStaticInfo:
 
 
 class GameStateMessage(UDPMessage):
-    players: list["PlayerState"]
-    projectiles: list["ProjectileState"]
-    explosions: list[tuple[int, int, int]] # x, y, radius
+    """The entity sections can be read and written both as objects and as NumPy arrays.
+    
+    Each view is created lazily from the other, so decoding does not create per entity objects
+    unless the object API is used. Setting one view replaces the other."""
+    
+    header_format: str = "<IHHH"
+    tick: int
     
     def __init__(self):
-        super().__init__(2)
+        super().__init__(GAME_STATE_TYPE)
+        self.tick = 0
+        
+        self._players: list[PlayerState] = None
+        self._projectiles: list[ProjectileState] = None
+        self._explosions: list[tuple[int, int, int]] = None # x, y, radius
+        
+        self._player_array: np.ndarray = None
+        self._projectile_array: np.ndarray = None
+        self._explosion_array: np.ndarray = None
+        
+    @property
+    def players(self) -> list["PlayerState"]:
+        if self._players is None and self._player_array is not None:
+            self._players = [PlayerState(*row) for row in self._player_array.tolist()]
+        return self._players
+    
+    @players.setter
+    def players(self, players: list["PlayerState"]):
+        self._players = players
+        self._player_array = None
+        
+    @property
+    def projectiles(self) -> list["ProjectileState"]:
+        if self._projectiles is None and self._projectile_array is not None:
+            self._projectiles = [ProjectileState(*row) for row in self._projectile_array.tolist()]
+        return self._projectiles
+    
+    @projectiles.setter
+    def projectiles(self, projectiles: list["ProjectileState"]):
+        self._projectiles = projectiles
+        self._projectile_array = None
+        
+    @property
+    def explosions(self) -> list[tuple[int, int, int]]:
+        if self._explosions is None and self._explosion_array is not None:
+            self._explosions = self._explosion_array.tolist()
+        return self._explosions
+    
+    @explosions.setter
+    def explosions(self, explosions: list[tuple[int, int, int]]):
+        self._explosions = explosions
+        self._explosion_array = None
+        
+    @property
+    def player_array(self) -> np.ndarray:
+        if self._player_array is None and self._players is not None:
+            self._player_array = np.array([(p.idx, p.x, p.y, p.angle, p.hp, p.energy) for p in self._players], dtype=PLAYER_STATE_DTYPE)
+        return self._player_array
+    
+    @player_array.setter
+    def player_array(self, players: np.ndarray):
+        self._player_array = players
+        self._players = None
+        
+    @property
+    def projectile_array(self) -> np.ndarray:
+        if self._projectile_array is None and self._projectiles is not None:
+            self._projectile_array = np.array([(p.id, p.x, p.y, p.size, p.modifiers) for p in self._projectiles], dtype=PROJECTILE_STATE_DTYPE)
+        return self._projectile_array
+    
+    @projectile_array.setter
+    def projectile_array(self, projectiles: np.ndarray):
+        self._projectile_array = projectiles
+        self._projectiles = None
+        
+    @property
+    def explosion_array(self) -> np.ndarray:
+        if self._explosion_array is None and self._explosions is not None:
+            self._explosion_array = np.array([tuple(e) for e in self._explosions], dtype=EXPLOSION_DTYPE)
+        return self._explosion_array
+    
+    @explosion_array.setter
+    def explosion_array(self, explosions: np.ndarray):
+        self._explosion_array = explosions
+        self._explosions = None
     
     def to_bytes(self) -> bytes:
-        buf = bytearray()
-        buf += struct.pack("<HHH", len(self.players), len(self.projectiles), len(self.explosions))
-        
-        for p in self.players:
-            buf += struct.pack(PlayerState.struct_format, p.idx, p.x, p.y, p.angle, p.hp, p.energy)
-        for p in self.projectiles:
-            buf += struct.pack(ProjectileState.struct_format,p.id, p.x, p.y, p.size, p.modifiers)
-        for e in self.explosions:
-            buf += struct.pack("<HHH", e[0], e[1], e[2])
-            
+        buf = bytearray(self.byte_size())
+        self.pack_into(buf, 0)
         return bytes(buf)
     
+    def byte_size(self) -> int:
+        return GAME_STATE_HEADER_STRUCT.size \
+            + self._section_length(self._players, self._player_array) * PLAYER_STATE_DTYPE.itemsize \
+            + self._section_length(self._projectiles, self._projectile_array) * PROJECTILE_STATE_DTYPE.itemsize \
+            + self._section_length(self._explosions, self._explosion_array) * EXPLOSION_DTYPE.itemsize
+    
+    def pack_into(self, buf: bytearray, offset: int) -> int:
+        GAME_STATE_HEADER_STRUCT.pack_into(
+            buf, offset, self.tick,
+            self._section_length(self._players, self._player_array),
+            self._section_length(self._projectiles, self._projectile_array),
+            self._section_length(self._explosions, self._explosion_array)
+        )
+        offset += GAME_STATE_HEADER_STRUCT.size
+        
+        # Sections are written from whichever view is present, so neither side has to convert first
+        if self._player_array is not None:
+            offset = _pack_array_into(buf, offset, self._player_array)
+        else:
+            for p in self._players:
+                PLAYER_STATE_STRUCT.pack_into(buf, offset, p.idx, p.x, p.y, p.angle, p.hp, p.energy)
+                offset += PLAYER_STATE_STRUCT.size
+                
+        if self._projectile_array is not None:
+            offset = _pack_array_into(buf, offset, self._projectile_array)
+        else:
+            for p in self._projectiles:
+                PROJECTILE_STATE_STRUCT.pack_into(buf, offset, p.id, p.x, p.y, p.size, p.modifiers)
+                offset += PROJECTILE_STATE_STRUCT.size
+                
+        if self._explosion_array is not None:
+            offset = _pack_array_into(buf, offset, self._explosion_array)
+        else:
+            for x, y, radius in self._explosions:
+                EXPLOSION_STRUCT.pack_into(buf, offset, x, y, radius)
+                offset += EXPLOSION_STRUCT.size
+            
+        return offset
+    
+    @staticmethod
+    def _section_length(items: list, array: np.ndarray) -> int:
+        return len(array) if array is not None else len(items)
+    
     @staticmethod
     def from_bytes(data: bytes) -> UDPMessage:
-        offset = 0
-        num_players, num_projectiles, num_explosions = struct.unpack_from("<HHH", data, offset)
-        offset += 6
+        tick, num_players, num_projectiles, num_explosions = struct.unpack_from(GameStateMessage.header_format, data, 0)
+        offset = struct.calcsize(GameStateMessage.header_format)
         
+        # The arrays are views into data, no entity is copied or turned into an object
         state = GameStateMessage()
-        state.players = []
-        for _ in range(num_players):
-            vals = struct.unpack_from(PlayerState.struct_format, data, offset)
-            state.players.append(PlayerState(*vals))
-            offset += struct.calcsize(PlayerState.struct_format)
-            
-        state.projectiles = []
-        for _ in range(num_projectiles):
-            vals = struct.unpack_from(ProjectileState.struct_format, data, offset)
-            state.projectiles.append(ProjectileState(*vals))
-            offset += struct.calcsize(ProjectileState.struct_format)
-            
-        state.explosions = []
-        for _ in range(num_explosions):
-            vals = struct.unpack_from("<HHH", data, offset)
-            state.explosions.append(vals)
-            offset += struct.calcsize("<HHH")
+        state.tick = tick
+        state.player_array = np.frombuffer(data, PLAYER_STATE_DTYPE, num_players, offset)
+        offset += num_players * PLAYER_STATE_DTYPE.itemsize
+        
+        state.projectile_array = np.frombuffer(data, PROJECTILE_STATE_DTYPE, num_projectiles, offset)
+        offset += num_projectiles * PROJECTILE_STATE_DTYPE.itemsize
+        
+        state.explosion_array = np.frombuffer(data, EXPLOSION_DTYPE, num_explosions, offset)
         
         return state
     
+    @staticmethod
+    def peek_tick(data: bytes) -> int:
+        return struct.unpack_from("<I", data, 0)[0]
+    
+    @staticmethod
+    def peek_explosions(data: bytes) -> list[tuple[int, int, int]]:
+        _, num_players, num_projectiles, num_explosions = struct.unpack_from(GameStateMessage.header_format, data, 0)
+        offset = struct.calcsize(GameStateMessage.header_format) \
+            + num_players * PLAYER_STATE_DTYPE.itemsize \
+            + num_projectiles * PROJECTILE_STATE_DTYPE.itemsize
+        
+        return np.frombuffer(data, EXPLOSION_DTYPE, num_explosions, offset).tolist()
+    
 
 @dataclass
 class PlayerState:
@@ -167,7 +329,7 @@ class RobotStateMessage(UDPMessage):
     state: dict
     
     def __init__(self):
-        super().__init__(3)
+        super().__init__(ROBOT_STATE_TYPE)
             
     def to_bytes(self) -> bytes:
         return msgpack.packb(self.state, use_bin_type=True)
@@ -177,4 +339,42 @@ class RobotStateMessage(UDPMessage):
         message = RobotStateMessage()
         message.state = msgpack.unpackb(data, raw=False)    
         
-        return message
\ No newline at end of file
+        return message
+
+
+class MatchInfoMessage(UDPMessage):
+    """What a spectator needs to know about a match, that players get in RoundStartedMessage"""
+    begin_time: str
+    arena_width: int
+    arena_height: int
+    is_test: bool
+    player_ids: list[str] # by player index
+    
+    def __init__(self):
+        super().__init__(MATCH_INFO_TYPE)
+        
+    def to_bytes(self) -> bytes:
+        return msgpack.packb([self.begin_time, self.arena_width, self.arena_height, self.is_test, self.player_ids], use_bin_type=True)
+    
+    @staticmethod
+    def from_bytes(data: bytes) -> UDPMessage:
+        message = MatchInfoMessage()
+        message.begin_time, message.arena_width, message.arena_height, message.is_test, message.player_ids = msgpack.unpackb(data, raw=False)
+        
+        return message
+
+
+def _pack_array_into(buf: bytearray, offset: int, array: np.ndarray) -> int:
+    end = offset + array.nbytes
+    np.frombuffer(buf, array.dtype, len(array), offset)[:] = array
+    return end
+
+
+# Precompiled structs for the fixed size parts of the messages
+COUNT_STRUCT = struct.Struct("<H")
+PLAYER_STATIC_INFO_STRUCT = struct.Struct(PlayerStaticInfo.struct_format)
+WEAPON_STATIC_INFO_STRUCT = struct.Struct(WeaponStaticInfo.struct_format)
+GAME_STATE_HEADER_STRUCT = struct.Struct(GameStateMessage.header_format)
+PLAYER_STATE_STRUCT = struct.Struct(PlayerState.struct_format)
+PROJECTILE_STATE_STRUCT = struct.Struct(ProjectileState.struct_format)
+EXPLOSION_STRUCT = struct.Struct("<HHH")
@@ -1,42 +1,70 @@
+from collections import deque
 import colorsys
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from functools import reduce
 import math
 import random
-from time import sleep
+from time import perf_counter_ns, sleep
 from typing import Callable, Type
 
-import pygame
 from common.arena import Arena
 from common.calculations import calculate_ability_energy_cost, calculate_weapon_point_offset, rot
-from common.player_instance import PlayerInstance
-from common.udp_message import GameStateMessage, PlayerStaticInfo, PlayerStaticInfoMessage, PlayerState, ProjectileState, RobotStateMessage, WeaponStaticInfo
+from common.constants import PROJECTILE_ID_WRAP, SERVER_TICK_RATE
+from common.keys import KeyState
+from common.player_instance import KEY_FIELDS, PlayerInstance
+from common.udp_message import GameStateMessage, MatchInfoMessage, PlayerStaticInfo, PlayerStaticInfoMessage, PlayerState, ProjectileState, RobotStateMessage, WeaponStaticInfo
 from common.projectile import  BouncingProjectileModifierStats, ExplosiveProjectileModifierStats, Projectile, ProjectileModifier, get_projectile_modifier_stats
-from common.robot import ProjectileInfo, RobotInfo, Robot
+from common.robot import ProjectileInfo, RobotInfo, Robot, robot_random
 from common.weapon_command import WeaponCommand
 from common.player import Player
+from server.input_log import COUNTDOWN, DISCONNECT, InputLogHeader, InputLogPlayer, InputLogWriter
+from server.metrics import TickProfiler
+from server.position_history import PositionHistory
+from server.replay_writer import ReplayWriter
 from server.spatial_grid import SpatialGrid
 from server.udp_socket import UDPSocket
 
+TICK_INTERVAL = timedelta(seconds=1 / SERVER_TICK_RATE)
+
 class Game:
     
-    def __init__(self, players: list[Player], arena: Arena, udp: UDPSocket, game_ended: Callable[[int], None], start_time: datetime, is_test: bool = False):
+    def __init__(self, players: list[Player], arena: Arena, udp: UDPSocket, game_ended: Callable[[int], None], start_time: datetime, is_test: bool = False, replay: ReplayWriter = None,
+                 deterministic: bool = False, seed: int = None, input_log: InputLogWriter = None, profiler: TickProfiler = None):
         self.arena = arena
         self.udp = udp
+        self.replay = replay
         self.game_ended_callback = game_ended
         self.is_test = is_test
         self.start_time = start_time
         
+        # In deterministic mode the game clock advances a fixed interval per tick and the robots draw from a
+        # generator seeded for this match, so the match can be simulated again from its inputs
+        self.deterministic = deterministic
+        self.seed = seed
+        self.input_log = input_log
+        self.rng: random.Random = random.Random(seed) if self.deterministic else None
+        
+        # Inputs and disconnects arrive on other threads and are applied when the next tick starts
+        self.pending_inputs: deque[tuple[str, int, int]] = deque()
+        self.pending_removals: deque[str] = deque()
+        self.sim_tick: int = 0
+        self.countdown_states: int = 0 # states published before the first tick
+        
         self.player_commands: dict[int, list[WeaponCommand]] = {}
         self.spatial_grid: SpatialGrid = SpatialGrid(100)
+        self.position_history: PositionHistory = PositionHistory()
+        self.profiler: TickProfiler = profiler if profiler is not None else TickProfiler()
+        self.profiler.start_match(self.position_history.metrics)
         
-        self._initialize_players(players)
+        with robot_random(self.rng):
+            self._initialize_players(players)
         
         self.projectiles: list[Projectile] = []
         self.projectile_id_counter: int = 0
         
         self.explosions: list[tuple[int, int, int]] = []
+        self.tick: int = 0
         
         self.running = False
         
@@ -75,85 +103,184 @@ class Game:
                 self.players[player.id].robot.max_energy
             ))
             
+        match_info = MatchInfoMessage()
+        match_info.begin_time = self.start_time.isoformat()
+        match_info.arena_width = self.arena.width
+        match_info.arena_height = self.arena.height
+        match_info.is_test = self.is_test
+        match_info.player_ids = [player.id for player in players]
+        self.udp.send_to_spectators(match_info)
+        
         message = PlayerStaticInfoMessage()
         message.player_info = player_info
         self.udp.send_to_all(message)
         
+        if self.replay is not None:
+            self.replay.start(message, self.arena)
+            
+        if self.input_log is not None:
+            self.input_log.start(InputLogHeader(
+                self.seed,
+                (self.arena.width, self.arena.height, self.arena.player_starting_dist),
+                self.is_test,
+                [InputLogPlayer(player.id, tuple(player.color), player.robot_code_hash) for player in players]
+            ))
+        
         
     def _alive_players(self) -> list[PlayerInstance]:
         return list(filter(lambda p: not p.dead, self.players.values()))
         
     def remove_disconnected_player(self, player: Player):
-        del self.players[player.id]
+        self.pending_removals.append(player.id)
         
     def run(self):
         self.running = True
         last_update = datetime.now()
         while self.running:
+            self.profiler.begin_tick()
             if datetime.now() > self.start_time:
-                delta = datetime.now() - last_update
-                self.spatial_grid.clear()
-                self.explosions.clear()
-                for projectile in self.projectiles:
-                    self._update_projectile(projectile, delta)
-
-                for player in self._alive_players():
-                    
-                    self._update_from_input(player)
-                    player.old_keys = player.keys.clone()
-                    self._update_player(player, delta)    
-                    
-                for p in list(filter(self._should_destroy_projectile, self.projectiles)):
-                    p.destroy = True
-                self._check_collisions()
-                
-                self.projectiles = list(filter(lambda p: not p.destroy, self.projectiles))
-                    
-                if not self.is_test and len(self._alive_players()) <= 1:
-                    self.running = False
-                    continue
-                elif self.is_test and len(self._alive_players()) == 0:
+                if not self.step(datetime.now() - last_update):
                     self.running = False
                     continue
                 
-            self.udp.send_to_all(self.get_state())
-            for id, instance in self.players.items():
-                robot_state = self.get_robot_state(id)
-                message = RobotStateMessage()
-                message.state = robot_state
-                self.udp.send_to_player(instance.player, message)
-            
+            self.publish_state()
+            self.profiler.end_tick({
+                "players": len(self._alive_players()),
+                "projectiles": len(self.projectiles),
+                "explosions": len(self.explosions),
+                "commands": sum(len(commands) for commands in self.player_commands.values()),
+            })
             last_update = datetime.now()
-            sleep(1 / 30) # 30 updates per second
-        
+            sleep(1 / SERVER_TICK_RATE)
+        
+        print(self.position_history.metrics.summary(), flush=True)
+        print(f"Robot script time:\n{self.profiler.robot_cpu.describe()}", flush=True)
+        if self.replay is not None:
+            self.replay.close()
+        if self.input_log is not None:
+            self.input_log.close(self.sim_tick)
         winner = self._alive_players()[0].idx if len(self._alive_players()) > 0 else -1
         self.game_ended_callback(winner)
         
+    def publish_state(self):
+        profiler = self.profiler
+        state = self.get_state()
+        payload = self.udp.encode(state)
+        profiler.mark("encode")
+        self.udp.send_encoded_to_group(payload, state.message_type)
+        profiler.mark("send")
+        
+        if self.replay is not None:
+            self.replay.write(self.tick, payload)
+        for id, instance in self.players.items():
+            robot_state = self.get_robot_state(id)
+            message = RobotStateMessage()
+            message.state = robot_state
+            payload = self.udp.encode(message)
+            profiler.mark("encode")
+            self.udp.send_encoded_to_player(payload, message.message_type, instance.player)
+            profiler.mark("send")
+        
+        self.udp.flush()
+        self.tick += 1
+        if self.sim_tick == 0:
+            self.countdown_states += 1
+        
+    def step(self, delta: timedelta = TICK_INTERVAL) -> bool:
+        """Advances the simulation one tick, returns False when the match is over"""
+        with robot_random(self.rng):
+            return self._step(delta)
+        
+    def _step(self, delta: timedelta) -> bool:
+        if self.deterministic:
+            delta = TICK_INTERVAL
+        profiler = self.profiler
+        
+        self._apply_inputs()
+        profiler.mark("inputs")
+        
+        self.spatial_grid.clear()
+        self.explosions.clear()
+        for projectile in self.projectiles:
+            self._update_projectile(projectile, delta)
+        profiler.mark("projectiles")
+
+        # Input handling and the player update alternate per player, so their times are summed separately
+        inputs_ns = 0
+        for player in self._alive_players():
+            
+            start = perf_counter_ns()
+            self._update_from_input(player)
+            inputs_ns += perf_counter_ns() - start
+            player.old_keys = player.keys.clone()
+            self._update_player(player, delta)    
+            
+        profiler.mark("players")
+        profiler.add("players", -inputs_ns)
+        profiler.add("inputs", inputs_ns)
+            
+        now = self._now()
+        self.position_history.record(now, {
+            player.idx: (player.robot.x, player.robot.y)
+            for player in self._alive_players()
+        })
+        profiler.mark("collisions")
+            
+        for p in list(filter(self._should_destroy_projectile, self.projectiles)):
+            p.destroy = True
+        profiler.mark("destroy")
+        self._check_collisions(now)
+        profiler.mark("collisions")
+        
+        self.projectiles = list(filter(lambda p: not p.destroy, self.projectiles))
+        profiler.mark("destroy")
+        self.sim_tick += 1
+            
+        if not self.is_test and len(self._alive_players()) <= 1:
+            return False
+        elif self.is_test and len(self._alive_players()) == 0:
+            return False
+        
+        return True
+    
+    def _now(self) -> datetime:
+        if self.deterministic:
+            return self.start_time + self.sim_tick * TICK_INTERVAL
+        return datetime.now()
+        
     def _update_from_input(self, player: PlayerInstance):
         self._update_movement_from_input(player)
         
         new_commands: list[WeaponCommand] = []
         info = self._get_robot_info(player)
         
+        ability: int = None
+        if player.keys.q and not player.old_keys.q:
+            ability = 1
+        elif player.keys.w and not player.old_keys.w:
+            ability = 2
+        elif player.keys.e and not player.old_keys.e:
+            ability = 3
+        elif player.keys.a and not player.old_keys.a:
+            ability = 4
+        elif player.keys.s and not player.old_keys.s:
+            ability = 5
+        elif player.keys.d and not player.old_keys.d:
+            ability = 6
+        
         try:
-            if player.keys.q and not player.old_keys.q:
-                player.robot.ability_func(1, new_commands, info)
-            elif player.keys.w and not player.old_keys.w:
-                player.robot.ability_func(2, new_commands, info)
-            elif player.keys.e and not player.old_keys.e:
-                player.robot.ability_func(3, new_commands, info)
-            elif player.keys.a and not player.old_keys.a:
-                player.robot.ability_func(4, new_commands, info)
-            elif player.keys.s and not player.old_keys.s:
-                player.robot.ability_func(5, new_commands, info)
-            elif player.keys.d and not player.old_keys.d:
-                player.robot.ability_func(6, new_commands, info)
+            if ability is not None:
+                start = perf_counter_ns()
+                try:
+                    player.robot.ability_func(ability, new_commands, info)
+                finally:
+                    self.profiler.robot_cpu.record(player.player.id, "ability_func", perf_counter_ns() - start)
                 
             if len(new_commands) > 0:
                 new_commands = list(filter(lambda c: c.id in player.robot.weapons , new_commands))
                 
                 for command in new_commands:
-                    command.time = datetime.now()
+                    command.time = self._now()
                     
                 total_energy_cost = calculate_ability_energy_cost(player.robot.weapons, new_commands)
                     
@@ -227,7 +354,7 @@ class Game:
         
         completed: list[WeaponCommand] = []
         for command in self.player_commands[player.idx]:
-            if command.time + command.delay < datetime.now():
+            if command.time + command.delay < self._now():
                 completed.append(command)
                 weapon = player.robot.weapons[command.id]
                 sx, sy = calculate_weapon_point_offset((player.robot.x, player.robot.y), player.robot.angle, (weapon.x, weapon.y), weapon.angle, (7.5, 0))
@@ -247,7 +374,7 @@ class Game:
                     {mod: get_projectile_modifier_stats(mod) for mod in command.modifiers},
                     weapon.stats.projectile_life_time
                     ))
-                self.projectile_id_counter = (self.projectile_id_counter + 1) % 65000
+                self.projectile_id_counter = (self.projectile_id_counter + 1) % PROJECTILE_ID_WRAP
                 
         for completed_command in completed:
             self.player_commands[player.idx].remove(completed_command)
@@ -285,17 +412,46 @@ class Game:
         else:
             return is_outside_screen
             
-    def _check_collisions(self):
+    def _get_owner_rewinds(self) -> dict[int, tuple[timedelta, bool]]:
+        rewinds: dict[int, tuple[timedelta, bool]] = {}
+        for instance in self.players.values():
+            # Network latency can not be reproduced, so deterministic matches are not lag compensated
+            latency = instance.player.latency if not self.deterministic else timedelta()
+            rewind = self.position_history.clamp_rewind(latency)
+            rewinds[instance.idx] = (rewind, rewind < latency)
+            
+        return rewinds
+            
+    def _check_collisions(self, now: datetime):
+        # Projectiles are checked against positions rewound by the latency of the player who fired them
+        owner_rewinds = self._get_owner_rewinds()
+        rewound_positions = {
+            rewind: self.position_history.get_positions(now, rewind)
+            for rewind in set([timedelta()] + [rewind for rewind, _ in owner_rewinds.values()])
+        }
+        
+        # One check per projectile and tick, however many grid cells and robots it is tested against
+        for projectile in self.projectiles:
+            if not projectile.destroy:
+                self.position_history.metrics.record(*owner_rewinds.get(projectile.owner_idx, (timedelta(), False)))
+        
         for player in self._alive_players():
-            bounding_box_corners = self._get_player_bounding_box(player)
-            bounding_box_grid_coords = set([self.spatial_grid.get_grid_coord(pos) for pos in bounding_box_corners])
+            current_pos = (player.robot.x, player.robot.y)
+            bounding_box_grid_coords = set([
+                self.spatial_grid.get_grid_coord(corner)
+                for positions in rewound_positions.values()
+                for corner in self._get_player_bounding_box(positions.get(player.idx, current_pos), player.robot.size)
+            ])
             
             for grid_coord in bounding_box_grid_coords:
                 for projectile in self.spatial_grid.get_bullets_in_grid_cell(grid_coord):
                     if projectile.destroy or player.idx == projectile.owner_idx:
                         continue
                     
-                    if self._segment_circle_intersect((projectile.old_x, projectile.old_y), (projectile.x, projectile.y), (player.robot.x, player.robot.y), player.robot.size):
+                    rewind, _ = owner_rewinds.get(projectile.owner_idx, (timedelta(), False))
+                    player_pos = rewound_positions[rewind].get(player.idx, current_pos)
+                    
+                    if self._segment_circle_intersect((projectile.old_x, projectile.old_y), (projectile.x, projectile.y), player_pos, player.robot.size):
                             
                         override_default_behaviour: bool = False
                         for modifier in projectile.modifiers.values():
@@ -313,12 +469,12 @@ class Game:
                             player.dead = True
                 
             
-    def _get_player_bounding_box(self, player: PlayerInstance) -> list[tuple[float, float]]:
+    def _get_player_bounding_box(self, pos: tuple[float, float], size: float) -> list[tuple[float, float]]:
         return [
-            (player.robot.x - player.robot.size, player.robot.y - player.robot.size),
-            (player.robot.x + player.robot.size, player.robot.y - player.robot.size),
-            (player.robot.x - player.robot.size, player.robot.y + player.robot.size),
-            (player.robot.x + player.robot.size, player.robot.y + player.robot.size)
+            (pos[0] - size, pos[1] - size),
+            (pos[0] + size, pos[1] - size),
+            (pos[0] - size, pos[1] + size),
+            (pos[0] + size, pos[1] + size)
         ]
            
     def _segment_circle_intersect(self, old_pos: tuple[float, float], new_pos: tuple[float, float], circle_center: tuple[float, float], circle_radius: float) -> bool:
@@ -356,6 +512,7 @@ class Game:
             
     def get_state(self) -> GameStateMessage:
         state = GameStateMessage()
+        state.tick = self.tick
         
         state.players = [
             PlayerState(
@@ -386,33 +543,46 @@ class Game:
         
     def get_robot_state(self, id: str) -> dict:
         player = self.players[id]
-        return player.robot.interface.get_state(self._get_robot_info(player))
+        info = self._get_robot_info(player)
+        
+        start = perf_counter_ns()
+        try:
+            with robot_random(self.rng):
+                return player.robot.interface.get_state(info)
+        finally:
+            self.profiler.robot_cpu.record(id, "get_state", perf_counter_ns() - start)
+        
+    def robot_cpu_summary(self) -> dict[str, dict[str, dict]]:
+        return self.profiler.robot_cpu.summary()
         
     def update_key(self, player_id: str, key: int, state: int):
-            is_down = state == 1
-            player = self.players[player_id]
+        # Inputs arrive on the network thread and are applied when the next tick starts
+        self.pending_inputs.append((player_id, key, state))
         
-            if key == pygame.K_UP:
-                player.keys.up = is_down
-            elif key == pygame.K_DOWN:
-                player.keys.down = is_down
-            elif key == pygame.K_LEFT:
-                player.keys.left = is_down
-            elif key == pygame.K_RIGHT:
-                player.keys.right = is_down
-                
-            elif key == pygame.K_q:
-                player.keys.q = is_down
-            elif key == pygame.K_w:
-                player.keys.w = is_down
-            elif key == pygame.K_e:
-                player.keys.e = is_down
-            elif key == pygame.K_a:
-                player.keys.a = is_down
-            elif key == pygame.K_s:
-                player.keys.s = is_down
-            elif key == pygame.K_d:
-                player.keys.d = is_down
+    def _apply_inputs(self):
+        if self.sim_tick == 0 and self.input_log is not None:
+            # Robots are asked for their state during the countdown too, so the simulation asks them as often
+            self.input_log.write(0, COUNTDOWN, self.countdown_states, 0)
+            
+        while len(self.pending_inputs) > 0:
+            player_id, key, state = self.pending_inputs.popleft()
+            if player_id not in self.players:
+                continue
+            
+            player = self.players[player_id]
+            if self.input_log is not None:
+                self.input_log.write(self.sim_tick, player.idx, key, state)
+            self._apply_key(player, key, state)
+            
+        while len(self.pending_removals) > 0:
+            player = self.players.pop(self.pending_removals.popleft(), None)
+            if player is not None and self.input_log is not None:
+                self.input_log.write(self.sim_tick, DISCONNECT, player.idx, 0)
+        
+    def _apply_key(self, player: PlayerInstance, key: int, state: int):
+        field_name = KEY_FIELDS.get(key)
+        if field_name is not None:
+            setattr(player.keys, field_name, state == KeyState.DOWN)
         
     def stop(self):
         self.running = False
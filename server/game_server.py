@@ -1,75 +1,190 @@
-from enum import Enum
+import dataclasses
+from datetime import timedelta
+import itertools
+import os
 import socket
 import threading
-from time import sleep
-from common.robot import parse_robot_config_from_string
-from common.tcp_messages import ExitTestMessage, InputMessage, Message, PlayerInfoMessage, StartRoundMessage
+from time import monotonic, sleep
+from common.robot import parse_robot_config_from_code
+from common.tcp_messages import ExitTestMessage, InputMessage, Message, PingMessage, PlayerInfoMessage, PongMessage, StartRoundMessage
+from server.input_log import RobotCodeStore
 from server.lobby import Lobby
+from server.metrics import MetricsServer, TickProfiler
+from server.sim_process import SimulationProcess
+from server.robot_code_cache import RobotCodeCache
 from common.player import Player
 from server.tcp_sender import TcpSender
 from server.tcp_server import TCPServer
-from server.udp_socket import UDPSocket
+from server.udp_socket import MulticastGroup, UDPSocket
+from server.worker_pool import WorkerPool
 
 
-class ServerState(Enum):
-    IN_LOBBY = 1
-    IN_GAME = 2
-    IN_TEST = 3
+LATENCY_SMOOTHING = 0.2
+DEFAULT_LOBBY_SIZE = 8
+# With workers each lobby sends to its own port of the multicast group, so matches played at the same time do not mix
+MULTICAST_PORT_RANGE = 1000
 
 class GameServer:
-    def __init__(self, port: int = 5000):
+    """Accepts players and runs their lobbies
+
+    Without workers there is one lobby, its match runs in this process and no one can join while it runs.
+    With workers the server is a front door: players are put in lobbies of up to lobby_size players,
+    each started match is hosted by the least loaded worker process, and new players keep joining meanwhile."""
+    
+    def __init__(self, port: int = 5000, record_dir: str = None, deterministic: bool = False, metrics_port: int = None, sim_process: bool = False,
+                 workers: int = 0, lobby_size: int = DEFAULT_LOBBY_SIZE, relay_address: tuple[str, int] = None, multicast: MulticastGroup = None):
         self.socket_player_dict: dict[socket.socket, Player] = {}
+        self.socket_lobby_dict: dict[socket.socket, Lobby] = {}
         
         self.tcpServer = TCPServer(self._on_message, self._on_player_disconnect, port=port)
-        self.udp_socket = UDPSocket(self.socket_player_dict)
+        self.udp_socket = UDPSocket(self.socket_player_dict, relay_address, multicast if workers == 0 else None)
+        self.robot_code_cache = RobotCodeCache()
+        self.robot_code_store = RobotCodeStore(os.path.join(record_dir, "robots")) if record_dir is not None and deterministic else None
         
-        self.state: ServerState = ServerState.IN_LOBBY
-        self.lobby = Lobby(self.udp_socket, self._on_game_ended)
+        self.profiler = TickProfiler()
+        self.metrics_server = MetricsServer(metrics_port, self._get_metrics) if metrics_port is not None else None
+        
+        self.record_dir = record_dir
+        self.deterministic = deterministic
+        self.sim_process = sim_process
+        self.multicast = multicast
+        self.pool = WorkerPool(workers, relay_address) if workers > 0 else None
+        self.lobby_size = lobby_size
+        self.lobby_ids = itertools.count(1)
+        self.lobbies: list[Lobby] = []
+        self.lobby_lock = threading.Lock()
+        if self.pool is None:
+            self.lobbies.append(self._create_lobby())
         
     def start(self):
+        if self.pool is not None:
+            self.pool.start()
         threading.Thread(target=self.tcpServer.start, daemon=True).start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
         
         try:
             while True:
+                self._ping_players()
                 sleep(1)
         except KeyboardInterrupt:
             self.tcpServer.stop()
+            if self.pool is not None:
+                self.pool.stop()
+    
+    def _create_lobby(self) -> Lobby:
+        lobby_id = next(self.lobby_ids) if self.pool is not None else None
+        multicast = self.multicast
+        if multicast is not None and lobby_id is not None:
+            multicast = dataclasses.replace(multicast, port=multicast.port + lobby_id % MULTICAST_PORT_RANGE)
+        return Lobby(self.udp_socket, self._on_game_ended, self.record_dir, self.deterministic, self.profiler, self.sim_process, self.pool, lobby_id, multicast)
+    
+    def _join_lobby(self) -> Lobby:
+        if self.pool is None:
+            return self.lobbies[0]
+        
+        for lobby in self.lobbies:
+            if not lobby.is_started() and len(lobby.players) < self.lobby_size:
+                return lobby
+        
+        lobby = self._create_lobby()
+        self.lobbies.append(lobby)
+        return lobby
+        
+    def _get_metrics(self) -> str:
+        if self.pool is not None:
+            with self.lobby_lock:
+                started = sum(1 for lobby in self.lobbies if lobby.is_started())
+                waiting = len(self.lobbies) - started
+            return "\n".join([
+                "# TYPE robot_battle_lobbies gauge",
+                f'robot_battle_lobbies{{state="waiting"}} {waiting}',
+                f'robot_battle_lobbies{{state="started"}} {started}',
+            ]) + "\n" + self.pool.exposition()
+        
+        # A match in its own process keeps its tick profile there and reports it back
+        game = self.lobbies[0].game
+        if isinstance(game, SimulationProcess) and game.metrics_text is not None:
+            return game.metrics_text
+        return self.profiler.exposition()
         
     def _on_message(self, socket: socket.socket, message: Message):
         if isinstance(message, PlayerInfoMessage):
             print(f"Player connected '{message.id}'", flush=True)
-            robot = parse_robot_config_from_string(message.robot_code)
+            code_hash, code = self.robot_code_cache.get(message.robot_code)
+            if self.robot_code_store is not None:
+                self.robot_code_store.save(code_hash, message.robot_code)
+            robot = parse_robot_config_from_code(code)
             player = Player(
                 message.id, 
                 message.udp_port, 
                 TcpSender(socket), 
-                robot)
+                robot,
+                code_hash,
+                message.robot_code)
             self.socket_player_dict[socket] = player
-            self.lobby.add_player(player)
+            with self.lobby_lock:
+                lobby = self._join_lobby()
+                self.socket_lobby_dict[socket] = lobby
+                lobby.add_player(player)
             
         elif isinstance(message, StartRoundMessage):
-            if not self.lobby.is_started():
-                print("Starting...", flush=True)
-                self.tcpServer.stop() # stops accepting new connections
-                self.lobby.start(message.is_test)
-                self.state = ServerState.IN_TEST if message.is_test else ServerState.IN_GAME
+            with self.lobby_lock:
+                lobby = self.socket_lobby_dict.get(socket)
+                if lobby is not None and not lobby.is_started():
+                    print("Starting...", flush=True)
+                    if self.pool is None:
+                        self.tcpServer.stop() # stops accepting new connections
+                    lobby.start(message.is_test)
                 
         elif isinstance(message, ExitTestMessage):
-            if self.lobby.is_started():
-                self.lobby.stop()
+            lobby = self.socket_lobby_dict.get(socket)
+            if lobby is not None and lobby.is_started():
+                lobby.stop()
                 
         elif isinstance(message, InputMessage):
-            if self.lobby.is_started():
-                self.lobby.game.update_key(message.player_id, message.key, message.state)
+            lobby = self.socket_lobby_dict.get(socket)
+            if lobby is not None and lobby.is_started():
+                lobby.game.update_key(message.player_id, message.key, message.state)
+                
+        elif isinstance(message, PongMessage):
+            if socket in self.socket_player_dict:
+                self._update_latency(self.socket_player_dict[socket], message.sent_time)
+    
+    def _ping_players(self):
+        message = PingMessage(monotonic())
+        for player in list(self.socket_player_dict.values()):
+            try:
+                player.sender.send(message)
+            except OSError:
+                pass
+            
+    def _update_latency(self, player: Player, sent_time: float):
+        # One way latency is estimated as half the round trip time
+        sample = timedelta(seconds=(monotonic() - sent_time) / 2)
+        if player.latency == timedelta():
+            player.latency = sample
+        else:
+            player.latency += (sample - player.latency) * LATENCY_SMOOTHING
     
     
     def _on_player_disconnect(self, socket: socket.socket):
         player = self.socket_player_dict[socket]
         del self.socket_player_dict[socket]
         print(f"Player disconnected '{player.id}'")
-        self.lobby.remove_player(player, send_update=self.state == ServerState.IN_LOBBY)
+        with self.lobby_lock:
+            lobby = self.socket_lobby_dict.pop(socket)
+            lobby.remove_player(player, send_update=not lobby.is_started())
+            self._remove_empty_lobbies()
+        
+    def _remove_empty_lobbies(self):
+        if self.pool is not None:
+            self.lobbies = [lobby for lobby in self.lobbies if len(lobby.players) > 0 or lobby.is_started()]
         
     def _on_game_ended(self):
         print("Game Ended")
-        self.state = ServerState.IN_LOBBY
+        if self.pool is not None:
+            with self.lobby_lock:
+                self._remove_empty_lobbies()
+            return
         threading.Thread(target=self.tcpServer.start, daemon=True).start()
\ No newline at end of file
@@ -0,0 +1,16 @@
+from common.player import Player
+from server.udp_socket import UDPSocket
+
+
+class NullUDPSocket(UDPSocket):
+    """Encodes messages like the real socket but sends nothing, for running games without clients"""
+    
+    def __init__(self):
+        super().__init__({})
+        self.socket.close()
+        
+    def send_encoded(self, payload: memoryview, message_type: int, addresses: list[tuple[str, int]]):
+        pass
+    
+    def _get_address(self, player: Player) -> tuple[str, int]:
+        return None
@@ -0,0 +1,129 @@
+from dataclasses import dataclass, field
+import dataclasses
+import json
+import os
+import struct
+
+
+# Input log layout, all little endian:
+#   header    length prefixed JSON with the seed, arena and players (id, color and robot code hash)
+#   records   one per input: simulation tick, player index, key, key state
+# Records with one of the player indices below are not inputs. The last record has END_OF_LOG as player index
+# and holds the tick the match ended on.
+INPUT_LOG_MAGIC = b"RBIN"
+INPUT_LOG_VERSION = 3 # version 1 logged pygame key codes instead of common.keys.Key, version 2 had no disconnects or countdown
+
+INPUT_LOG_HEADER = struct.Struct("<4sHI")
+INPUT_RECORD = struct.Struct("<IBIB")
+
+DISCONNECT = 253 # the key is the index of the player that disconnected, it is removed when the tick starts
+COUNTDOWN = 254 # the key is the number of states published before the first tick
+END_OF_LOG = 255
+
+
+@dataclass
+class InputLogPlayer:
+    id: str
+    color: tuple[int, int, int]
+    robot_code_hash: str
+
+
+@dataclass
+class InputLogHeader:
+    seed: int
+    arena: tuple[int, int, int] # width, height, player starting distance
+    is_test: bool
+    players: list[InputLogPlayer]
+
+
+@dataclass
+class InputLog:
+    header: InputLogHeader
+    inputs: dict[int, list[tuple[int, int, int]]] = field(default_factory=dict) # tick -> (player idx, key, state)
+    disconnects: dict[int, list[int]] = field(default_factory=dict) # tick -> player idx
+    countdown_states: int = 0
+    end_tick: int = None
+
+
+class InputLogWriter:
+    """Writes the inputs of a deterministic match, which together with the robot code is enough to simulate it again"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def start(self, header: InputLogHeader):
+        header_bytes = json.dumps(dataclasses.asdict(header)).encode()
+
+        self.file = open(self.path, "wb")
+        self.file.write(INPUT_LOG_HEADER.pack(INPUT_LOG_MAGIC, INPUT_LOG_VERSION, len(header_bytes)))
+        self.file.write(header_bytes)
+
+    def write(self, tick: int, player_idx: int, key: int, state: int):
+        self.file.write(INPUT_RECORD.pack(tick, player_idx, key, state))
+
+    def close(self, end_tick: int):
+        if self.file is None:
+            return
+
+        self.file.write(INPUT_RECORD.pack(end_tick, END_OF_LOG, 0, 0))
+        self.file.close()
+        self.file = None
+
+        print(f"Input log saved to '{self.path}' ({os.path.getsize(self.path)} bytes)", flush=True)
+
+
+def read_input_log(path: str) -> InputLog:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, header_length = INPUT_LOG_HEADER.unpack_from(data, 0)
+    if magic != INPUT_LOG_MAGIC or version != INPUT_LOG_VERSION:
+        raise ValueError(f"'{path}' is not a supported input log")
+
+    offset = INPUT_LOG_HEADER.size
+    header = json.loads(data[offset:offset + header_length])
+    offset += header_length
+
+    log = InputLog(InputLogHeader(
+        header["seed"],
+        tuple(header["arena"]),
+        header["is_test"],
+        [InputLogPlayer(p["id"], tuple(p["color"]), p["robot_code_hash"]) for p in header["players"]]
+    ))
+
+    for tick, player_idx, key, state in INPUT_RECORD.iter_unpack(data[offset:len(data) - (len(data) - offset) % INPUT_RECORD.size]):
+        if player_idx == END_OF_LOG:
+            log.end_tick = tick
+            break
+        elif player_idx == COUNTDOWN:
+            log.countdown_states = key
+        elif player_idx == DISCONNECT:
+            log.disconnects.setdefault(tick, []).append(key)
+        else:
+            log.inputs.setdefault(tick, []).append((player_idx, key, state))
+
+    return log
+
+
+class RobotCodeStore:
+    """Robot source files saved by content hash, so each version of a robot is stored once"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _get_path(self, code_hash: str) -> str:
+        return os.path.join(self.directory, code_hash + ".py")
+
+    def save(self, code_hash: str, code: str):
+        path = self._get_path(code_hash)
+        if os.path.exists(path):
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(code)
+
+    def load(self, code_hash: str) -> str:
+        with open(self._get_path(code_hash), encoding="utf-8", newline="") as f:
+            return f.read()
@@ -1,6 +1,8 @@
 import dataclasses
 import datetime
 import json
+import os
+import random
 import threading
 from typing import Callable
 
@@ -8,19 +10,32 @@ from common.arena import Arena
 from common.robot import RobotInterface
 from common.tcp_messages import LobbyInfoMessage, LobbyJoinedMessage, RoundEndedMessage, RoundStartedMessage
 from server.game import Game
+from server.input_log import InputLogWriter
+from server.metrics import TickProfiler
+from server.replay_writer import ReplayWriter
+from server.sim_process import SimulationProcess
 from common.player import Player
-from server.udp_socket import UDPSocket
+from server.udp_socket import MulticastGroup, UDPSocket
+from server.worker_pool import NoWorkerAvailableError, RemoteMatch, WorkerPool
 
 
 class Lobby:
     
-    def __init__(self, upd_socket: UDPSocket, game_ended: Callable[[], None]):
+    def __init__(self, upd_socket: UDPSocket, game_ended: Callable[[], None], record_dir: str = None, deterministic: bool = False, profiler: TickProfiler = None,
+                 sim_process: bool = False, pool: WorkerPool = None, lobby_id: int = None, multicast: MulticastGroup = None):
         self.udp_socket = upd_socket
         self.game_ended = game_ended
+        self.profiler = profiler
+        self.record_dir = record_dir
+        self.deterministic = deterministic
+        self.sim_process = sim_process
+        self.pool = pool
+        self.lobby_id = lobby_id
+        self.multicast = multicast
         
         self.players: list[Player] = []
         
-        self.game: Game = None
+        self.game: Game | SimulationProcess | RemoteMatch = None
         
     def add_player(self, player: Player):
         self.players.append(player)
@@ -52,25 +67,88 @@ class Lobby:
         message = RoundStartedMessage(
             start_time.isoformat(),
             arena.width,
-            arena.height)
+            arena.height,
+            self.multicast.group if self.multicast is not None else "",
+            self.multicast.port if self.multicast is not None else 0)
         for player in self.players:
             player.sender.send(message)
 
-        self.game = Game(
-            self.players, 
-            arena,
-            self.udp_socket, 
-            self._on_game_ended, 
-            start_time, 
-            is_test)
+        record_name = f"match_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if self.lobby_id is not None:
+            record_name += f"_{self.lobby_id}"
+        seed = random.SystemRandom().randrange(2 ** 32)
+        if self.pool is not None:
+            try:
+                self.game = self.pool.create_match(
+                    self.players,
+                    arena,
+                    self._on_game_ended,
+                    start_time,
+                    is_test,
+                    self._get_record_path(record_name + ".replay"),
+                    self.deterministic,
+                    seed,
+                    self._get_record_path(record_name + ".inputs") if self.deterministic else None,
+                    self.multicast)
+            except NoWorkerAvailableError as e:
+                # The round is ended right away without a winner, which sends the players back to the lobby
+                print(e, flush=True)
+                message = RoundEndedMessage("")
+                for player in self.players:
+                    player.sender.send(message)
+                self._send_lobby_update()
+                return
+        elif self.sim_process:
+            self.game = SimulationProcess(
+                self.players,
+                arena,
+                self.udp_socket,
+                self._on_game_ended,
+                start_time,
+                is_test,
+                self._get_record_path(record_name + ".replay"),
+                self.deterministic,
+                seed,
+                self._get_record_path(record_name + ".inputs") if self.deterministic else None)
+        else:
+            self.game = Game(
+                self.players, 
+                arena,
+                self.udp_socket, 
+                self._on_game_ended, 
+                start_time, 
+                is_test,
+                self._create_replay_writer(record_name),
+                self.deterministic,
+                seed,
+                self._create_input_log(record_name),
+                self.profiler)
         threading.Thread(target=self.game.run, daemon=True).start()
         
+    def _get_record_path(self, file_name: str) -> str:
+        if self.record_dir is None:
+            return None
+        
+        os.makedirs(self.record_dir, exist_ok=True)
+        return os.path.join(self.record_dir, file_name)
+    
+    def _create_replay_writer(self, record_name: str) -> ReplayWriter:
+        path = self._get_record_path(record_name + ".replay")
+        return ReplayWriter(path) if path is not None else None
+    
+    def _create_input_log(self, record_name: str) -> InputLogWriter:
+        if not self.deterministic:
+            return None
+        
+        path = self._get_record_path(record_name + ".inputs")
+        return InputLogWriter(path) if path is not None else None
+        
     def stop(self):
         self.game.stop()
         
     def _on_game_ended(self, winner_idx: int):
         winner_id = self.players[winner_idx].id if not self.game.is_test else ""
-        message = RoundEndedMessage(winner_id)
+        message = RoundEndedMessage(winner_id, self.game.robot_cpu_summary())
         for player in self.players:
             player.sender.send(message)        
         
@@ -1,9 +1,36 @@
-from server.game_server import GameServer
+import argparse
+import os
+
+from common.spectate import parse_address
+from server.game_server import DEFAULT_LOBBY_SIZE, GameServer
+from server.udp_socket import DEFAULT_MULTICAST_PORT, MulticastGroup
 
 
 def main():
-    server = GameServer()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--record-dir", default=None, help="Records every match to a replay file in this directory")
+    parser.add_argument("--deterministic", action="store_true", help="Runs matches deterministically, with --record-dir their inputs are logged for server.resimulate")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serves tick metrics as plain text on this loopback port")
+    parser.add_argument("--sim-process", action="store_true", help="Runs each match in its own process, apart from the networking")
+    parser.add_argument("--workers", type=int, default=0, help="Hosts matches in this many worker processes, so lobbies can play at the same time (0 runs one match at a time in the server)")
+    parser.add_argument("--lobby-size", type=int, default=DEFAULT_LOBBY_SIZE, help="Players per lobby with --workers, a new lobby is opened when the others are full or playing")
+    parser.add_argument("--relay", default=None, help="Sends every snapshot once to the spectator relay at host:port, see server.spectator_relay")
+    parser.add_argument("--multicast", default=None, help="Sends game states once to this multicast group:port on the LAN instead of to each player, e.g. 239.255.42.1:6100")
+    parser.add_argument("--multicast-interface", default="0.0.0.0", help="The address of the interface multicast is sent from")
+    args = parser.parse_args()
+    
+    # Robot files import pygame for their GUI when they are loaded, the server never draws so its banner is only noise
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    
+    multicast = None
+    if args.multicast is not None:
+        group, port = parse_address(args.multicast, DEFAULT_MULTICAST_PORT)
+        multicast = MulticastGroup(group, port, args.multicast_interface)
+    
+    server = GameServer(args.port, args.record_dir, args.deterministic, args.metrics_port, args.sim_process, args.workers, args.lobby_size,
+                        parse_address(args.relay) if args.relay is not None else None, multicast)
     server.start()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
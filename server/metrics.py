@@ -0,0 +1,213 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from time import perf_counter_ns
+from typing import Callable
+
+from common.constants import SERVER_TICK_RATE
+from common.hook_timings import HookTimings, describe_hook_summary
+from server.position_history import RewindMetrics
+
+
+TICK_PHASES = ["inputs", "projectiles", "players", "destroy", "collisions", "encode", "send"]
+ROBOT_HOOKS = ["ability_func", "get_state"]
+QUANTILES = [0.5, 0.95, 0.99]
+
+TICK_BUDGET_NS = 1_000_000_000 // SERVER_TICK_RATE
+LOG_INTERVAL_NS = 10 * 1_000_000_000
+
+
+class RollingTimings:
+    """The newest samples of a timing in nanoseconds, for percentiles over a recent window"""
+
+    def __init__(self, window: int):
+        self.samples: deque[int] = deque(maxlen=window)
+
+    def add(self, ns: int):
+        self.samples.append(ns)
+
+    def percentiles(self, quantiles: list[float]) -> list[int]:
+        samples = sorted(self.samples)
+        if len(samples) == 0:
+            return [0 for _ in quantiles]
+
+        return [samples[min(int(q * len(samples)), len(samples) - 1)] for q in quantiles]
+
+
+class RobotCpuAccounting:
+    """Time spent in the script hooks of each robot during a match"""
+
+    def __init__(self):
+        self.robots: dict[str, dict[str, HookTimings]] = {}
+
+    def record(self, robot_id: str, hook: str, ns: int):
+        hooks = self.robots.get(robot_id)
+        if hooks is None:
+            hooks = {hook: HookTimings() for hook in ROBOT_HOOKS}
+            self.robots[robot_id] = hooks
+
+        hooks[hook].record(ns)
+
+    def summary(self) -> dict[str, dict[str, dict]]:
+        return {
+            robot_id: {hook: timings.to_dict() for hook, timings in hooks.items()}
+            for robot_id, hooks in self.robots.items()
+        }
+
+    def describe(self) -> str:
+        return "\n".join(f"  {robot_id}: {describe_hook_summary(hooks)}" for robot_id, hooks in self.summary().items())
+
+    def exposition_lines(self) -> list[str]:
+        samples: list[tuple[str, HookTimings]] = []
+        for robot_id, hooks in list(self.robots.items()):
+            robot_label = robot_id.replace("\\", "\\\\").replace('"', '\\"')
+            for hook, timings in list(hooks.items()):
+                samples.append((f'{{robot="{robot_label}",hook="{hook}"}}', timings))
+
+        # The samples of a metric family must follow its TYPE line as one group
+        lines = ["# TYPE robot_battle_robot_hook_seconds_total counter"]
+        lines += [f"robot_battle_robot_hook_seconds_total{labels} {timings.total_ns / 1e9:.6f}" for labels, timings in samples]
+        lines.append("# TYPE robot_battle_robot_hook_calls_total counter")
+        lines += [f"robot_battle_robot_hook_calls_total{labels} {timings.calls}" for labels, timings in samples]
+        lines.append("# TYPE robot_battle_robot_hook_max_seconds gauge")
+        lines += [f"robot_battle_robot_hook_max_seconds{labels} {timings.max_ns / 1e9:.6f}" for labels, timings in samples]
+        return lines
+
+
+class TickProfiler:
+    """Times the phases of each server tick with perf_counter_ns
+
+    A tick is measured from begin_tick to end_tick. Sequential phases are closed with mark, and phases
+    that alternate per player are summed with add."""
+
+    def __init__(self, window: int = 10 * SERVER_TICK_RATE, log_interval_ns: int | None = LOG_INTERVAL_NS):
+        self.window = window
+        self.log_interval_ns = log_interval_ns
+
+        self.phases: dict[str, RollingTimings] = {phase: RollingTimings(window) for phase in TICK_PHASES}
+        self.ticks: RollingTimings = RollingTimings(window)
+        self.tick_count: int = 0
+        self.overruns: int = 0
+        self.slowest_tick_ns: int = 0
+
+        self.entity_counts: dict[str, int] = {}
+        self.rewind_metrics: RewindMetrics = None
+        self.robot_cpu: RobotCpuAccounting = RobotCpuAccounting()
+
+        self._tick_start: int = 0
+        self._mark: int = 0
+        self._current: dict[str, int] = {phase: 0 for phase in TICK_PHASES}
+        self._last_log: int = perf_counter_ns()
+
+    def start_match(self, rewind_metrics: RewindMetrics):
+        self.rewind_metrics = rewind_metrics
+        self.robot_cpu = RobotCpuAccounting()
+
+    def begin_tick(self):
+        self._tick_start = perf_counter_ns()
+        self._mark = self._tick_start
+
+    def mark(self, phase: str):
+        now = perf_counter_ns()
+        self._current[phase] += now - self._mark
+        self._mark = now
+
+    def add(self, phase: str, ns: int):
+        self._current[phase] += ns
+
+    def end_tick(self, entity_counts: dict[str, int]):
+        now = perf_counter_ns()
+        tick_ns = now - self._tick_start
+
+        for phase, ns in self._current.items():
+            self.phases[phase].add(ns)
+            self._current[phase] = 0
+
+        self.ticks.add(tick_ns)
+        self.tick_count += 1
+        self.slowest_tick_ns = max(self.slowest_tick_ns, tick_ns)
+        if tick_ns > TICK_BUDGET_NS:
+            self.overruns += 1
+
+        self.entity_counts = entity_counts
+
+        if self.log_interval_ns is not None and now - self._last_log > self.log_interval_ns:
+            self._last_log = now
+            print(self.summary(), flush=True)
+
+    def summary(self) -> str:
+        p50, p95, p99 = self.ticks.percentiles(QUANTILES)
+        phases = ", ".join(f"{phase} {self.phases[phase].percentiles([0.95])[0] / 1e6:.2f}" for phase in TICK_PHASES)
+        entities = ", ".join(f"{count} {kind}" for kind, count in self.entity_counts.items())
+        return (f"Tick: p50 {p50 / 1e6:.2f} ms, p95 {p95 / 1e6:.2f} ms, p99 {p99 / 1e6:.2f} ms, "
+                f"{self.overruns}/{self.tick_count} over budget | p95 per phase (ms): {phases} | {entities}")
+
+    def exposition(self) -> str:
+        """Plain text metrics in the Prometheus exposition format"""
+        lines = [
+            "# TYPE robot_battle_tick_seconds summary",
+            *self._summary_lines("robot_battle_tick_seconds", "", self.ticks),
+            f"robot_battle_tick_seconds_count {self.tick_count}",
+            "# TYPE robot_battle_tick_phase_seconds summary",
+        ]
+        for phase in TICK_PHASES:
+            lines += self._summary_lines("robot_battle_tick_phase_seconds", f'phase="{phase}",', self.phases[phase])
+
+        lines += [
+            "# TYPE robot_battle_tick_budget_seconds gauge",
+            f"robot_battle_tick_budget_seconds {TICK_BUDGET_NS / 1e9:.6f}",
+            "# TYPE robot_battle_tick_overruns_total counter",
+            f"robot_battle_tick_overruns_total {self.overruns}",
+            "# TYPE robot_battle_slowest_tick_seconds gauge",
+            f"robot_battle_slowest_tick_seconds {self.slowest_tick_ns / 1e9:.6f}",
+            "# TYPE robot_battle_entities gauge",
+        ]
+        lines += [f'robot_battle_entities{{kind="{kind}"}} {count}' for kind, count in self.entity_counts.items()]
+
+        if self.rewind_metrics is not None:
+            lines += [
+                "# TYPE robot_battle_lag_compensation_checks_total counter",
+                f"robot_battle_lag_compensation_checks_total {self.rewind_metrics.checks}",
+                f'robot_battle_lag_compensation_checks_total{{kind="rewound"}} {self.rewind_metrics.rewound_checks}',
+                f'robot_battle_lag_compensation_checks_total{{kind="capped"}} {self.rewind_metrics.capped_checks}',
+                "# TYPE robot_battle_lag_compensation_rewind_seconds gauge",
+                f'robot_battle_lag_compensation_rewind_seconds{{stat="avg"}} {self.rewind_metrics.average_rewind().total_seconds():.6f}',
+                f'robot_battle_lag_compensation_rewind_seconds{{stat="max"}} {self.rewind_metrics.max_rewind.total_seconds():.6f}',
+            ]
+
+        lines += self.robot_cpu.exposition_lines()
+
+        return "\n".join(lines) + "\n"
+
+    def _summary_lines(self, name: str, labels: str, timings: RollingTimings) -> list[str]:
+        return [
+            f'{name}{{{labels}quantile="{q}"}} {ns / 1e9:.6f}'
+            for q, ns in zip(QUANTILES, timings.percentiles(QUANTILES))
+        ]
+
+
+class MetricsServer:
+    """Serves the metrics text on a loopback port"""
+
+    def __init__(self, port: int, get_metrics: Callable[[], str]):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = get_metrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics served on http://127.0.0.1:{self.server.server_address[1]}/metrics", flush=True)
+
+    def stop(self):
+        self.server.shutdown()
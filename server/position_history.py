@@ -0,0 +1,62 @@
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+
+@dataclass
+class RewindMetrics:
+    """Counts the hit checks of each live projectile per tick and how far they were rewound"""
+    checks: int = field(default=0, init=False)
+    rewound_checks: int = field(default=0, init=False)
+    capped_checks: int = field(default=0, init=False)
+    total_rewind: timedelta = field(default_factory=timedelta, init=False)
+    max_rewind: timedelta = field(default_factory=timedelta, init=False)
+
+    def record(self, rewind: timedelta, capped: bool):
+        self.checks += 1
+        if rewind > timedelta():
+            self.rewound_checks += 1
+        if capped:
+            self.capped_checks += 1
+
+        self.total_rewind += rewind
+        self.max_rewind = max(self.max_rewind, rewind)
+
+    def average_rewind(self) -> timedelta:
+        return self.total_rewind / self.checks if self.checks > 0 else timedelta()
+
+    def summary(self) -> str:
+        return (f"Lag compensation: {self.checks} checks, {self.rewound_checks} rewound, {self.capped_checks} capped, "
+                f"avg {self.average_rewind().total_seconds() * 1000:.1f} ms, max {self.max_rewind.total_seconds() * 1000:.1f} ms")
+
+
+class PositionHistory:
+    """Ring buffer of robot positions per tick, used to rewind hit checks by a shooter's latency"""
+
+    def __init__(self, max_rewind: timedelta = timedelta(milliseconds=250)):
+        self.max_rewind = max_rewind
+        self.metrics = RewindMetrics()
+
+        self.snapshots: deque[tuple[datetime, dict[int, tuple[float, float]]]] = deque()
+
+    def record(self, time: datetime, positions: dict[int, tuple[float, float]]):
+        self.snapshots.append((time, positions))
+
+        # Keep one snapshot older than the window, so the oldest allowed rewind always has a match
+        while len(self.snapshots) > 2 and time - self.snapshots[1][0] > self.max_rewind:
+            self.snapshots.popleft()
+
+    def clamp_rewind(self, latency: timedelta) -> timedelta:
+        return min(max(latency, timedelta()), self.max_rewind)
+
+    def get_positions(self, time: datetime, rewind: timedelta) -> dict[int, tuple[float, float]]:
+        """Returns the newest recorded positions at or before the rewound time"""
+        target = time - rewind
+        for snapshot_time, positions in reversed(self.snapshots):
+            if snapshot_time <= target:
+                return positions
+
+        return self.snapshots[0][1] if len(self.snapshots) > 0 else {}
+
+    def clear(self):
+        self.snapshots.clear()
@@ -0,0 +1,78 @@
+from queue import Queue
+import threading
+
+import numpy as np
+
+from common.arena import Arena
+from common.replay import KEYFRAME_INTERVAL, OFFSET_DTYPE, RECORD_HEADER, RECORD_KEYFRAME, REPLAY_END_MAGIC, REPLAY_HEADER, REPLAY_MAGIC, REPLAY_TRAILER, REPLAY_VERSION, TICK_DTYPE
+from common.udp_message import PlayerStaticInfoMessage
+
+
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+class ReplayWriter:
+    """Appends the game states of a match to a replay file, the file is written on a background thread"""
+
+    def __init__(self, path: str, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+
+        self.queue: Queue[tuple[int, bytes] | None] = Queue()
+        self.thread: threading.Thread = None
+
+    def start(self, static_info: PlayerStaticInfoMessage, arena: Arena):
+        static_info_bytes = static_info.to_bytes()
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.keyframe_interval, arena.width, arena.height, len(static_info_bytes)) \
+            + static_info_bytes
+
+        self.thread = threading.Thread(target=self._run, args=(header,), daemon=True)
+        self.thread.start()
+
+    def write(self, tick: int, payload: memoryview):
+        # The payload is copied, since the sender reuses its buffer for the next message
+        self.queue.put((tick, bytes(payload)))
+
+    def close(self):
+        if self.thread is None:
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def _run(self, header: bytes):
+        offsets: list[int] = []
+        keyframes: list[int] = []
+        first_tick: int = None
+
+        with open(self.path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(header)
+            offset = len(header)
+
+            while (item := self.queue.get()) is not None:
+                tick, payload = item
+                if first_tick is None:
+                    first_tick = tick
+                if tick - first_tick < len(offsets):
+                    continue
+
+                # Skipped ticks point at the record before them, so the index stays one entry per tick
+                while len(offsets) < tick - first_tick:
+                    offsets.append(offsets[-1])
+                offsets.append(offset)
+
+                flags = 0
+                if (tick - first_tick) % self.keyframe_interval == 0:
+                    flags |= RECORD_KEYFRAME
+                    keyframes.append(tick)
+
+                f.write(RECORD_HEADER.pack(tick, flags, len(payload)))
+                f.write(payload)
+                offset += RECORD_HEADER.size + len(payload)
+
+            f.write(np.array(offsets, dtype=OFFSET_DTYPE).tobytes())
+            f.write(np.array(keyframes, dtype=TICK_DTYPE).tobytes())
+            f.write(REPLAY_TRAILER.pack(offset, first_tick or 0, len(offsets), len(keyframes), REPLAY_END_MAGIC))
+
+        print(f"Replay saved to '{self.path}' ({len(offsets)} ticks)", flush=True)
@@ -0,0 +1,70 @@
+import argparse
+from datetime import datetime
+import os
+
+from common.arena import Arena
+from common.player import Player
+from common.robot import compile_robot_code, parse_robot_config_from_code
+from server.game import Game
+from server.headless import NullUDPSocket
+from server.input_log import RobotCodeStore, read_input_log
+from server.replay_writer import ReplayWriter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates a deterministic match again from its input log")
+    parser.add_argument("input_log")
+    parser.add_argument("--robots", default=None, help="Directory with the robot code by hash, defaults to 'robots' next to the log")
+    parser.add_argument("--replay", default=None, help="Writes the simulated match to this replay file")
+    parser.add_argument("--until", type=int, default=None, help="Stops after this simulation tick")
+    args = parser.parse_args()
+    
+    log = read_input_log(args.input_log)
+    code_store = RobotCodeStore(args.robots or os.path.join(os.path.dirname(args.input_log), "robots"))
+    
+    players: list[Player] = []
+    for info in log.header.players:
+        code = code_store.load(info.robot_code_hash)
+        player = Player(info.id, 0, None, parse_robot_config_from_code(compile_robot_code(code)), info.robot_code_hash)
+        player.color = info.color
+        players.append(player)
+    
+    game = Game(
+        players,
+        Arena(*log.header.arena),
+        NullUDPSocket(),
+        lambda winner: None,
+        datetime.now(),
+        log.header.is_test,
+        ReplayWriter(args.replay) if args.replay is not None else None,
+        deterministic=True,
+        seed=log.header.seed)
+    
+    # The live match published states during its countdown, which asks the robots for their state
+    for _ in range(log.countdown_states):
+        game.publish_state()
+    
+    end_tick = log.end_tick if args.until is None else args.until
+    running = True
+    while running and (end_tick is None or game.sim_tick < end_tick):
+        for player_idx, key, state in log.inputs.get(game.sim_tick, []):
+            game.update_key(players[player_idx].id, key, state)
+        for player_idx in log.disconnects.get(game.sim_tick, []):
+            game.remove_disconnected_player(players[player_idx])
+        
+        running = game.step()
+        
+        # Robot states are still created each tick, since robots may update themselves when asked for them
+        game.publish_state()
+    
+    if game.replay is not None:
+        game.replay.close()
+    
+    print(f"Simulated {game.sim_tick} ticks (log ended at {log.end_tick})", flush=True)
+    for instance in game.players.values():
+        robot = instance.robot
+        print(f"  {instance.player.id}: {'dead' if instance.dead else 'alive'}, hp {robot.hp:.1f}, energy {robot.energy:.1f}, position ({robot.x:.1f}, {robot.y:.1f})", flush=True)
+    print(game.position_history.metrics.summary(), flush=True)
+
+if __name__ == "__main__":
+    main()
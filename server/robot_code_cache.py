@@ -0,0 +1,30 @@
+from collections import OrderedDict
+import threading
+from types import CodeType
+
+from common.robot import compile_robot_code, get_robot_code_hash
+
+
+class RobotCodeCache:
+    """Compiled robot code keyed by content hash, so reconnects and rematches skip parsing and compiling"""
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.codes: OrderedDict[str, CodeType] = OrderedDict()
+        self.lock = threading.Lock()
+        
+    def get(self, code: str) -> tuple[str, CodeType]:
+        code_hash = get_robot_code_hash(code)
+        with self.lock:
+            compiled = self.codes.get(code_hash)
+            if compiled is not None:
+                self.codes.move_to_end(code_hash)
+                return code_hash, compiled
+            
+        compiled = compile_robot_code(code)
+        with self.lock:
+            self.codes[code_hash] = compiled
+            if len(self.codes) > self.max_size:
+                self.codes.popitem(last=False)
+                
+        return code_hash, compiled
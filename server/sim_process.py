@@ -0,0 +1,427 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import struct
+import threading
+from time import monotonic, sleep
+from typing import Callable
+
+from common.arena import Arena
+from common.player import Player
+from common.robot import parse_robot_config_from_string
+from server.game import Game
+from server.input_log import InputLogWriter
+from server.replay_writer import ReplayWriter
+from server.udp_socket import UDPSocket
+
+
+# Frame buffer layout, all little endian:
+#   header    generation of the newest complete publish
+#   2 slots   seq (odd while written), generation, frame count, used bytes, then the frames
+#   frame     message type, target player index (ALL_PLAYERS for everyone, GROUP for the multicast group or everyone,
+#             SPECTATORS for the relay), payload length, payload
+FRAME_BUFFER_HEADER = struct.Struct("<Q")
+FRAME_SLOT_HEADER = struct.Struct("<QQII")
+FRAME_HEADER = struct.Struct("<BHI")
+FRAME_SLOT_SIZE = 1 << 20
+ALL_PLAYERS = 0xFFFF
+SPECTATORS = 0xFFFE
+GROUP = 0xFFFD
+
+# Input ring layout: head and tail counters, then fixed size records of kind, player index, key, state and value
+INPUT_RING_HEADER = struct.Struct("<QQ")
+INPUT_RING_RECORD = struct.Struct("<BHIBf")
+INPUT_RING_CAPACITY = 4096
+
+INPUT_KEY = 1
+INPUT_REMOVE_PLAYER = 2
+INPUT_LATENCY = 3
+INPUT_STOP = 4
+
+INPUT_POLL_INTERVAL = 0.001
+LATENCY_UPDATE_INTERVAL = 1
+METRICS_INTERVAL = 1
+
+
+class SharedFrameBuffer:
+    """Double buffer in shared memory for the messages of each tick, guarded by a sequence lock per slot
+
+    One process writes a publish into the slot of its generation while the other can still read the previous one.
+    A reader that falls more than one publish behind skips to the newest."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, slot_size: int):
+        self.memory = memory
+        self.buf = memory.buf
+        self.slot_size = slot_size
+
+        self.generation: int = 0 # newest published, on the writer
+        self.write_offset: int = None
+        self.write_count: int = 0
+
+        self.read_generation: int = 0 # newest read, on the reader
+        self.skipped: int = 0
+
+    @staticmethod
+    def create(slot_size: int = FRAME_SLOT_SIZE) -> "SharedFrameBuffer":
+        size = FRAME_BUFFER_HEADER.size + 2 * (FRAME_SLOT_HEADER.size + slot_size)
+        frames = SharedFrameBuffer(shared_memory.SharedMemory(create=True, size=size), slot_size)
+        frames.buf[:size] = bytes(size)
+        return frames
+
+    @staticmethod
+    def attach(name: str, slot_size: int = FRAME_SLOT_SIZE) -> "SharedFrameBuffer":
+        return SharedFrameBuffer(shared_memory.SharedMemory(name), slot_size)
+
+    def _slot(self, generation: int) -> int:
+        return FRAME_BUFFER_HEADER.size + (generation % 2) * (FRAME_SLOT_HEADER.size + self.slot_size)
+
+    def append(self, message_type: int, target: int, payload: memoryview):
+        if self.write_offset is None:
+            slot = self._slot(self.generation + 1)
+            seq, _, _, _ = FRAME_SLOT_HEADER.unpack_from(self.buf, slot)
+            FRAME_SLOT_HEADER.pack_into(self.buf, slot, seq + 1, self.generation + 1, 0, 0)
+            self.write_offset = slot + FRAME_SLOT_HEADER.size
+            self.write_count = 0
+
+        end = self.write_offset + FRAME_HEADER.size + len(payload)
+        if end > self._slot(self.generation + 1) + FRAME_SLOT_HEADER.size + self.slot_size:
+            raise ValueError(f"The messages of tick {self.generation + 1} do not fit in a {self.slot_size} byte frame slot")
+
+        FRAME_HEADER.pack_into(self.buf, self.write_offset, message_type, target, len(payload))
+        self.buf[self.write_offset + FRAME_HEADER.size:end] = payload
+        self.write_offset = end
+        self.write_count += 1
+
+    def commit(self):
+        if self.write_offset is None:
+            return
+
+        generation = self.generation + 1
+        slot = self._slot(generation)
+        seq, _, _, _ = FRAME_SLOT_HEADER.unpack_from(self.buf, slot)
+        used = self.write_offset - slot - FRAME_SLOT_HEADER.size
+        FRAME_SLOT_HEADER.pack_into(self.buf, slot, seq + 1, generation, self.write_count, used)
+        FRAME_BUFFER_HEADER.pack_into(self.buf, 0, generation)
+
+        self.generation = generation
+        self.write_offset = None
+
+    def _read(self, generation: int) -> list[tuple[int, int, memoryview]] | None:
+        slot = self._slot(generation)
+        seq, slot_generation, count, used = FRAME_SLOT_HEADER.unpack_from(self.buf, slot)
+        if seq % 2 == 1 or slot_generation != generation:
+            return None
+
+        start = slot + FRAME_SLOT_HEADER.size
+        data = memoryview(bytes(self.buf[start:start + used]))
+        if FRAME_SLOT_HEADER.unpack_from(self.buf, slot)[0] != seq:
+            # The writer lapped this slot while it was copied
+            return None
+
+        frames = []
+        offset = 0
+        for _ in range(count):
+            message_type, target, length = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            frames.append((message_type, target, data[offset:offset + length]))
+            offset += length
+        return frames
+
+    def read_new(self) -> list[list[tuple[int, int, memoryview]]]:
+        """Returns the frames of each publish since the last read, oldest first"""
+        publishes = []
+        while True:
+            newest = FRAME_BUFFER_HEADER.unpack_from(self.buf, 0)[0]
+            if newest <= self.read_generation:
+                return publishes
+
+            generation = self.read_generation + 1
+            frames = self._read(generation)
+            if frames is None:
+                generation = newest
+                frames = self._read(generation)
+                if frames is None:
+                    continue
+                self.skipped += generation - self.read_generation - 1
+
+            self.read_generation = generation
+            publishes.append(frames)
+
+    def close(self, unlink: bool = False):
+        self.buf = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+class SharedInputRing:
+    """Single producer, single consumer ring of fixed size records in shared memory
+
+    Only the producer moves head and only the consumer moves tail, so neither process takes a lock."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, capacity: int):
+        self.memory = memory
+        self.buf = memory.buf
+        self.capacity = capacity
+
+    @staticmethod
+    def create(capacity: int = INPUT_RING_CAPACITY) -> "SharedInputRing":
+        size = INPUT_RING_HEADER.size + capacity * INPUT_RING_RECORD.size
+        ring = SharedInputRing(shared_memory.SharedMemory(create=True, size=size), capacity)
+        ring.buf[:size] = bytes(size)
+        return ring
+
+    @staticmethod
+    def attach(name: str, capacity: int = INPUT_RING_CAPACITY) -> "SharedInputRing":
+        return SharedInputRing(shared_memory.SharedMemory(name), capacity)
+
+    def push(self, kind: int, player_idx: int = 0, key: int = 0, state: int = 0, value: float = 0) -> bool:
+        head, tail = INPUT_RING_HEADER.unpack_from(self.buf, 0)
+        if head - tail >= self.capacity:
+            return False
+
+        offset = INPUT_RING_HEADER.size + (head % self.capacity) * INPUT_RING_RECORD.size
+        INPUT_RING_RECORD.pack_into(self.buf, offset, kind, player_idx, key, state, value)
+        struct.pack_into("<Q", self.buf, 0, head + 1) # published only after the record is written
+        return True
+
+    def drain(self) -> list[tuple[int, int, int, int, float]]:
+        head, tail = INPUT_RING_HEADER.unpack_from(self.buf, 0)
+        records = [
+            INPUT_RING_RECORD.unpack_from(self.buf, INPUT_RING_HEADER.size + (i % self.capacity) * INPUT_RING_RECORD.size)
+            for i in range(tail, head)
+        ]
+        struct.pack_into("<Q", self.buf, 8, head)
+        return records
+
+    def close(self, unlink: bool = False):
+        self.buf = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+class FrameUDPSocket(UDPSocket):
+    """Encodes messages like the real socket but writes them to the frame buffer, for the network process to send"""
+
+    def __init__(self, frames: SharedFrameBuffer, player_indices: dict[str, int]):
+        super().__init__({})
+        self.socket.close()
+        self.frames = frames
+        self.player_indices = player_indices
+
+    def send_encoded_to_all(self, payload: memoryview, message_type: int):
+        self.frames.append(message_type, ALL_PLAYERS, payload)
+
+    def send_encoded(self, payload: memoryview, message_type: int, addresses: list[int]):
+        for player_idx in addresses:
+            self.frames.append(message_type, player_idx, payload)
+
+    def send_encoded_to_group(self, payload: memoryview, message_type: int):
+        self.frames.append(message_type, GROUP, payload)
+
+    def send_encoded_to_spectators(self, payload: memoryview, message_type: int):
+        self.frames.append(message_type, SPECTATORS, payload)
+
+    def _get_address(self, player: Player) -> int:
+        return self.player_indices[player.id]
+
+    def flush(self):
+        self.frames.commit()
+
+
+@dataclass
+class SimulationPlayer:
+    id: str
+    color: tuple[int, int, int]
+    robot_code: str
+    robot_code_hash: str
+
+
+@dataclass
+class SimulationSpec:
+    """Everything the simulation process needs to create the game, it is sent to the process so it must pickle"""
+    players: list[SimulationPlayer]
+    arena: Arena
+    start_time: datetime
+    is_test: bool
+    deterministic: bool
+    seed: int
+    replay_path: str | None
+    input_log_path: str | None
+    frames_name: str
+    inputs_name: str
+
+
+def load_players(infos: list[SimulationPlayer]) -> list[Player]:
+    """Recreates the players of a match in a process that has no connection to them"""
+    players: list[Player] = []
+    for info in infos:
+        player = Player(info.id, 0, None, parse_robot_config_from_string(info.robot_code), info.robot_code_hash)
+        player.color = info.color
+        players.append(player)
+    return players
+
+
+def run_simulation(spec: SimulationSpec, events: multiprocessing.Queue):
+    """Entry point of the simulation process"""
+    frames = SharedFrameBuffer.attach(spec.frames_name)
+    inputs = SharedInputRing.attach(spec.inputs_name)
+
+    players = load_players(spec.players)
+
+    def on_game_ended(winner: int):
+        events.put(("ended", winner, game.robot_cpu_summary()))
+
+    game = Game(
+        players,
+        spec.arena,
+        FrameUDPSocket(frames, {player.id: i for i, player in enumerate(players)}),
+        on_game_ended,
+        spec.start_time,
+        spec.is_test,
+        ReplayWriter(spec.replay_path) if spec.replay_path is not None else None,
+        spec.deterministic,
+        spec.seed,
+        InputLogWriter(spec.input_log_path) if spec.input_log_path is not None else None)
+
+    running = threading.Event()
+    running.set()
+
+    def apply_inputs():
+        last_metrics = monotonic()
+        while running.is_set():
+            for kind, player_idx, key, state, value in inputs.drain():
+                if kind == INPUT_KEY:
+                    game.update_key(players[player_idx].id, key, state)
+                elif kind == INPUT_REMOVE_PLAYER:
+                    game.remove_disconnected_player(players[player_idx])
+                elif kind == INPUT_LATENCY:
+                    players[player_idx].latency = timedelta(seconds=value)
+                elif kind == INPUT_STOP:
+                    game.stop()
+
+            if monotonic() - last_metrics > METRICS_INTERVAL:
+                last_metrics = monotonic()
+                events.put(("metrics", game.profiler.exposition()))
+            sleep(INPUT_POLL_INTERVAL)
+
+    input_thread = threading.Thread(target=apply_inputs, daemon=True)
+    input_thread.start()
+    game.run()
+
+    running.clear()
+    input_thread.join()
+    frames.close()
+    inputs.close()
+
+
+class SimulationProcess:
+    """Runs a match in its own process and sends the messages it publishes, stands in for Game in the lobby
+
+    The simulation writes the encoded messages of each tick to a shared frame buffer and reads inputs from a
+    shared ring, so tick timing is not disturbed by the TCP threads and UDP sends of this process."""
+
+    def __init__(self, players: list[Player], arena: Arena, udp: UDPSocket, game_ended: Callable[[int], None], start_time: datetime, is_test: bool = False,
+                 replay_path: str = None, deterministic: bool = False, seed: int = None, input_log_path: str = None):
+        self.players = players
+        self.player_indices: dict[str, int] = {player.id: i for i, player in enumerate(players)}
+        self.removed: set[int] = set()
+        self.udp = udp
+        self.game_ended_callback = game_ended
+        self.is_test = is_test
+
+        self.frames = SharedFrameBuffer.create()
+        self.inputs = SharedInputRing.create()
+        self.input_lock = threading.Lock() # inputs come from every TCP thread, the ring takes one producer
+
+        context = multiprocessing.get_context("spawn")
+        self.events = context.Queue()
+        self.process = context.Process(target=run_simulation, args=(SimulationSpec(
+            [SimulationPlayer(p.id, tuple(p.color), p.robot_code, p.robot_code_hash) for p in players],
+            arena,
+            start_time,
+            is_test,
+            deterministic,
+            seed,
+            replay_path,
+            input_log_path,
+            self.frames.memory.name,
+            self.inputs.memory.name
+        ), self.events), daemon=True)
+
+        self.cpu_summary: dict[str, dict[str, dict]] = {}
+        self.metrics_text: str = None
+
+    def update_key(self, player_id: str, key: int, state: int):
+        player_idx = self.player_indices.get(player_id)
+        if player_idx is not None:
+            self._push(INPUT_KEY, player_idx, key, state)
+
+    def remove_disconnected_player(self, player: Player):
+        player_idx = self.player_indices[player.id]
+        self.removed.add(player_idx)
+        self._push(INPUT_REMOVE_PLAYER, player_idx)
+
+    def stop(self):
+        self._push(INPUT_STOP)
+
+    def robot_cpu_summary(self) -> dict[str, dict[str, dict]]:
+        return self.cpu_summary
+
+    def _push(self, kind: int, player_idx: int = 0, key: int = 0, state: int = 0, value: float = 0):
+        with self.input_lock:
+            # A full ring is drained within a millisecond, so the sender waits instead of losing an input
+            while not self.inputs.push(kind, player_idx, key, state, value):
+                sleep(INPUT_POLL_INTERVAL)
+
+    def run(self):
+        self.process.start()
+
+        winner = -1
+        last_latency_update = 0
+        while True:
+            self._send_frames()
+
+            try:
+                event = self.events.get(timeout=INPUT_POLL_INTERVAL)
+            except queue.Empty:
+                event = None
+
+            if event is not None and event[0] == "metrics":
+                self.metrics_text = event[1]
+            elif event is not None and event[0] == "ended":
+                _, winner, self.cpu_summary = event
+                break
+            elif not self.process.is_alive():
+                print(f"The simulation process exited with code {self.process.exitcode}", flush=True)
+                break
+
+            if monotonic() - last_latency_update > LATENCY_UPDATE_INTERVAL:
+                last_latency_update = monotonic()
+                for i, player in enumerate(self.players):
+                    if i not in self.removed:
+                        self._push(INPUT_LATENCY, i, value=player.latency.total_seconds())
+
+        self._send_frames()
+        self.process.join(5)
+        if self.frames.skipped > 0:
+            print(f"Skipped {self.frames.skipped} ticks the simulation published faster than they were sent", flush=True)
+        self.frames.close(unlink=True)
+        self.inputs.close(unlink=True)
+
+        self.game_ended_callback(winner)
+
+    def _send_frames(self):
+        for frames in self.frames.read_new():
+            for message_type, target, payload in frames:
+                if target == ALL_PLAYERS:
+                    self.udp.send_encoded_to_all(payload, message_type)
+                elif target == GROUP:
+                    self.udp.send_encoded_to_group(payload, message_type)
+                elif target == SPECTATORS:
+                    self.udp.send_encoded_to_spectators(payload, message_type)
+                elif target not in self.removed:
+                    self.udp.send_encoded_to_player(payload, message_type, self.players[target])
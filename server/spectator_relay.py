@@ -0,0 +1,230 @@
+import argparse
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import itertools
+import socket
+import threading
+from time import monotonic, sleep
+
+from common.constants import MAX_UDP_PACKET_SIZE
+from common.spectate import DEFAULT_RELAY_PORT, NEWEST_MATCH, SPECTATE_JOIN, SPECTATE_LEAVE, SPECTATE_REQUEST, SPECTATE_TIMEOUT, is_spectate_request
+from common.udp_message import MATCH_INFO_TYPE, PLAYER_STATIC_INFO_TYPE, MatchInfoMessage
+from server.udp_socket import PACKET_HEADER, PACKET_HEADER_SIZE, PACKET_SEPARATOR
+
+
+DEFAULT_BUFFER_SIZE = 1 << 16 # packets held back for the delay
+STATS_INTERVAL = 10
+# A match that sent nothing for this long has ended
+MATCH_TIMEOUT = 60
+
+
+@dataclass
+class RelayMatch:
+    match_id: int
+    source: tuple[str, int] # the game server socket that sends the match
+    player_ids: list[str] = field(default_factory=list)
+    spectators: set[tuple[str, int]] = field(default_factory=set)
+    last_packet: float = field(default_factory=monotonic)
+
+    # The newest match info and static info, sent to spectators that join during the match
+    info_packets: list[bytes] = field(default_factory=list)
+    static_packets: dict[int, bytes] = field(default_factory=dict) # by part index
+    static_message_id: int = None
+
+    def join_packets(self) -> list[bytes]:
+        return self.info_packets + [self.static_packets[i] for i in sorted(self.static_packets)]
+
+
+@dataclass
+class Spectator:
+    requested_match: int
+    last_seen: float
+    match: RelayMatch = None
+
+
+class SpectatorRelay:
+    """Receives the snapshots of game servers once and sends them on to any number of spectators
+
+    Packets are sent on unchanged, after the delay, by a thread of their own, so the game server
+    sends one extra packet per message however many spectators watch."""
+
+    def __init__(self, port: int = DEFAULT_RELAY_PORT, delay: float = 0, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("0.0.0.0", port))
+        self.port = port
+        self.delay = delay
+
+        self.pending: deque[tuple[float, tuple[str, int], bytes]] = deque(maxlen=buffer_size)
+        self.pending_condition = threading.Condition()
+
+        self.matches: dict[tuple[str, int], RelayMatch] = {} # the current match of each source
+        self.spectators: dict[tuple[str, int], Spectator] = {}
+        self.match_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+        self.received: int = 0
+        self.sent: int = 0
+        self.dropped: int = 0
+
+    def start(self):
+        threading.Thread(target=self._receive, daemon=True).start()
+        threading.Thread(target=self._release_due, daemon=True).start()
+        print(f"Spectator relay listening on 0.0.0.0:{self.port}, delay {self.delay:g} s", flush=True)
+
+        try:
+            while True:
+                sleep(STATS_INTERVAL)
+                self._expire()
+                self._print_stats()
+        except KeyboardInterrupt:
+            self.socket.close()
+
+    def _receive(self):
+        try:
+            while True:
+                data, address = self.socket.recvfrom(MAX_UDP_PACKET_SIZE * 2)
+                if is_spectate_request(data):
+                    self._on_spectate_request(data, address)
+                    continue
+
+                self.received += 1
+                with self.pending_condition:
+                    if len(self.pending) == self.pending.maxlen:
+                        self.dropped += 1
+                    self.pending.append((monotonic() + self.delay, address, data))
+                    self.pending_condition.notify()
+        except OSError:
+            pass
+
+    def _release_due(self):
+        while True:
+            with self.pending_condition:
+                while len(self.pending) == 0 or self.pending[0][0] > monotonic():
+                    timeout = None if len(self.pending) == 0 else self.pending[0][0] - monotonic()
+                    self.pending_condition.wait(timeout)
+                _, source, packet = self.pending.popleft()
+
+            try:
+                self._release(source, packet)
+            except OSError:
+                pass
+
+    def _release(self, source: tuple[str, int], packet: bytes):
+        if len(packet) < PACKET_HEADER_SIZE:
+            return
+        message_id, message_type, part_idx, part_count = PACKET_HEADER.unpack_from(packet, 0)
+
+        with self.lock:
+            match = self.matches.get(source)
+            if message_type == MATCH_INFO_TYPE and part_count == 1:
+                # Match info starts the next match of the source, its spectators get it when they are moved to the match
+                packet, info = self._delay_match_info(packet)
+                self._start_match(source, info, packet)
+                return
+            if match is None:
+                # The relay was started during the match, spectators get its snapshots but not its arena
+                match = RelayMatch(next(self.match_ids), source)
+                self.matches[source] = match
+
+            match.last_packet = monotonic()
+            if message_type == PLAYER_STATIC_INFO_TYPE:
+                if match.static_message_id != message_id:
+                    match.static_message_id = message_id
+                    match.static_packets = {}
+                match.static_packets[part_idx] = packet
+
+            for address in match.spectators:
+                self.socket.sendto(packet, address)
+            self.sent += len(match.spectators)
+
+    def _delay_match_info(self, packet: bytes) -> tuple[bytes, MatchInfoMessage]:
+        info: MatchInfoMessage = MatchInfoMessage.from_bytes(packet[PACKET_HEADER_SIZE:])
+        if self.delay == 0:
+            return packet, info
+
+        # Spectators see the match late, so its countdown ends late for them too
+        info.begin_time = (datetime.fromisoformat(info.begin_time) + timedelta(seconds=self.delay)).isoformat()
+        message_id, message_type, _, _ = PACKET_HEADER.unpack_from(packet, 0)
+        return PACKET_HEADER.pack(message_id, message_type, 0, 1) + PACKET_SEPARATOR + info.to_bytes(), info
+
+    def _start_match(self, source: tuple[str, int], info: MatchInfoMessage, packet: bytes):
+        previous = self.matches.get(source)
+        match = RelayMatch(next(self.match_ids), source, info.player_ids)
+        match.info_packets = [packet]
+        self.matches[source] = match
+        print(f"Match {match.match_id} started: {', '.join(info.player_ids)}", flush=True)
+
+        for address, spectator in self.spectators.items():
+            if spectator.requested_match == NEWEST_MATCH or (previous is not None and spectator.match is previous):
+                self._watch(address, spectator, match)
+
+    def _on_spectate_request(self, data: bytes, address: tuple[str, int]):
+        _, kind, match_id = SPECTATE_REQUEST.unpack(data)
+        with self.lock:
+            spectator = self.spectators.get(address)
+            if kind == SPECTATE_LEAVE:
+                if spectator is not None:
+                    self._watch(address, spectator, None)
+                    del self.spectators[address]
+                return
+            if kind != SPECTATE_JOIN:
+                return
+
+            if spectator is None or spectator.requested_match != match_id:
+                if spectator is not None:
+                    self._watch(address, spectator, None)
+                spectator = Spectator(match_id, monotonic())
+                self.spectators[address] = spectator
+                print(f"Spectator {address[0]}:{address[1]} joined", flush=True)
+            spectator.last_seen = monotonic()
+
+            if spectator.match is None:
+                self._watch(address, spectator, self._find_match(match_id))
+
+    def _find_match(self, match_id: int) -> RelayMatch | None:
+        matches = [match for match in self.matches.values() if match_id in (NEWEST_MATCH, match.match_id)]
+        return max(matches, key=lambda match: match.match_id, default=None)
+
+    def _watch(self, address: tuple[str, int], spectator: Spectator, match: RelayMatch | None):
+        if spectator.match is not None:
+            spectator.match.spectators.discard(address)
+        spectator.match = match
+        if match is None:
+            return
+
+        match.spectators.add(address)
+        for packet in match.join_packets():
+            self.socket.sendto(packet, address)
+
+    def _expire(self):
+        now = monotonic()
+        with self.lock:
+            for address, spectator in list(self.spectators.items()):
+                if now - spectator.last_seen > SPECTATE_TIMEOUT:
+                    self._watch(address, spectator, None)
+                    del self.spectators[address]
+            for source, match in list(self.matches.items()):
+                if now - match.last_packet > MATCH_TIMEOUT:
+                    del self.matches[source]
+
+    def _print_stats(self):
+        with self.lock:
+            watching = sum(len(match.spectators) for match in self.matches.values())
+            matches = len(self.matches)
+        print(f"Relay: {len(self.spectators)} spectators, {watching} watching {matches} matches | "
+              f"{self.received} packets received, {self.sent} sent, {self.dropped} dropped from a full buffer", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sends the snapshots a game server sends to it on to spectators")
+    parser.add_argument("--port", type=int, default=DEFAULT_RELAY_PORT)
+    parser.add_argument("--delay", type=float, default=0, help="Seconds the spectators see the matches behind the players")
+    parser.add_argument("--buffer", type=int, default=DEFAULT_BUFFER_SIZE, help="Packets held back at most, the oldest are dropped when it is full")
+    args = parser.parse_args()
+
+    relay = SpectatorRelay(args.port, args.delay, args.buffer)
+    relay.start()
+
+if __name__ == "__main__":
+    main()
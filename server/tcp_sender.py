@@ -2,6 +2,7 @@ import dataclasses
 import json
 import socket
 
+from common.net_impairment import NetImpairment
 from common.tcp_messages import Message
 
 
@@ -9,6 +10,7 @@ class TcpSender:
     
     def __init__(self, socket: socket.socket):
         self.socket = socket
+        self.impairment = NetImpairment.load("server", self.socket.sendall, "server-tcp", ordered=True)
         
     def send(self, message: Message):
         message_as_dict = json.dumps(dataclasses.asdict(message))
@@ -17,4 +19,7 @@ class TcpSender:
         message_bytes.insert(0, 2)
         message_bytes.insert(len(message_bytes), 3)
         
-        self.socket.sendall(message_bytes)
\ No newline at end of file
+        if self.impairment is None:
+            self.socket.sendall(message_bytes)
+        else:
+            self.impairment.submit(message_bytes)
\ No newline at end of file
@@ -82,6 +82,8 @@ class TCPServer:
             return tm.StartRoundMessage(**message)
         elif message_type == 5:
             return tm.ExitTestMessage()
+        elif message_type == 10:
+            return tm.PongMessage(**message)
 
     def stop(self):
         self.running = False
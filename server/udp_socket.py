@@ -1,46 +1,125 @@
+from dataclasses import dataclass
 import socket
 import struct
 
 from common.constants import MAX_UDP_PACKET_SIZE
+from common.net_impairment import NetImpairment
 from common.udp_message import UDPMessage
 from common.player import Player
 
 
+PACKET_HEADER = struct.Struct("<HHHH")
+PACKET_SEPARATOR = b"||"
+PACKET_HEADER_SIZE = PACKET_HEADER.size + len(PACKET_SEPARATOR)
+MULTICAST_TTL = 1 # multicast packets never leave the local network
+DEFAULT_MULTICAST_PORT = 6100
+
+
+@dataclass
+class MulticastGroup:
+    group: str
+    port: int
+    interface: str = "0.0.0.0" # the address of the interface to send from, any lets the routing table decide
+    
+    def address(self) -> tuple[str, int]:
+        return (self.group, self.port)
+
+
 class UDPSocket:
     
-    def __init__(self, player_dict: dict[socket.socket, Player]):
+    def __init__(self, player_dict: dict[socket.socket, Player], relay_address: tuple[str, int] = None, multicast: MulticastGroup = None):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.players = player_dict
+        # Messages sent to all players are also sent once to the spectator relay, which sends them on to the spectators
+        self.relay_address = relay_address
+        
+        # Game states are sent once to the multicast group the players join, instead of once per player
+        self.multicast_address = multicast.address() if multicast is not None else None
+        if multicast is not None:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(multicast.interface))
         
         self.message_id_counter = 0
+        self.impairment = NetImpairment.load("server", self.socket.sendto, "server-udp")
         
+        # Messages are encoded into the payload buffer, and each packet is assembled in the packet buffer,
+        # so sending a message only allocates when the payload buffer has to grow
+        self.payload_buffer = bytearray(16 * MAX_UDP_PACKET_SIZE)
+        self.packet_buffer = bytearray(PACKET_HEADER_SIZE + MAX_UDP_PACKET_SIZE)
+        self.packet_buffer[PACKET_HEADER.size:PACKET_HEADER_SIZE] = PACKET_SEPARATOR
+        self.packet_view = memoryview(self.packet_buffer)
+    
     def send_to_all(self, data: UDPMessage):
-        packets = self._split_into_packets(data)
-        
-        for player in self.players.values():
-            ip, _ = player.sender.socket.getpeername()
-            for packet in packets:
-                self.socket.sendto(packet, (ip, player.udp_port))
-            
+        payload = self.encode(data)
+        self.send_encoded_to_all(payload, data.message_type)
+    
     def send_to_player(self, player: Player, data: UDPMessage):
-        packets = self._split_into_packets(data)
+        payload = self.encode(data)
+        self.send_encoded(payload, data.message_type, [self._get_address(player)])
+    
+    def encode(self, data: UDPMessage) -> memoryview:
+        """Encodes the message into the reusable payload buffer, the view is valid until the next encode"""
+        size = data.byte_size()
+        if size > len(self.payload_buffer):
+            self.payload_buffer = bytearray(max(size, 2 * len(self.payload_buffer)))
         
-        ip, _ = player.sender.socket.getpeername()
-        for packet in packets:
-            self.socket.sendto(packet, (ip, player.udp_port))
-            
-    def _split_into_packets(self, data: UDPMessage) -> list[bytes]:
-        full_byte_data = data.to_bytes()
+        end = data.pack_into(self.payload_buffer, 0)
+        return memoryview(self.payload_buffer)[:end]
+    
+    def send_encoded_to_player(self, payload: memoryview, message_type: int, player: Player):
+        self.send_encoded(payload, message_type, [self._get_address(player)])
+    
+    def send_encoded_to_all(self, payload: memoryview, message_type: int):
+        addresses = [self._get_address(player) for player in self.players.values()]
+        if self.relay_address is not None:
+            addresses.append(self.relay_address)
+        self.send_encoded(payload, message_type, addresses)
+    
+    def send_encoded_to_group(self, payload: memoryview, message_type: int):
+        """Sends to every player through the multicast group, or to each of them without one"""
+        if self.multicast_address is None:
+            self.send_encoded_to_all(payload, message_type)
+            return
         
-        chunks = [
-            full_byte_data[i:i+MAX_UDP_PACKET_SIZE]
-            for i in range(0, len(full_byte_data), MAX_UDP_PACKET_SIZE)
-        ]
+        addresses = [self.multicast_address]
+        if self.relay_address is not None:
+            addresses.append(self.relay_address)
+        self.send_encoded(payload, message_type, addresses)
+    
+    def send_to_spectators(self, data: UDPMessage):
+        self.send_encoded_to_spectators(self.encode(data), data.message_type)
+    
+    def send_encoded_to_spectators(self, payload: memoryview, message_type: int):
+        if self.relay_address is not None:
+            self.send_encoded(payload, message_type, [self.relay_address])
+    
+    def send_encoded(self, payload: memoryview, message_type: int, addresses: list[tuple[str, int]]):
+        chunk_count = (len(payload) + MAX_UDP_PACKET_SIZE - 1) // MAX_UDP_PACKET_SIZE
         
-        packets = []
-        for i, chunk in enumerate(chunks):
-            header = struct.pack("<HHHH", self.message_id_counter, data.message_type, i, len(chunks))
-            packets.append(header + b"||" + chunk)
+        for i in range(chunk_count):
+            chunk = payload[i * MAX_UDP_PACKET_SIZE:(i + 1) * MAX_UDP_PACKET_SIZE]
+            packet_size = PACKET_HEADER_SIZE + len(chunk)
+            
+            PACKET_HEADER.pack_into(self.packet_buffer, 0, self.message_id_counter, message_type, i, chunk_count)
+            self.packet_view[PACKET_HEADER_SIZE:packet_size] = chunk
             
+            packet = self.packet_view[:packet_size]
+            for address in addresses:
+                if self.impairment is None:
+                    self.socket.sendto(packet, address)
+                else:
+                    # The packet buffer is reused, so held back packets are copied
+                    self.impairment.submit(bytes(packet), address)
+        
         self.message_id_counter = (self.message_id_counter + 1) % 65000
-        return packets
\ No newline at end of file
+    
+    def flush(self):
+        """Called after the messages of a tick are sent"""
+        pass
+    
+    def _get_address(self, player: Player) -> tuple[str, int]:
+        # The peer of the TCP connection does not change, so it is only looked up once
+        if player.udp_address is None:
+            ip, _ = player.sender.socket.getpeername()
+            player.udp_address = (ip, player.udp_port)
+        return player.udp_address
@@ -0,0 +1,343 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import itertools
+import multiprocessing
+import queue
+import threading
+from time import monotonic, process_time
+import traceback
+from typing import Callable
+
+from common.arena import Arena
+from common.player import Player
+from server.game import Game
+from server.input_log import InputLogWriter
+from server.metrics import TickProfiler
+from server.replay_writer import ReplayWriter
+from server.sim_process import LATENCY_UPDATE_INTERVAL, SimulationPlayer, load_players
+from server.udp_socket import MulticastGroup, UDPSocket
+
+
+LOAD_REPORT_INTERVAL = 1
+# Matches assigned to a worker after its last report are counted as this share of a core until it reports again
+MATCH_CPU_ESTIMATE = 0.05
+
+
+class NoWorkerAvailableError(RuntimeError):
+    pass
+
+
+@dataclass
+class MatchSpec:
+    """Everything a worker needs to host a match, it is sent to the worker process so it must pickle"""
+    match_id: int
+    players: list[SimulationPlayer]
+    addresses: list[tuple[str, int]] # the UDP address of each player, the worker sends to them directly
+    arena: Arena
+    start_time: datetime
+    is_test: bool
+    deterministic: bool
+    seed: int
+    replay_path: str | None
+    input_log_path: str | None
+    relay_address: tuple[str, int] | None
+    multicast: MulticastGroup | None
+
+
+@dataclass
+class WorkerLoad:
+    matches: int = 0
+    players: int = 0
+    cpu: float = 0 # share of one core the worker process used since its last report
+    overruns: int = 0 # ticks over budget in the matches it hosts
+
+
+class AddressedUDPSocket(UDPSocket):
+    """Sends to the addresses the front door handed over, the worker has no TCP connection to look them up on"""
+
+    def __init__(self, players: list[Player], addresses: list[tuple[str, int]], relay_address: tuple[str, int] = None, multicast: MulticastGroup = None):
+        super().__init__({player.id: player for player in players}, relay_address, multicast)
+        self.addresses: dict[str, tuple[str, int]] = {player.id: tuple(address) for player, address in zip(players, addresses)}
+
+    def remove_player(self, player: Player):
+        self.players.pop(player.id, None)
+
+    def _get_address(self, player: Player) -> tuple[str, int]:
+        return self.addresses[player.id]
+
+
+@dataclass
+class HostedMatch:
+    game: Game
+    udp: AddressedUDPSocket
+    players: list[Player]
+
+
+class MatchWorker:
+    """Hosts the matches the front door assigns to one worker process, each in its own thread"""
+
+    def __init__(self, worker_id: int, commands: multiprocessing.Queue, events: multiprocessing.Queue):
+        self.worker_id = worker_id
+        self.commands = commands
+        self.events = events
+
+        self.matches: dict[int, HostedMatch] = {}
+        self.lock = threading.Lock()
+
+        self.last_report = monotonic()
+        self.last_cpu = process_time()
+
+    def run(self):
+        self._report_load()
+        while True:
+            timeout = max(self.last_report + LOAD_REPORT_INTERVAL - monotonic(), 0)
+            try:
+                command = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                if command[0] == "shutdown":
+                    return
+                self._handle(command)
+
+            if monotonic() - self.last_report >= LOAD_REPORT_INTERVAL:
+                self._report_load()
+
+    def _handle(self, command: tuple):
+        if command[0] == "start":
+            self._start_match(command[1])
+            return
+
+        with self.lock:
+            match = self.matches.get(command[1])
+        if match is None:
+            # The match ended while the command was queued
+            return
+
+        if command[0] == "key":
+            _, _, player_idx, key, state = command
+            match.game.update_key(match.players[player_idx].id, key, state)
+        elif command[0] == "remove":
+            player = match.players[command[2]]
+            match.udp.remove_player(player)
+            match.game.remove_disconnected_player(player)
+        elif command[0] == "latency":
+            for player, seconds in zip(match.players, command[2]):
+                player.latency = timedelta(seconds=seconds)
+        elif command[0] == "stop":
+            match.game.stop()
+
+    def _start_match(self, spec: MatchSpec):
+        players = load_players(spec.players)
+        udp = AddressedUDPSocket(players, spec.addresses, spec.relay_address, spec.multicast)
+
+        def on_game_ended(winner: int):
+            self.events.put(("ended", spec.match_id, winner, game.robot_cpu_summary()))
+
+        game = Game(
+            players,
+            spec.arena,
+            udp,
+            on_game_ended,
+            spec.start_time,
+            spec.is_test,
+            ReplayWriter(spec.replay_path) if spec.replay_path is not None else None,
+            spec.deterministic,
+            spec.seed,
+            InputLogWriter(spec.input_log_path) if spec.input_log_path is not None else None,
+            TickProfiler(log_interval_ns=None)) # the front door serves the load of every worker instead
+
+        with self.lock:
+            self.matches[spec.match_id] = HostedMatch(game, udp, players)
+        threading.Thread(target=self._run_match, args=(spec.match_id,), daemon=True).start()
+
+    def _run_match(self, match_id: int):
+        match = self.matches[match_id]
+        try:
+            match.game.run()
+        except Exception:
+            # Without the ended event the players of the match would wait in it forever
+            traceback.print_exc()
+            self.events.put(("ended", match_id, -1, {}))
+        finally:
+            with self.lock:
+                del self.matches[match_id]
+            match.udp.socket.close()
+
+    def _report_load(self):
+        now = monotonic()
+        cpu = process_time()
+        with self.lock:
+            matches = list(self.matches.values())
+
+        load = WorkerLoad(
+            len(matches),
+            sum(len(match.game.players) for match in matches),
+            (cpu - self.last_cpu) / max(now - self.last_report, 1e-6),
+            sum(match.game.profiler.overruns for match in matches))
+        self.events.put(("load", self.worker_id, load))
+        self.last_report = now
+        self.last_cpu = cpu
+
+
+def run_worker(worker_id: int, commands: multiprocessing.Queue, events: multiprocessing.Queue):
+    """Entry point of a worker process"""
+    MatchWorker(worker_id, commands, events).run()
+
+
+@dataclass
+class WorkerHandle:
+    worker_id: int
+    process: multiprocessing.Process
+    commands: multiprocessing.Queue
+    load: WorkerLoad = field(default_factory=WorkerLoad)
+    matches: set[int] = field(default_factory=set)
+    unreported: int = 0 # matches assigned since the last load report
+
+
+class RemoteMatch:
+    """Stands in for Game in the lobby while the match is hosted by a worker process"""
+
+    def __init__(self, pool: "WorkerPool", spec: MatchSpec, players: list[Player], game_ended: Callable[[int], None]):
+        self.pool = pool
+        self.spec = spec
+        self.match_id = spec.match_id
+        self.players = players
+        self.player_indices: dict[str, int] = {player.id: i for i, player in enumerate(players)}
+        self.game_ended_callback = game_ended
+        self.is_test = spec.is_test
+
+        self.worker: WorkerHandle = None
+        self.ended = threading.Event()
+        self.winner: int = -1
+        self.cpu_summary: dict[str, dict[str, dict]] = {}
+
+    def update_key(self, player_id: str, key: int, state: int):
+        player_idx = self.player_indices.get(player_id)
+        if player_idx is not None:
+            self.worker.commands.put(("key", self.match_id, player_idx, key, state))
+
+    def remove_disconnected_player(self, player: Player):
+        self.worker.commands.put(("remove", self.match_id, self.player_indices[player.id]))
+
+    def stop(self):
+        self.worker.commands.put(("stop", self.match_id))
+
+    def robot_cpu_summary(self) -> dict[str, dict[str, dict]]:
+        return self.cpu_summary
+
+    def run(self):
+        while not self.ended.wait(LATENCY_UPDATE_INTERVAL):
+            if not self.worker.process.is_alive():
+                print(f"Worker {self.worker.worker_id} exited with code {self.worker.process.exitcode} during match {self.match_id}", flush=True)
+                break
+            self.worker.commands.put(("latency", self.match_id, [player.latency.total_seconds() for player in self.players]))
+
+        self.pool.release(self)
+        self.game_ended_callback(self.winner)
+
+
+class WorkerPool:
+    """Worker processes that host the matches started by the front door, one or more matches per worker
+
+    Each worker reports its load every second, and a new match goes to the least loaded worker."""
+
+    def __init__(self, worker_count: int, relay_address: tuple[str, int] = None):
+        self.relay_address = relay_address
+        context = multiprocessing.get_context("spawn")
+        self.events = context.Queue()
+        self.workers: list[WorkerHandle] = []
+        for worker_id in range(worker_count):
+            commands = context.Queue()
+            process = context.Process(target=run_worker, args=(worker_id, commands, self.events), daemon=True)
+            self.workers.append(WorkerHandle(worker_id, process, commands))
+
+        self.matches: dict[int, RemoteMatch] = {}
+        self.match_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start(self):
+        for worker in self.workers:
+            worker.process.start()
+        threading.Thread(target=self._receive_events, daemon=True).start()
+        print(f"Started {len(self.workers)} match workers", flush=True)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.commands.put(("shutdown",))
+
+    def create_match(self, players: list[Player], arena: Arena, game_ended: Callable[[int], None], start_time: datetime, is_test: bool = False,
+                     replay_path: str = None, deterministic: bool = False, seed: int = None, input_log_path: str = None,
+                     multicast: MulticastGroup = None) -> RemoteMatch:
+        spec = MatchSpec(
+            next(self.match_ids),
+            [SimulationPlayer(p.id, tuple(p.color), p.robot_code, p.robot_code_hash) for p in players],
+            [(p.sender.socket.getpeername()[0], p.udp_port) for p in players],
+            arena,
+            start_time,
+            is_test,
+            deterministic,
+            seed,
+            replay_path,
+            input_log_path,
+            self.relay_address,
+            multicast)
+        match = RemoteMatch(self, spec, players, game_ended)
+        self._assign(match)
+        return match
+
+    def _assign(self, match: RemoteMatch):
+        with self.lock:
+            workers = [w for w in self.workers if w.process.is_alive()]
+            if len(workers) == 0:
+                raise NoWorkerAvailableError(f"Every match worker has exited, match {match.match_id} cannot be started")
+            worker = min(workers, key=lambda w: (w.load.cpu + w.unreported * MATCH_CPU_ESTIMATE, len(w.matches)))
+            worker.matches.add(match.match_id)
+            worker.unreported += 1
+            self.matches[match.match_id] = match
+            match.worker = worker
+
+        worker.commands.put(("start", match.spec))
+        print(f"Match {match.match_id} with {len(match.players)} players assigned to worker {worker.worker_id}", flush=True)
+
+    def release(self, match: RemoteMatch):
+        with self.lock:
+            match.worker.matches.discard(match.match_id)
+            self.matches.pop(match.match_id, None)
+
+    def _receive_events(self):
+        while True:
+            event = self.events.get()
+            if event[0] == "load":
+                _, worker_id, load = event
+                with self.lock:
+                    self.workers[worker_id].load = load
+                    self.workers[worker_id].unreported = 0
+            elif event[0] == "ended":
+                _, match_id, winner, cpu_summary = event
+                with self.lock:
+                    match = self.matches.get(match_id)
+                if match is not None:
+                    match.winner = winner
+                    match.cpu_summary = cpu_summary
+                    match.ended.set()
+
+    def exposition(self) -> str:
+        """Plain text metrics of every worker in the Prometheus exposition format"""
+        families: list[tuple[str, Callable[[WorkerHandle], str]]] = [
+            ("robot_battle_worker_matches", lambda worker: str(worker.load.matches)),
+            ("robot_battle_worker_players", lambda worker: str(worker.load.players)),
+            ("robot_battle_worker_cpu_ratio", lambda worker: f"{worker.load.cpu:.3f}"),
+            ("robot_battle_worker_tick_overruns", lambda worker: str(worker.load.overruns)),
+            ("robot_battle_worker_up", lambda worker: str(int(worker.process.is_alive()))),
+        ]
+        lines: list[str] = []
+        with self.lock:
+            # The samples of a metric family must follow its TYPE line as one group
+            for name, value in families:
+                lines.append(f"# TYPE {name} gauge")
+                for worker in self.workers:
+                    lines.append(f'{name}{{worker="{worker.worker_id}"}} {value(worker)}')
+
+        return "\n".join(lines) + "\n"